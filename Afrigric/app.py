@@ -1,17 +1,44 @@
 import os
-import shutil
+import io
+import zipfile
+import json
+import tempfile
+import hmac
+import threading
+# Tuned thread and batch settings (autotune.py) have to be in the environment
+# before TensorFlow and the inference modules below read them
+from runtime_profile import apply_runtime_profile
+RUNTIME_PROFILE = apply_runtime_profile()
 import numpy as np
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, send_file, session, jsonify, make_response, abort, Response, stream_with_context
 from werkzeug.utils import secure_filename
-import tensorflow as tf
-from tensorflow.keras.preprocessing import image
-from PIL import Image
 import joblib
 import pandas as pd
 from datetime import datetime
 from translations import get_text, get_recommendations, TRANSLATIONS, SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE
 from weather_service import weather_service
 from farming_assistant import farming_assistant
+from inference_engine import inference_engine
+from inference_backends import backend_for, backend_model_path, load_backend_model
+from multi_head_model import COMBINED_OUTPUTS, split_outputs
+from image_processing import MODEL_INPUT_SIZE, decode_image, image_to_array, upload_writer
+from prediction_cache import prediction_cache, image_digest, file_version
+from model_manager import model_manager, classifier_warmup, ModelNotReady
+from batch_diagnosis import collect_survey_images, decode_images, decode_survey_image, summarize
+from job_queue import job_queue, QueueFull, FINISHED_STATES
+from worker_memory import process_memory, server_memory
+from tiling import (TILE_MAX_SIDE, TILE_POOLING, POOLING_METHODS, TooManyTiles, make_tiles, aggregate_tiles,
+                    tile_heat)
+from video_diagnosis import VIDEO_EXTENSIONS, is_video_name, diagnose_video
+from model_registry import model_registry, ManifestError, RegistryWatcher, class_mapping
+from class_mappings import CLASS_MAPPINGS
+from cascade import (CASCADE_ENABLED, CASCADE_THRESHOLD, cascade_stats, configure_logging as configure_cascade_logging,
+                     run_cascade, small_model_path)
+from explanations import EXPLANATIONS, explanation_service, explanation_key, keras_extras_enabled
+from similarity_index import SIMILAR_CASES, similarity_service
+from upload_store import UploadReaper, UploadTooLarge, copy_upload, store_upload
+from request_coalescer import request_coalescer
+from preprocess_pool import PIPELINE_ENABLED, preprocess_pool, configure_tensorflow_threads, pipeline_settings
 from dotenv import load_dotenv
 import os
 
@@ -27,27 +54,409 @@ app.config['SESSION_TYPE'] = 'filesystem'
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB limit
+UPLOAD_MAX_BYTES = 16 * 1024 * 1024  # 16MB limit per single-image upload
+# Field surveys carry many photos in one request
+SURVEY_MAX_BYTES = int(os.getenv('SURVEY_MAX_UPLOAD_MB', '300')) * 1024 * 1024
+VIDEO_MAX_BYTES = int(os.getenv('VIDEO_MAX_UPLOAD_MB', '100')) * 1024 * 1024
+# Endpoints allowed to exceed the single-image limit
+LARGE_UPLOAD_LIMITS = {'survey_diagnosis': SURVEY_MAX_BYTES, 'video_diagnosis': VIDEO_MAX_BYTES}
+app.config['MAX_CONTENT_LENGTH'] = max(UPLOAD_MAX_BYTES, *LARGE_UPLOAD_LIMITS.values())
 
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Load models with error handling
-try:
-    disease_model = tf.keras.models.load_model('models/disease_model.keras')
-    pest_model = tf.keras.models.load_model('models/pest_model.keras')
-    nutrient_model = tf.keras.models.load_model('models/nutrient_model.keras')
-    yield_model = joblib.load('models/xgboost_crop_yield_model.pkl')
-    print("✅ All models loaded successfully!")
-except Exception as e:
-    print(f"❌ Error loading models: {str(e)}")
-    # Handle model loading failure appropriately
-    raise e
+# Classifier runtime per task: keras, tflite, onnx or openvino (see inference_backends.py)
+CLASSIFIER_BACKENDS = {name: backend_for(name) for name in COMBINED_OUTPUTS}
+# Serve all three tasks from one shared MobileNetV2 backbone (model_export.py combined)
+SHARED_BACKBONE = os.getenv('SHARED_BACKBONE', 'false').lower() == 'true'
+COMBINED_MODEL_PATH = 'models/combined_model.keras'
+# 'uint8' serves the models from `model_export.py uint8`, which resize and
+# scale inside the graph, so requests hand over raw pixels instead of floats
+MODEL_INPUT_DTYPE = os.getenv('MODEL_INPUT_DTYPE', 'float32').lower()
+if MODEL_INPUT_DTYPE == 'uint8' and (set(CLASSIFIER_BACKENDS.values()) != {'keras'} or SHARED_BACKBONE):
+    print("⚠️  MODEL_INPUT_DTYPE=uint8 needs the keras backend without SHARED_BACKBONE; using float32 inputs")
+    MODEL_INPUT_DTYPE = 'float32'
+INPUT_DTYPE = np.uint8 if MODEL_INPUT_DTYPE == 'uint8' else np.float32
+# Answer with a small model first and consult the full one only when unsure (cascade.py)
+CASCADE = CASCADE_ENABLED and not SHARED_BACKBONE
+if CASCADE_ENABLED and SHARED_BACKBONE:
+    print("⚠️  CASCADE is not supported together with SHARED_BACKBONE; serving the combined model only")
+if CASCADE:
+    # Per-image decisions are logged on the `cascade` logger (CASCADE_LOG_LEVEL)
+    configure_cascade_logging()
+
+# Tasks with an active version in the model registry (model_registry.py) at
+# startup are served from it instead of the fixed models/* files, with labels
+# from its manifest. Later switches are tracked in SERVED_CLASSIFIERS
+REGISTRY_VERSIONS = {}
+if not SHARED_BACKBONE:
+    for name in COMBINED_OUTPUTS:
+        version = model_registry.active_version(name)
+        if version:
+            try:
+                model_registry.verify(name, version)
+                REGISTRY_VERSIONS[name] = version
+            except ManifestError as e:
+                print(f"⚠️  Ignoring registry version of {name}: {str(e)}")
+
+def classifier_path(name):
+    """Model file the named task is served from"""
+    if SHARED_BACKBONE:
+        return COMBINED_MODEL_PATH
+    if name in REGISTRY_VERSIONS:
+        return model_registry.model_path(name, REGISTRY_VERSIONS[name])
+    if MODEL_INPUT_DTYPE == 'uint8':
+        return f'models/{name}_model_uint8.keras'
+    return backend_model_path(name, CLASSIFIER_BACKENDS[name])
+
+def load_model_file(path):
+    """Load a Keras, .tflite, .onnx or OpenVINO .xml classifier file"""
+    configure_tensorflow_threads()
+    return load_backend_model(path)
+
+def load_classifier(name):
+    """Load one of the image classifiers with the configured backend"""
+    return load_model_file(classifier_path(name))
+
+def load_small_classifier(name):
+    configure_tensorflow_threads()
+    import tensorflow as tf
+    return tf.keras.models.load_model(small_model_path(name))
+
+def load_combined_model():
+    configure_tensorflow_threads()
+    import tensorflow as tf
+    return tf.keras.models.load_model(COMBINED_MODEL_PATH)
+
+def classifier_model_name(name):
+    """Name of the managed model that serves a task"""
+    return 'combined' if SHARED_BACKBONE else name
+
+# Models load off the request path (MODEL_LOADING=background|lazy|eager), so
+# the home page and the guide are served while TensorFlow is still starting
+if SHARED_BACKBONE:
+    model_manager.register('combined', load_combined_model, warmup=classifier_warmup())
+else:
+    model_manager.register('disease', lambda: load_classifier('disease'), warmup=classifier_warmup(dtype=INPUT_DTYPE))
+    model_manager.register('pest', lambda: load_classifier('pest'), warmup=classifier_warmup(dtype=INPUT_DTYPE))
+    model_manager.register('nutrient', lambda: load_classifier('nutrient'), warmup=classifier_warmup(dtype=INPUT_DTYPE))
+if CASCADE:
+    model_manager.register('disease_small', lambda: load_small_classifier('disease'), warmup=classifier_warmup())
+    model_manager.register('pest_small', lambda: load_small_classifier('pest'), warmup=classifier_warmup())
+    model_manager.register('nutrient_small', lambda: load_small_classifier('nutrient'), warmup=classifier_warmup())
+model_manager.register('yield', lambda: joblib.load('models/xgboost_crop_yield_model.pkl'))
+
+# Under gunicorn (gunicorn.conf.py) this module is imported once in the master.
+# Only models that are safe to share across fork() load there; TensorFlow
+# models load in each worker after the fork
+PREFORK_MASTER = os.getenv('PREFORK_MASTER', 'false').lower() == 'true'
+PREFORK_PRELOAD = [name.strip() for name in os.getenv('PREFORK_PRELOAD', 'yield').split(',') if name.strip()]
+if PREFORK_MASTER:
+    model_manager.preload(PREFORK_PRELOAD)
+else:
+    model_manager.start()
+print(f"🧵 Inference threads: {pipeline_settings()}")
+if RUNTIME_PROFILE:
+    print(f"🎛️  Runtime profile {RUNTIME_PROFILE['path']}: applied {RUNTIME_PROFILE['applied']}, "
+          f"kept from environment {RUNTIME_PROFILE['overridden']}")
+
+def model_version_tag(name, path=None):
+    """Cached predictions are only valid for the exact model files that produced them"""
+    version = file_version(path or classifier_path(name))
+    if CASCADE:
+        version = f'{version}+{file_version(small_model_path(name))}'
+    return version
+
+class ServedClassifier:
+    """
+    The model, class names and cache version tag one task is served with.
+
+    Never modified: a registry switch builds a new one and replaces
+    SERVED_CLASSIFIERS[name] with a single assignment. A request reads it
+    once, so its forward pass, labels and cache keys all come from the same
+    version even if a switch lands halfway through.
+    """
+
+    __slots__ = ('model', 'predict', 'classes', 'version', 'registry_version')
+
+    def __init__(self, model, classes, version, registry_version=None):
+        # None until the startup model has loaded, see loaded_classifier()
+        self.model = model
+        # One callable per model, so the micro-batcher batches requests for the same version together
+        self.predict = None if model is None else (lambda batch: model.predict(batch, verbose=0))
+        self.classes = classes
+        self.version = version
+        self.registry_version = registry_version
+
+    def label(self, result):
+        """A classification result with this version's class name and cache tag attached"""
+        return dict(result, label=self.classes[result['predicted_class']], model_version=self.version)
+
+def startup_classes(name):
+    if name in REGISTRY_VERSIONS:
+        return class_mapping(model_registry.manifest(name, REGISTRY_VERSIONS[name]))
+    return dict(CLASS_MAPPINGS[name])
+
+SERVED_CLASSIFIERS = {
+    name: ServedClassifier(None, startup_classes(name), model_version_tag(name), REGISTRY_VERSIONS.get(name))
+    for name in COMBINED_OUTPUTS
+}
+# Orders a switch against loaded_classifier() filling in the startup model; readers never take it
+SERVED_LOCK = threading.Lock()
+
+def loaded_classifier(name, served):
+    """
+    `served` with its model, raising ModelNotReady while it is still loading.
+
+    Returns None if a version switch replaced `served` before its startup
+    model had loaded; the caller starts over with the new version.
+    """
+    if served.model is not None:
+        return served
+    model = model_manager.get(classifier_model_name(name))
+    with SERVED_LOCK:
+        # A switch swaps the model manager's entry under this lock, so an
+        # unchanged snapshot means `model` is still the startup model
+        if SERVED_CLASSIFIERS[name] is not served:
+            return None
+        served = SERVED_CLASSIFIERS[name] = ServedClassifier(model, served.classes, served.version,
+                                                             served.registry_version)
+    return served
+
+def current_classifiers(names):
+    """Loaded snapshots of the named tasks, read together for one request"""
+    while True:
+        served = {name: loaded_classifier(name, SERVED_CLASSIFIERS[name]) for name in names}
+        if None not in served.values():
+            return served
+
+# Route classifier calls through the micro-batching engine so concurrent
+# uploads share one forward pass per model
+if SHARED_BACKBONE:
+    inference_engine.register('combined', lambda batch: model_manager.get('combined').predict(batch, verbose=0))
+else:
+    inference_engine.register('disease', lambda batch: model_manager.get('disease').predict(batch, verbose=0))
+    inference_engine.register('pest', lambda batch: model_manager.get('pest').predict(batch, verbose=0))
+    inference_engine.register('nutrient', lambda batch: model_manager.get('nutrient').predict(batch, verbose=0))
+if CASCADE:
+    inference_engine.register('disease_small', lambda batch: model_manager.get('disease_small').predict(batch, verbose=0))
+    inference_engine.register('pest_small', lambda batch: model_manager.get('pest_small').predict(batch, verbose=0))
+    inference_engine.register('nutrient_small', lambda batch: model_manager.get('nutrient_small').predict(batch, verbose=0))
+
+def float_batch(batch):
+    """Small cascade models always take [0, 1] floats, even when the full ones take uint8"""
+    if batch.dtype == np.uint8:
+        return batch.astype(np.float32) / 255.0
+    return batch
+
+def run_classifier(name, processed_img, served):
+    """Class probabilities for one task, from its served model or its shared-backbone head"""
+    if SHARED_BACKBONE:
+        return split_outputs(inference_engine.predict('combined', processed_img))[name]
+    if CASCADE:
+        small_name = f'{name}_small'
+        try:
+            model_manager.get(small_name)
+        except ModelNotReady:
+            # Small model missing or still loading: the full model answers everything
+            cascade_stats.record(name, len(processed_img), 0, fallback=True)
+        else:
+            probabilities, _ = run_cascade(
+                name, processed_img,
+                lambda batch: inference_engine.predict(small_name, float_batch(batch)),
+                lambda batch: inference_engine.predict(name, batch, predict_fn=served.predict),
+                threshold=CASCADE_THRESHOLD, stats=cascade_stats
+            )
+            return probabilities
+    return inference_engine.predict(name, processed_img, predict_fn=served.predict)
+
+def run_all_classifiers(processed_img, served):
+    """Disease, pest and nutrient probabilities for the same image"""
+    if SHARED_BACKBONE:
+        return split_outputs(inference_engine.predict('combined', processed_img))
+    if CASCADE:
+        return {name: run_classifier(name, processed_img, served[name]) for name in COMBINED_OUTPUTS}
+    futures = {name: inference_engine.submit(name, processed_img, served[name].predict) for name in COMBINED_OUTPUTS}
+    return {name: future.result() for name, future in futures.items()}
+
+# Largest number of images sent through a model in one call
+CLASSIFY_CHUNK_SIZE = 64
+
+def prediction_key(name, digest, served):
+    backend = CLASSIFIER_BACKENDS[name]
+    model_id = f'{name}:{backend}:cascade{CASCADE_THRESHOLD}' if CASCADE else f'{name}:{backend}'
+    return prediction_cache.make_key(digest, model_id, served.version)
+
+def decode_upload(data, target_size=MODEL_INPUT_SIZE):
+    """decode_image(), on the preprocessing pool when INFERENCE_PIPELINE is on"""
+    if PIPELINE_ENABLED:
+        return preprocess_pool.run(decode_image, data, target_size=target_size)
+    return decode_image(data, target_size=target_size)
+
+def classify_images(name, imgs):
+    """Probabilities, predicted class, label and confidence for decoded images, cached by content"""
+    served = SERVED_CLASSIFIERS[name]
+    keys = [prediction_key(name, image_digest(img), served) for img in imgs]
+    results = [prediction_cache.get(key) for key in keys]
+
+    missing = [index for index, result in enumerate(results) if result is None]
+    if not missing:
+        return [served.label(result) for result in results]
+
+    served = loaded_classifier(name, served)
+    if served is None:
+        return classify_images(name, imgs)
+    # Images another request is already classifying are waited for, not run again
+    claims = {index: request_coalescer.claim(keys[index]) for index in missing}
+    owned = [index for index in missing if claims[index][1]]
+    try:
+        to_array = lambda index: image_to_array(imgs[index], dtype=INPUT_DTYPE)
+        if PIPELINE_ENABLED:
+            # The next chunk is resized on the pool while this one runs through the model
+            arrays = preprocess_pool.imap(to_array, owned, prefetch=CLASSIFY_CHUNK_SIZE)
+        else:
+            arrays = map(to_array, owned)
+        # Cache misses go through the model together, in large batches
+        for start in range(0, len(owned), CLASSIFY_CHUNK_SIZE):
+            chunk = owned[start:start + CLASSIFY_CHUNK_SIZE]
+            batch = np.concatenate([next(arrays) for _ in chunk])
+            predictions = run_classifier(name, batch, served)
+            for index, probabilities in zip(chunk, predictions):
+                results[index] = prediction_cache.put(keys[index], probabilities)
+                request_coalescer.resolve(keys[index], results[index])
+    except BaseException as e:
+        for index in owned:
+            request_coalescer.fail(keys[index], e)
+        raise
+
+    for index in missing:
+        if results[index] is None:
+            results[index] = claims[index][0].result()
+    return [served.label(result) for result in results]
+
+def classify_image(name, img):
+    """classify_images() for a single image"""
+    return classify_images(name, [img])[0]
+
+def classify_tiled(name, img, pooling=TILE_POOLING):
+    """Classify overlapping crops of a photo in one batch; returns the pooled result and per-tile heat"""
+    tiles, boxes = make_tiles(img, dtype=INPUT_DTYPE)
+    served = current_classifiers([name])[name]
+    tile_probabilities = run_classifier(name, tiles, served)
+    probabilities = aggregate_tiles(tile_probabilities, pooling)
+    predicted_class = int(np.argmax(probabilities))
+    result = served.label({
+        'probabilities': probabilities,
+        'predicted_class': predicted_class,
+        'confidence': float(probabilities[predicted_class])
+    })
+    return result, tile_heat(tile_probabilities, boxes, predicted_class)
+
+def classify_upload(name, data):
+    """Classify an uploaded photo whole, or in tiles when the form asks for it"""
+    if request.form.get('tiled') == 'on':
+        pooling = request.form.get('pooling', TILE_POOLING)
+        if pooling not in POOLING_METHODS:
+            pooling = TILE_POOLING
+        # Decode at tiling resolution rather than at the single-crop size
+        img = decode_upload(data, target_size=(TILE_MAX_SIDE, TILE_MAX_SIDE))
+        return classify_tiled(name, img, pooling)
+    return classify_image(name, decode_upload(data)), None
+
+def classify_all(img):
+    """classify_image() for every task, running the models only on a cache miss"""
+    digest = image_digest(img)
+    served = dict(SERVED_CLASSIFIERS)
+    keys = {name: prediction_key(name, digest, served[name]) for name in COMBINED_OUTPUTS}
+    results = {name: prediction_cache.get(key) for name, key in keys.items()}
+
+    missing = [name for name, result in results.items() if result is None]
+    if not missing:
+        return {name: served[name].label(result) for name, result in results.items()}
+
+    # run_all_classifiers() runs every task, not only the ones that missed the cache
+    for name in COMBINED_OUTPUTS:
+        served[name] = loaded_classifier(name, served[name])
+        if served[name] is None:
+            return classify_all(img)
+    claims = {name: request_coalescer.claim(keys[name]) for name in missing}
+    owned = [name for name in missing if claims[name][1]]
+    if owned:
+        try:
+            predictions = run_all_classifiers(image_to_array(img, dtype=INPUT_DTYPE), served)
+        except BaseException as e:
+            for name in owned:
+                request_coalescer.fail(keys[name], e)
+            raise
+        for name in owned:
+            results[name] = prediction_cache.put(keys[name], predictions[name])
+            request_coalescer.resolve(keys[name], results[name])
+
+    for name in missing:
+        if results[name] is None:
+            results[name] = claims[name][0].result()
+    return {name: served[name].label(result) for name, result in results.items()}
+
+# Grad-CAM heatmaps and similar confirmed cases need a Keras model. By default
+# (EXPLANATIONS / SIMILAR_CASES=auto) they are only on for tasks already served
+# by one; the other runtimes and SHARED_BACKBONE would load the original .keras
+# file next to the served model, so they have to opt in with =true
+SERVED_BY_KERAS = {name: not SHARED_BACKBONE and CLASSIFIER_BACKENDS[name] == 'keras' for name in COMBINED_OUTPUTS}
+EXPLAINED_TASKS = [name for name in COMBINED_OUTPUTS if keras_extras_enabled(EXPLANATIONS, SERVED_BY_KERAS[name])]
+SIMILAR_CASE_TASKS = [name for name in COMBINED_OUTPUTS if keras_extras_enabled(SIMILAR_CASES, SERVED_BY_KERAS[name])]
+
+# Both run on background threads after the response
+for name in COMBINED_OUTPUTS:
+    if name in EXPLAINED_TASKS or name in SIMILAR_CASE_TASKS:
+        explanation_service.register(name, (lambda name=name: model_manager.get(name) if SERVED_BY_KERAS[name] else None),
+                                     f'models/{name}_model.keras', explain=name in EXPLAINED_TASKS)
+
+# Similar confirmed cases are looked up with the same Keras models' penultimate layer
+for name in SIMILAR_CASE_TASKS:
+    similarity_service.register(name, lambda name=name: explanation_service.keras_model(name))
+if not PREFORK_MASTER:
+    similarity_service.start()
+
+def similar_cases_url(name, data, result):
+    """Queue the similar-cases lookup for a classified upload; returns the URL the results page polls, or None"""
+    key = similarity_service.lookup_key(name, result['model_version'], data)
+    if not similarity_service.submit(name, key, data):
+        return None
+    return url_for('similar_cases', key=key)
+
+def request_explanation(name, data, result):
+    """Queue the heatmap for a classified upload; returns the URL the results page polls, or None"""
+    key = explanation_key(name, result['model_version'], data)
+    if not explanation_service.submit(name, key, data, result['predicted_class']):
+        return None
+    return url_for('get_explanation', key=key)
 
 def get_current_language():
     """Get the current language from session or default"""
     return session.get('language', DEFAULT_LANGUAGE)
 
+@app.before_request
+def limit_upload_size():
+    """Keep the 16MB cap for everything except the survey and video uploads"""
+    if (request.content_length or 0) > LARGE_UPLOAD_LIMITS.get(request.endpoint, UPLOAD_MAX_BYTES):
+        abort(413)
+
+def render_warming_up(template):
+    """Fast 503 with the upload form while a model is still loading"""
+    lang = get_current_language()
+    translations = TRANSLATIONS.get(lang, TRANSLATIONS['en'])
+    flash(get_text('models_warming_up', lang), 'warning')
+    response = make_response(render_template(template, translations=translations, current_lang=lang), 503)
+    response.headers['Retry-After'] = '5'
+    return response
+
+def render_upload_refused(template, message):
+    """400 with the upload form for a photo that cannot be processed as asked"""
+    lang = get_current_language()
+    translations = TRANSLATIONS.get(lang, TRANSLATIONS['en'])
+    flash(message, 'error')
+    return make_response(render_template(template, translations=translations, current_lang=lang), 400)
+
 # Language switching route
 @app.route('/set_language/<lang>')
 def set_language(lang):
@@ -123,39 +532,32 @@ def weather_debug():
     """
 
 
-# Class mappings
-DISEASE_MAPPING = {
-    0: 'Blight', 
-    1: 'Common_Rust', 
-    2: 'Gray_Leaf_Spot', 
-    3: 'Healthy'
-}
+def activate_registry_version(name, version):
+    """Load, verify and warm up a registry version off the request path, then swap it in"""
+    manifest = model_registry.verify(name, version)
+    if manifest.get('input_dtype', 'float32') != MODEL_INPUT_DTYPE:
+        raise ManifestError(f"{name} {version} takes {manifest.get('input_dtype', 'float32')} input "
+                            f"but the server is configured for {MODEL_INPUT_DTYPE}")
 
-PEST_MAPPING = {
-    0: 'Ants', 
-    1: 'Aphids', 
-    2: 'Caterpillar', 
-    3: 'Corn Worm', 
-    4: 'Earwig', 
-    5: 'Fall Armyworm', 
-    6: 'Grasshopper', 
-    7: 'Leaf Beetle', 
-    8: 'Mole Cricket', 
-    9: 'Red Spider', 
-    10: 'Slug', 
-    11: 'Snail', 
-    12: 'Stem Borer', 
-    13: 'Weevil'
-}
+    path = model_registry.model_path(name, version)
+    model = load_model_file(path)
+    classifier_warmup(tuple(manifest['input_size']) + (3,), dtype=INPUT_DTYPE)(model)
 
-NUTRIENT_MAPPING = {
-    0: 'Healthy (No Deficiency)', 
-    1: 'All Nutrients Deficient', 
-    2: 'Potassium Deficiency', 
-    3: 'Nitrogen Deficiency', 
-    4: 'Phosphorus Deficiency', 
-    5: 'Zinc Deficiency'
-}
+    served = ServedClassifier(model, class_mapping(manifest), model_version_tag(name, path), version)
+    with SERVED_LOCK:
+        SERVED_CLASSIFIERS[name] = served
+        # Explanations and similar cases follow the new model too
+        model_manager.swap(name, model)
+    print(f"✅ Model '{name}' now serving version {version}")
+    return {'task': name, 'version': version, 'classes': manifest['classes']}
+
+# Each serving process follows the registry's ACTIVE files, so a version
+# switched through one worker or the CLI reaches every worker
+registry_watcher = RegistryWatcher(model_registry, [] if SHARED_BACKBONE else list(COMBINED_OUTPUTS),
+                                   lambda name: SERVED_CLASSIFIERS[name].registry_version,
+                                   activate_registry_version)
+if not PREFORK_MASTER:
+    registry_watcher.start()
 
 from recommendations import RECOMMENDATIONS
 
@@ -637,55 +1039,213 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def clear_upload_folder():
-    """Completely clear the upload folder"""
-    folder = app.config['UPLOAD_FOLDER']
-    for filename in os.listdir(folder):
-        file_path = os.path.join(folder, filename)
-        try:
-            if os.path.isfile(file_path) or os.path.islink(file_path):
-                os.unlink(file_path)
-            elif os.path.isdir(file_path):
-                shutil.rmtree(file_path)
-        except Exception as e:
-            print(f'Failed to delete {file_path}. Reason: {e}')
+# Uploads are stored under content-addressed names and expired in the
+# background, so no request ever scans or clears the folder
+upload_reaper = UploadReaper(app.config['UPLOAD_FOLDER'])
+if not PREFORK_MASTER:
+    upload_reaper.start()
+
+@app.route('/api/inference/metrics')
+def inference_metrics():
+    """Queue depth, batch-size, prediction cache, coalescing and cascade metrics for the classifiers"""
+    return jsonify({
+        'models': inference_engine.get_metrics(),
+        'cache': prediction_cache.get_stats(),
+        'coalescing': request_coalescer.get_stats(),
+        'explanations': explanation_service.get_stats(),
+        'similar_cases': similarity_service.get_stats(),
+        'preprocessing': preprocess_pool.get_stats(),
+        'runtime_profile': RUNTIME_PROFILE,
+        'cascade': {
+            'enabled': CASCADE,
+            'threshold': CASCADE_THRESHOLD,
+            'tasks': cascade_stats.get_stats()
+        }
+    })
+
+@app.route('/api/explanations/<key>')
+def get_explanation(key):
+    """Grad-CAM overlay for a results page; 202 while it is still being rendered"""
+    if len(key) != 40 or any(c not in '0123456789abcdef' for c in key):
+        abort(404)
+    png = explanation_service.get(key)
+    if png is not None:
+        response = send_file(io.BytesIO(png), mimetype='image/png')
+        # The key covers the model version and file contents, so the image never changes
+        response.headers['Cache-Control'] = 'public, max-age=86400, immutable'
+        return response
+    if explanation_service.is_pending(key):
+        return jsonify({'success': True, 'status': 'pending'}), 202, {'Retry-After': '1'}
+    return jsonify({'success': False, 'error': 'Explanation not found'}), 404
+
+@app.route('/api/similar/<key>')
+def similar_cases(key):
+    """Confirmed cases whose photos look most like an uploaded one; 202 while they are being looked up"""
+    if len(key) != 40 or any(c not in '0123456789abcdef' for c in key):
+        abort(404)
+    found = similarity_service.get(key)
+    if found is not None:
+        for case in found['cases']:
+            case['image_url'] = url_for('case_image', task=found['task'], row=case['row'])
+        return jsonify({'success': True, **found})
+    if similarity_service.is_pending(key):
+        return jsonify({'success': True, 'status': 'pending'}), 202, {'Retry-After': '1'}
+    return jsonify({'success': False, 'error': 'Similar cases not found'}), 404
+
+@app.route('/cases/<task>/<int:row>.jpg')
+def case_image(task, row):
+    if task not in CLASS_MAPPINGS:
+        abort(404)
+    return send_from_directory(similarity_service.images_dir(task), f'{row}.jpg')
+
+@app.route('/api/models/status')
+def models_status():
+    """Per-model readiness; 503 until every model has loaded and warmed up"""
+    ready = model_manager.all_ready()
+    return jsonify({
+        'ready': ready,
+        'mode': model_manager.mode,
+        'models': model_manager.status(),
+        'backends': {} if SHARED_BACKBONE else CLASSIFIER_BACKENDS
+    }), 200 if ready else 503
+
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+def require_admin():
+    """Admin endpoints need X-Admin-Token to match ADMIN_TOKEN; without ADMIN_TOKEN they are off"""
+    token = request.headers.get('X-Admin-Token', '')
+    if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN):
+        abort(403)
 
-def preprocess_image(img_path, target_size=(224, 224)):
-    """Improved image preprocessing with error handling"""
+def switch_model_version(task, version, rollback=False):
+    """Job body: swap the model in this worker, then record it in the registry for the others"""
+    result = activate_registry_version(task, version)
+    if rollback:
+        model_registry.rollback(task)
+    else:
+        model_registry.activate(task, version)
+    return result
+
+def submit_model_switch(task, version, rollback=False):
     try:
-        # Read image
-        img = Image.open(img_path)
-        
-        # Convert to RGB if not already
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-            
-        # Resize and preprocess
-        img = img.resize(target_size)
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = img_array / 255.0
-        
-        return img_array
-    except Exception as e:
-        print(f"Error preprocessing image: {str(e)}")
-        raise
+        job_id = job_queue.submit('model_switch', switch_model_version, task, version, rollback)
+    except QueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 429, {'Retry-After': '5'}
+    return jsonify({
+        'success': True,
+        'task': task,
+        'version': version,
+        'job_id': job_id,
+        'status_url': url_for('get_diagnosis_job', job_id=job_id)
+    }), 202
+
+@app.route('/api/admin/models')
+def admin_models():
+    """Registry versions per task and the version this worker is serving"""
+    require_admin()
+    return jsonify({
+        'serving': {name: served.registry_version for name, served in SERVED_CLASSIFIERS.items()
+                    if served.registry_version},
+        'registry': model_registry.status(COMBINED_OUTPUTS)
+    })
+
+@app.route('/api/admin/models/<task>/activate', methods=['POST'])
+def admin_activate_model(task):
+    """Load a registry version in the background and switch to it once warmed up"""
+    require_admin()
+    if task not in CLASS_MAPPINGS or SHARED_BACKBONE:
+        return jsonify({'success': False, 'error': f'{task} is not served from the registry'}), 400
+
+    version = (request.get_json(silent=True) or {}).get('version') or request.form.get('version')
+    try:
+        model_registry.verify(task, version or '')
+    except ManifestError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return submit_model_switch(task, version)
+
+@app.route('/api/admin/models/<task>/rollback', methods=['POST'])
+def admin_rollback_model(task):
+    """Switch back to the version that was active before the current one"""
+    require_admin()
+    if task not in CLASS_MAPPINGS or SHARED_BACKBONE:
+        return jsonify({'success': False, 'error': f'{task} is not served from the registry'}), 400
+
+    try:
+        version = model_registry.previous_version(task)
+        model_registry.verify(task, version)
+    except ManifestError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return submit_model_switch(task, version, rollback=True)
+
+def confirm_case(task, img, label):
+    """Job body: add a confirmed photo to a task's similar-cases index"""
+    model_manager.wait_until_ready(classifier_model_name(task))
+    row = similarity_service.confirm(task, [img], [label], source='admin')[0]
+    return {'task': task, 'label': label, 'row': row}
+
+@app.route('/api/admin/cases/<task>', methods=['POST'])
+def admin_confirm_case(task):
+    """Add a confirmed photo (form field `file`, or `filename` of a stored upload) with its `label`"""
+    require_admin()
+    if task not in CLASS_MAPPINGS:
+        return jsonify({'success': False, 'error': f'Unknown model: {task}'}), 400
+    if task not in SIMILAR_CASE_TASKS:
+        return jsonify({'success': False, 'error': f'Similar cases are off for {task} (SIMILAR_CASES)'}), 400
+    label = request.form.get('label', '')
+    if label not in SERVED_CLASSIFIERS[task].classes.values():
+        return jsonify({'success': False, 'error': f'Unknown {task} class: {label}'}), 400
+
+    file = request.files.get('file')
+    try:
+        if file and file.filename:
+            img = decode_image(file.read())
+        else:
+            img = decode_image(os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(request.form.get('filename', ''))))
+    except OSError:
+        return jsonify({'success': False, 'error': 'Could not read the photo'}), 400
+    try:
+        # Embedding needs the Keras model, so it runs as a job rather than on this request
+        job_id = job_queue.submit('confirm_case', confirm_case, task, img, label)
+    except QueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 429, {'Retry-After': '5'}
+    return jsonify({
+        'success': True,
+        'task': task,
+        'label': label,
+        'job_id': job_id,
+        'status_url': url_for('get_diagnosis_job', job_id=job_id)
+    }), 202
+
+@app.route('/api/workers/memory')
+def workers_memory():
+    """Rss/Pss of the gunicorn master and each worker (just this process on the dev server)"""
+    if PREFORK_MASTER:
+        return jsonify(server_memory())
+    memory = process_memory()
+    return jsonify({
+        'current_worker': memory['pid'],
+        'master': None,
+        'workers': [memory],
+        'total_pss_mb': memory.get('pss_mb', 0),
+        'total_rss_mb': memory.get('rss_mb', 0)
+    })
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
+    # The upload may still be on its way to disk
+    pending = upload_writer.get_pending(os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename)))
+    if pending is not None:
+        return send_file(io.BytesIO(pending), download_name=filename)
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
 @app.route('/')
 def home():
-    clear_upload_folder()
     lang = get_current_language()
     translations = TRANSLATIONS.get(lang, TRANSLATIONS['en'])
     return render_template('index.html', translations=translations, current_lang=lang)
 
 @app.route('/disease', methods=['GET', 'POST'])
 def disease_detection():
-    clear_upload_folder()
-    
     if request.method == 'POST':
         # Check if file was uploaded
         if 'file' not in request.files:
@@ -702,27 +1262,14 @@ def disease_detection():
         # Validate file
         if file and allowed_file(file.filename):
             try:
-                # Secure filename and save
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                
-                # Ensure directory exists
-                os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                
-                # Save file
-                file.save(filepath)
-                
-                # Verify file was saved
-                if not os.path.exists(filepath):
-                    flash('Error saving file', 'error')
-                    return redirect(request.url)
+                # Decode straight from the request
+                data = file.read()
                 
                 # Preprocess and predict
-                processed_img = preprocess_image(filepath)
-                prediction = disease_model.predict(processed_img)
-                predicted_class = np.argmax(prediction)
-                confidence = np.max(prediction) * 100
-                problem = DISEASE_MAPPING[predicted_class]
+                result, tiles = classify_upload('disease', data)
+                explanation_url = request_explanation('disease', data, result)
+                confidence = result['confidence'] * 100
+                problem = result['label']
                 
                 # Get translated recommendations
                 lang = get_current_language()
@@ -730,11 +1277,16 @@ def disease_detection():
                 
                 lang = get_current_language()
                 translations = TRANSLATIONS.get(lang, TRANSLATIONS['en'])
+                # Only the results page needs the file; write it off the hot path
+                filename = store_upload(data, file.filename, app.config['UPLOAD_FOLDER'])
                 return render_template('disease_results.html',
                                     problem_type=get_text('disease', lang),
                                     problem_name=problem,
                                     confidence=f"{confidence:.2f}%",
                                     image_path=filename,
+                                    tiles=tiles,
+                                    explanation_url=explanation_url,
+                                    similar_url=similar_cases_url('disease', data, result),
                                     translations=translations,
                                     current_lang=lang,
                                     description=recommendations.get('description', ''),
@@ -742,6 +1294,10 @@ def disease_detection():
                                     prevention=recommendations.get('prevention', []),
                                     monitoring=recommendations.get('monitoring', []))
                 
+            except ModelNotReady:
+                return render_warming_up('disease.html')
+            except TooManyTiles as e:
+                return render_upload_refused('disease.html', f'Photo is too long and narrow to scan in tiles: {e}')
             except Exception as e:
                 flash(f'Error processing image: {str(e)}', 'error')
                 return redirect(request.url)
@@ -864,7 +1420,7 @@ def yield_prediction():
             }
 
             input_df = pd.DataFrame([data])
-            prediction = yield_model.predict(input_df)[0]
+            prediction = model_manager.get('yield').predict(input_df)[0]
 
             return render_template('yield_results.html',
                                   prediction=round(prediction, 2),
@@ -874,6 +1430,8 @@ def yield_prediction():
                                   planting_date=planting_date,
                                   **data)
 
+        except ModelNotReady:
+            return render_warming_up('yield.html')
         except Exception as e:
             flash(f'Error making prediction: {str(e)}', 'error')
             return redirect(url_for('yield_prediction'))
@@ -881,8 +1439,6 @@ def yield_prediction():
     return render_template('yield.html', translations=translations, current_lang=lang)
 @app.route('/pest', methods=['GET', 'POST'])
 def pest_detection():
-    clear_upload_folder()
-    
     if request.method == 'POST':
         if 'file' not in request.files:
             flash('No file selected', 'error')
@@ -896,26 +1452,28 @@ def pest_detection():
         
         if file and allowed_file(file.filename):
             try:
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
+                data = file.read()
                 
-                processed_img = preprocess_image(filepath)
-                prediction = pest_model.predict(processed_img)
-                predicted_class = np.argmax(prediction)
-                confidence = np.max(prediction) * 100
-                problem = PEST_MAPPING[predicted_class]
+                result, tiles = classify_upload('pest', data)
+                explanation_url = request_explanation('pest', data, result)
+                confidence = result['confidence'] * 100
+                problem = result['label']
                 
                 # Get translated recommendations
                 lang = get_current_language()
                 recommendations = get_recommendations(problem, lang)
 
                 translations = TRANSLATIONS.get(lang, TRANSLATIONS['en'])
+                # Only the results page needs the file; write it off the hot path
+                filename = store_upload(data, file.filename, app.config['UPLOAD_FOLDER'])
                 return render_template('pest_results.html',
                                     problem_type=get_text('pests', lang),
                                     problem_name=problem,
                                     confidence=f"{confidence:.2f}%",
                                     image_path=filename,
+                                    tiles=tiles,
+                                    explanation_url=explanation_url,
+                                    similar_url=similar_cases_url('pest', data, result),
                                     translations=translations,
                                     current_lang=lang,
                                     description=recommendations.get('description', ''),
@@ -923,6 +1481,10 @@ def pest_detection():
                                     prevention=recommendations.get('prevention', []),
                                     monitoring=recommendations.get('monitoring', []))
             
+            except ModelNotReady:
+                return render_warming_up('pest.html')
+            except TooManyTiles as e:
+                return render_upload_refused('pest.html', f'Photo is too long and narrow to scan in tiles: {e}')
             except Exception as e:
                 flash(f'Error processing image: {str(e)}', 'error')
                 return redirect(request.url)
@@ -933,8 +1495,6 @@ def pest_detection():
 
 @app.route('/nutrient', methods=['GET', 'POST'])
 def nutrient_detection():
-    clear_upload_folder()
-    
     if request.method == 'POST':
         if 'file' not in request.files:
             flash('No file selected', 'error')
@@ -948,26 +1508,28 @@ def nutrient_detection():
         
         if file and allowed_file(file.filename):
             try:
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
+                data = file.read()
                 
-                processed_img = preprocess_image(filepath)
-                prediction = nutrient_model.predict(processed_img)
-                predicted_class = np.argmax(prediction)
-                confidence = np.max(prediction) * 100
-                problem = NUTRIENT_MAPPING[predicted_class]
+                result, tiles = classify_upload('nutrient', data)
+                explanation_url = request_explanation('nutrient', data, result)
+                confidence = result['confidence'] * 100
+                problem = result['label']
                 
                 # Get translated recommendations
                 lang = get_current_language()
                 recommendations = get_recommendations(problem, lang)
 
                 translations = TRANSLATIONS.get(lang, TRANSLATIONS['en'])
+                # Only the results page needs the file; write it off the hot path
+                filename = store_upload(data, file.filename, app.config['UPLOAD_FOLDER'])
                 return render_template('nutrient_results.html',
                                     problem_type=get_text('nutrients', lang),
                                     problem_name=problem,
                                     confidence=f"{confidence:.2f}%",
                                     image_path=filename,
+                                    tiles=tiles,
+                                    explanation_url=explanation_url,
+                                    similar_url=similar_cases_url('nutrient', data, result),
                                     translations=translations,
                                     current_lang=lang,
                                     description=recommendations.get('description', ''),
@@ -975,6 +1537,10 @@ def nutrient_detection():
                                     prevention=recommendations.get('prevention', []),
                                     monitoring=recommendations.get('monitoring', []))
             
+            except ModelNotReady:
+                return render_warming_up('nutrient.html')
+            except TooManyTiles as e:
+                return render_upload_refused('nutrient.html', f'Photo is too long and narrow to scan in tiles: {e}')
             except Exception as e:
                 flash(f'Error processing image: {str(e)}', 'error')
                 return redirect(request.url)
@@ -983,6 +1549,238 @@ def nutrient_detection():
     translations = TRANSLATIONS.get(lang, TRANSLATIONS['en'])
     return render_template('nutrient.html', translations=translations, current_lang=lang)
 
+def diagnosis_payload(name, prediction, lang):
+    """JSON-friendly result for one task: problem, confidence and recommendations"""
+    problem = prediction['label']
+    return {
+        'problem': problem,
+        'confidence': round(prediction['confidence'] * 100, 2),
+        'recommendations': get_recommendations(problem, lang)
+    }
+
+@app.route('/api/diagnose', methods=['POST'])
+def diagnose_all():
+    """Disease, pest and nutrient diagnosis for one photo in a single request"""
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'success': False, 'error': 'No file selected'}), 400
+    if not allowed_file(file.filename):
+        return jsonify({'success': False, 'error': 'Allowed file types are png, jpg, jpeg'}), 400
+
+    try:
+        predictions = classify_all(decode_upload(file.read()))
+
+        lang = get_current_language()
+        results = {name: diagnosis_payload(name, prediction, lang) for name, prediction in predictions.items()}
+
+        return jsonify({'success': True, 'shared_backbone': SHARED_BACKBONE, **results})
+
+    except ModelNotReady as e:
+        return jsonify({
+            'success': False,
+            'warming_up': True,
+            'error': str(e)
+        }), 503, {'Retry-After': '5'}
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error processing image: {str(e)}'
+        }), 500
+
+@app.route('/api/survey', methods=['POST'])
+def survey_diagnosis():
+    """Classify a field survey (many photos and/or zip archives) with a per-field summary"""
+    task = request.form.get('model', 'disease')
+    if task not in CLASS_MAPPINGS:
+        return jsonify({'success': False, 'error': f'Unknown model: {task}'}), 400
+
+    try:
+        images = collect_survey_images(request.files.getlist('files'), request.files.getlist('archive'))
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    if not images:
+        return jsonify({'success': False, 'error': 'No png, jpg or jpeg images found'}), 400
+
+    try:
+        if PIPELINE_ENABLED:
+            # Photos further down the survey decode while earlier chunks are classified
+            decoded = preprocess_pool.imap(decode_survey_image, images, prefetch=CLASSIFY_CHUNK_SIZE)
+        else:
+            decoded = iter(decode_images(images))
+
+        results = []
+        for start in range(0, len(images), CLASSIFY_CHUNK_SIZE):
+            chunk = [next(decoded) for _ in images[start:start + CLASSIFY_CHUNK_SIZE]]
+            predictions = iter(classify_images(task, [img for _, img, error in chunk if img is not None]))
+            for filename, img, error in chunk:
+                if img is None:
+                    results.append({'filename': filename, 'error': f'Could not read image: {error}'})
+                    continue
+                prediction = next(predictions)
+                results.append({
+                    'filename': filename,
+                    'problem': prediction['label'],
+                    'confidence': round(prediction['confidence'] * 100, 2)
+                })
+
+        lang = get_current_language()
+        summary = summarize(results)
+        return jsonify({
+            'success': True,
+            'model': task,
+            'summary': summary,
+            'results': results,
+            'recommendations': {problem: get_recommendations(problem, lang) for problem in summary['classes']}
+        })
+
+    except ModelNotReady as e:
+        return jsonify({
+            'success': False,
+            'warming_up': True,
+            'error': str(e)
+        }), 503, {'Retry-After': '5'}
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error processing survey: {str(e)}'
+        }), 500
+
+@app.route('/api/video', methods=['POST'])
+def video_diagnosis():
+    """Diagnose a short walk-through clip: a per-frame timeline plus a clip-level verdict"""
+    task = request.form.get('model', 'all')
+    if task != 'all' and task not in CLASS_MAPPINGS:
+        return jsonify({'success': False, 'error': f'Unknown model: {task}'}), 400
+
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'success': False, 'error': 'No video uploaded'}), 400
+    if not is_video_name(file.filename):
+        return jsonify({'success': False, 'error': f"Allowed video types are {', '.join(VIDEO_EXTENSIONS)}"}), 400
+
+    names = COMBINED_OUTPUTS if task == 'all' else (task,)
+
+    try:
+        # Every frame of the clip goes through the same model versions
+        served = current_classifiers(names)
+        if task == 'all':
+            classify_batch = lambda batch: run_all_classifiers(batch, served)
+        else:
+            classify_batch = lambda batch: {task: run_classifier(task, batch, served[task])}
+
+        # OpenCV reads from a path; copy the upload over in chunks instead of into memory.
+        # Chunked requests carry no Content-Length, so the limit is checked while copying
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(file.filename)[1].lower()) as video:
+            copy_upload(file.stream, video, VIDEO_MAX_BYTES)
+            video.flush()
+            result = diagnose_video(video.name, classify_batch, {name: served[name].classes for name in names},
+                                    dtype=INPUT_DTYPE)
+
+        lang = get_current_language()
+        return jsonify({
+            'success': True,
+            'model': task,
+            **result,
+            'recommendations': {
+                name: get_recommendations(result['verdict'][name]['problem'], lang) for name in names
+            }
+        })
+
+    except ModelNotReady as e:
+        return jsonify({
+            'success': False,
+            'warming_up': True,
+            'error': str(e)
+        }), 503, {'Retry-After': '5'}
+    except UploadTooLarge as e:
+        return jsonify({'success': False, 'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Error processing video: {str(e)}'
+        }), 500
+
+def run_diagnosis_job(data, task, lang):
+    """Worker-side half of /api/jobs: decode, classify and attach recommendations"""
+    img = decode_upload(data)
+    names = COMBINED_OUTPUTS if task == 'all' else (task,)
+    # Jobs are already off the request path, so they may wait for a model to finish warming up
+    for name in names:
+        model_manager.wait_until_ready(classifier_model_name(name))
+
+    if task == 'all':
+        predictions = classify_all(img)
+    else:
+        predictions = {task: classify_image(task, img)}
+    return {name: diagnosis_payload(name, prediction, lang) for name, prediction in predictions.items()}
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_diagnosis_job():
+    """Queue a diagnosis and return its job id straight away"""
+    task = request.form.get('model', 'all')
+    if task != 'all' and task not in CLASS_MAPPINGS:
+        return jsonify({'success': False, 'error': f'Unknown model: {task}'}), 400
+
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'success': False, 'error': 'No file selected'}), 400
+    if not allowed_file(file.filename):
+        return jsonify({'success': False, 'error': 'Allowed file types are png, jpg, jpeg'}), 400
+
+    try:
+        job_id = job_queue.submit(task, run_diagnosis_job, file.read(), task, get_current_language())
+    except QueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 429, {'Retry-After': '5'}
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('get_diagnosis_job', job_id=job_id),
+        'events_url': url_for('diagnosis_job_events', job_id=job_id)
+    }), 202
+
+@app.route('/api/jobs/<job_id>')
+def get_diagnosis_job(job_id):
+    """Poll a diagnosis job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found or expired'}), 404
+    return jsonify({'success': True, **job})
+
+@app.route('/api/jobs/<job_id>/events')
+def diagnosis_job_events(job_id):
+    """Server-sent events stream with every status change of a job"""
+    if job_queue.get(job_id) is None:
+        return jsonify({'success': False, 'error': 'Job not found or expired'}), 404
+
+    def stream():
+        last_status = None
+        while True:
+            job = job_queue.wait_for_change(job_id, last_status)
+            if job is None:
+                yield 'event: expired\ndata: {}\n\n'
+                return
+            if job['status'] == last_status:
+                # Keep the connection open through proxies
+                yield ': keep-alive\n\n'
+                continue
+
+            last_status = job['status']
+            yield f"event: status\ndata: {json.dumps(job)}\n\n"
+            if last_status in FINISHED_STATES:
+                return
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs/metrics')
+def diagnosis_job_metrics():
+    """Worker pool and retention statistics for the job queue"""
+    return jsonify(job_queue.get_stats())
+
 # Maize Guidance Routes
 @app.route('/maize-guide')
 def maize_guide():
@@ -1036,4 +1834,4 @@ def get_maize_guidance():
         }), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
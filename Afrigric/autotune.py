@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Tune the inference runtime for the machine it runs on.
+
+Sweeps TensorFlow's intra-op/inter-op thread pools (with OMP_NUM_THREADS and
+the ONNX Runtime/OpenVINO thread count following the intra-op value) and the
+micro-batch size against the disease, pest and nutrient models the server
+would load. Latency and throughput are measured for every setting and the
+best one is written to a runtime profile, which app.py applies at startup
+(see runtime_profile.py).
+
+Usage:
+    python autotune.py
+    python autotune.py --objective throughput --latency-budget-ms 400
+    python autotune.py --intra 1 2 4 --inter 1 2 --batch-sizes 1 4 8 16 --runs 30
+    python autotune.py --dry-run
+
+TensorFlow reads its thread settings once per process, so every thread
+setting is measured in a fresh interpreter. The first one keeps the runtime
+defaults and is stored as the baseline. The profile records the host, the
+chosen settings and every measurement, so profiles from different nodes can
+be compared side by side.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from class_mappings import CLASS_MAPPINGS
+from image_processing import MODEL_INPUT_SIZE
+from runtime_profile import RUNTIME_PROFILE_PATH, available_cpus
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BATCH_SIZES = (1, 2, 4, 8, 16, 32)
+# The smallest batch reaching this share of the best throughput is chosen;
+# larger batches add waiting time for little gain
+THROUGHPUT_SHARE = 0.9
+
+
+def thread_candidates(cpus):
+    """Default (intra_op, inter_op) grid for a machine with `cpus` cores"""
+    intra = sorted({count for count in (1, 2, cpus // 4, cpus // 2, cpus) if 1 <= count <= cpus})
+    inter = sorted({count for count in (1, 2) if count <= cpus})
+    return [(i, j) for i in intra for j in inter]
+
+
+def candidate_env(intra_op, inter_op):
+    """Environment for one thread setting; (0, 0) keeps every runtime default"""
+    return {
+        'OMP_NUM_THREADS': str(intra_op) if intra_op else None,
+        'TF_INTRA_OP_THREADS': str(intra_op),
+        'TF_INTER_OP_THREADS': str(inter_op),
+        'BACKEND_THREADS': str(intra_op)
+    }
+
+
+def percentiles(timings):
+    return {
+        'p50': round(float(np.percentile(timings, 50)), 3),
+        'p95': round(float(np.percentile(timings, 95)), 3)
+    }
+
+
+def measure_model(model, batch_sizes, runs):
+    """Single-image latency and per-batch-size throughput of one loaded model"""
+    rng = np.random.default_rng(23)
+    latency = None
+    batch_ms, throughput = {}, {}
+    for size in batch_sizes:
+        batch = rng.random((size,) + MODEL_INPUT_SIZE + (3,), dtype=np.float32)
+        model.predict(batch, verbose=0)
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            model.predict(batch, verbose=0)
+            timings.append((time.perf_counter() - started) * 1000)
+        if size == 1:
+            latency = percentiles(timings)
+        batch_ms[str(size)] = percentiles(timings)['p50']
+        throughput[str(size)] = round(size * runs / (sum(timings) / 1000), 2)
+    return {'latency_ms': latency, 'batch_ms': batch_ms, 'throughput_ips': throughput}
+
+
+def run_worker(args):
+    """Subprocess entry point: load the models under the current environment and print one JSON line"""
+    from inference_backends import backend_for, backend_model_path, load_backend_model
+    from preprocess_pool import configure_tensorflow_threads
+
+    configure_tensorflow_threads()
+    results = {}
+    for name in args.models:
+        backend = backend_for(name)
+        model = load_backend_model(backend_model_path(name, backend))
+        results[name] = dict(measure_model(model, args.batch_sizes, args.runs), backend=backend)
+
+    tensorflow = sys.modules.get('tensorflow')
+    print(json.dumps({'models': results, 'tensorflow': tensorflow.__version__ if tensorflow else None}))
+
+
+def combine(models, batch_sizes):
+    """
+    Figures for serving one image per task in turn: latencies add up and
+    throughput is images per second through all the models.
+    """
+    summary = {
+        'latency_ms': {key: round(sum(m['latency_ms'][key] for m in models.values()), 3) for key in ('p50', 'p95')}
+        if 1 in batch_sizes else None,
+        'batch_ms': {},
+        'throughput_ips': {}
+    }
+    for size in map(str, batch_sizes):
+        summary['batch_ms'][size] = round(sum(m['batch_ms'][size] for m in models.values()), 3)
+        summary['throughput_ips'][size] = round(1 / sum(1 / m['throughput_ips'][size] for m in models.values()), 2)
+    return summary
+
+
+def measure_candidate(intra_op, inter_op, args):
+    env = dict(os.environ)
+    for key, value in candidate_env(intra_op, inter_op).items():
+        if value is None:
+            env.pop(key, None)
+        else:
+            env[key] = value
+
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--runs', str(args.runs),
+               '--models', *args.models, '--batch-sizes', *[str(size) for size in args.batch_sizes]]
+    process = subprocess.run(command, cwd=APP_DIR, env=env, capture_output=True, text=True)
+    result = {'intra_op': intra_op, 'inter_op': inter_op}
+    if process.returncode != 0:
+        result['error'] = (process.stderr.strip().splitlines() or ['unknown error'])[-1]
+        return result
+
+    measured = json.loads(process.stdout.strip().splitlines()[-1])
+    result.update(combine(measured['models'], args.batch_sizes))
+    result['models'] = measured['models']
+    result['tensorflow'] = measured['tensorflow']
+    return result
+
+
+def pick_batch_size(result, latency_budget_ms=None, share=THROUGHPUT_SHARE):
+    """Smallest batch size within `share` of the best throughput that fits the latency budget"""
+    sizes = [size for size in result['throughput_ips']
+             if latency_budget_ms is None or result['batch_ms'][size] <= latency_budget_ms]
+    if not sizes:
+        return 1
+    best = max(result['throughput_ips'][size] for size in sizes)
+    return min(int(size) for size in sizes if result['throughput_ips'][size] >= share * best)
+
+
+def select(results, objective, latency_budget_ms=None):
+    """The best measured thread setting (and its batch size) for the objective"""
+    measured = [result for result in results if 'error' not in result]
+    if not measured:
+        return None
+
+    for result in measured:
+        result['batch_size'] = pick_batch_size(result, latency_budget_ms)
+        result['best_throughput_ips'] = result['throughput_ips'][str(result['batch_size'])]
+
+    if objective == 'latency' and all(result['latency_ms'] for result in measured):
+        return min(measured, key=lambda r: (r['latency_ms']['p50'], -r['best_throughput_ips']))
+    return max(measured, key=lambda r: (r['best_throughput_ips'], -(r['latency_ms'] or {}).get('p50', 0)))
+
+
+def build_profile(best, baseline, results, args):
+    settings = {key: value for key, value in candidate_env(best['intra_op'], best['inter_op']).items() if value}
+    settings['INFERENCE_MAX_BATCH_SIZE'] = str(best['batch_size'])
+
+    def figures(result):
+        if result is None or 'error' in result:
+            return None
+        return {key: result[key] for key in ('latency_ms', 'batch_ms', 'throughput_ips')}
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'host': {
+            'node': platform.node(),
+            'cpus': available_cpus(),
+            'cpu_count': os.cpu_count(),
+            'processor': platform.processor(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'tensorflow': best.get('tensorflow')
+        },
+        'objective': args.objective,
+        'latency_budget_ms': args.latency_budget_ms,
+        'models': {name: result['backend'] for name, result in best['models'].items()},
+        'settings': settings,
+        'selected': dict(figures(best), batch_size=best['batch_size']),
+        'baseline': figures(baseline),
+        'candidates': [
+            {key: value for key, value in result.items() if key not in ('models', 'tensorflow')}
+            for result in results
+        ]
+    }
+
+
+def write_profile(profile, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def print_result(label, result):
+    if 'error' in result:
+        print(f"   {label:<18} failed: {result['error']}")
+        return
+    latency = result['latency_ms']['p50'] if result['latency_ms'] else '-'
+    best = max(result['throughput_ips'].values())
+    print(f"   {label:<18} p50 {latency} ms, up to {best} images/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune TensorFlow threads and batch size for this machine')
+    parser.add_argument('--models', nargs='+', choices=tuple(CLASS_MAPPINGS), default=list(CLASS_MAPPINGS))
+    parser.add_argument('--objective', choices=('latency', 'throughput'), default='latency',
+                        help='latency: fastest single upload; throughput: most images/sec')
+    parser.add_argument('--intra', type=int, nargs='+', help='intra-op thread counts to try')
+    parser.add_argument('--inter', type=int, nargs='+', help='inter-op thread counts to try')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=list(BATCH_SIZES))
+    parser.add_argument('--latency-budget-ms', type=float,
+                        help='Largest acceptable time for one batch through all the models')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--output', default=RUNTIME_PROFILE_PATH or 'models/runtime_profile.json')
+    parser.add_argument('--dry-run', action='store_true', help='Print the profile instead of writing it')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    cpus = available_cpus()
+    grid = thread_candidates(cpus)
+    if args.intra or args.inter:
+        grid = [(i, j) for i in (args.intra or sorted({i for i, _ in grid}))
+                for j in (args.inter or sorted({j for _, j in grid}))]
+
+    print(f"🎛️  Tuning {', '.join(args.models)} on {cpus} cores: {len(grid)} thread settings, "
+          f"batch sizes {args.batch_sizes}")
+    baseline = measure_candidate(0, 0, args)
+    print_result('defaults', baseline)
+    results = [baseline]
+    for intra_op, inter_op in grid:
+        result = measure_candidate(intra_op, inter_op, args)
+        print_result(f'intra {intra_op} inter {inter_op}', result)
+        results.append(result)
+
+    best = select(results, args.objective, args.latency_budget_ms)
+    if best is None:
+        sys.exit('No setting could be measured; check that the models load')
+
+    profile = build_profile(best, baseline, results, args)
+    if args.dry_run:
+        print(json.dumps(profile, indent=2))
+    else:
+        write_profile(profile, args.output)
+        print(f"✅ {profile['settings']} -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from image_processing import decode_image
+
+# Load environment variables
+load_dotenv()
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+MAX_SURVEY_IMAGES = int(os.getenv('SURVEY_MAX_IMAGES', '200'))
+SURVEY_DECODE_WORKERS = int(os.getenv('SURVEY_DECODE_WORKERS', str(min(8, os.cpu_count() or 1))))
+# Guard against zip bombs: total uncompressed size allowed from one archive
+MAX_ARCHIVE_BYTES = int(os.getenv('SURVEY_MAX_ARCHIVE_MB', '500')) * 1024 * 1024
+
+
+def is_image_name(filename):
+    return filename.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def read_archive(data, max_images=MAX_SURVEY_IMAGES):
+    """Yield (name, bytes) for every image inside a zip archive, refusing archives with more than max_images"""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and is_image_name(info.filename)
+                   and not os.path.basename(info.filename).startswith('.')]
+
+        # Counted from the archive directory, before any image is decompressed
+        if len(members) > max_images:
+            raise ValueError(f'Archive holds {len(members)} images; only {max_images} more fit in the survey')
+        if sum(info.file_size for info in members) > MAX_ARCHIVE_BYTES:
+            raise ValueError('Archive is too large once uncompressed')
+
+        for info in members:
+            yield info.filename, archive.read(info)
+
+
+def collect_survey_images(files, archives=(), max_images=MAX_SURVEY_IMAGES):
+    """
+    Gather (name, bytes) pairs from uploaded files and zip archives.
+
+    Files that are not png, jpg or jpeg are skipped. The image count is
+    checked before anything is read, so an oversized survey is refused
+    without buffering its photos.
+    """
+    files = [file for file in files if file and file.filename and is_image_name(file.filename)]
+    if len(files) > max_images:
+        raise ValueError(f'A survey can contain at most {max_images} images')
+    images = [(file.filename, file.read()) for file in files]
+
+    for archive in archives:
+        if archive and archive.filename:
+            images.extend(read_archive(archive.read(), max_images - len(images)))
+    return images
+
+
+def decode_survey_image(item):
+    """(name, image, None) for a (name, bytes) pair, or (name, None, error) when it cannot be read"""
+    name, data = item
+    try:
+        return name, decode_image(data), None
+    except Exception as e:
+        return name, None, str(e)
+
+
+def decode_images(images, workers=SURVEY_DECODE_WORKERS):
+    """Decode many images in parallel; PIL releases the GIL while decoding"""
+    if len(images) <= 1:
+        return [decode_survey_image(item) for item in images]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='survey-decode') as executor:
+        return list(executor.map(decode_survey_image, images))
+
+
+def summarize(results):
+    """Field-level class counts and mean confidence from per-image results"""
+    classified = [result for result in results if 'problem' in result]
+    class_counts = {}
+    confidence_totals = {}
+    for result in classified:
+        problem = result['problem']
+        class_counts[problem] = class_counts.get(problem, 0) + 1
+        confidence_totals[problem] = confidence_totals.get(problem, 0.0) + result['confidence']
+
+    classes = {
+        problem: {
+            'count': count,
+            'share': round(count / len(classified) * 100, 2),
+            'mean_confidence': round(confidence_totals[problem] / count, 2)
+        }
+        for problem, count in sorted(class_counts.items(), key=lambda item: -item[1])
+    }
+
+    return {
+        'total_images': len(results),
+        'classified': len(classified),
+        'failed': len(results) - len(classified),
+        'mean_confidence': round(sum(r['confidence'] for r in classified) / len(classified), 2) if classified else 0,
+        'most_common': next(iter(classes), None),
+        'classes': classes
+    }
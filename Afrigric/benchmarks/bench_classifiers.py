@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Classifier benchmark: cold load, single-image latency, batch throughput,
+preprocessing cost and peak memory for the disease, pest and nutrient models.
+
+Usage:
+    python benchmarks/bench_classifiers.py
+    python benchmarks/bench_classifiers.py --backend tflite --precision int8
+    python benchmarks/bench_classifiers.py --backend onnx
+    python benchmarks/bench_classifiers.py --output results.json --baseline benchmarks/baseline.json
+    python benchmarks/bench_classifiers.py --save-baseline benchmarks/baseline.json
+
+Runs offline on CPU with synthetic inputs; preprocessing is measured on the
+bundled static/images/default_maize.jpg and a synthetic 12 MP photo. Each
+model is measured in a fresh subprocess so load time and peak RSS are cold
+numbers. With --baseline the exit code is 1 when any metric is more than
+--tolerance worse than the stored run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import importlib
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from bench_utils import peak_rss_mb
+
+CLASSIFIERS = ('disease', 'pest', 'nutrient')
+BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64)
+SAMPLE_IMAGE = os.path.join(APP_DIR, 'static', 'images', 'default_maize.jpg')
+
+# Metric path -> True when a higher value is better
+COMPARED_METRICS = {
+    'load_seconds': False,
+    'latency_ms.p50': False,
+    'latency_ms.p95': False,
+    'latency_ms.p99': False,
+    'peak_rss_mb': False,
+}
+
+
+def percentiles(timings):
+    import numpy as np
+
+    return {
+        'p50': round(float(np.percentile(timings, 50)), 3),
+        'p95': round(float(np.percentile(timings, 95)), 3),
+        'p99': round(float(np.percentile(timings, 99)), 3),
+        'mean': round(statistics.mean(timings), 3)
+    }
+
+
+# Module each backend imports before it can load a model, timed as import_seconds
+RUNTIME_MODULES = {'onnx': 'onnxruntime', 'openvino': 'openvino'}
+
+
+def load_model(name, backend, precision):
+    from model_export import keras_model_path, tflite_model_path, uint8_model_path
+
+    if backend in RUNTIME_MODULES:
+        from inference_backends import backend_model_path, load_backend_model
+        return load_backend_model(backend_model_path(name, backend))
+
+    if backend == 'tflite':
+        from tflite_backend import TFLiteClassifier
+        return TFLiteClassifier(tflite_model_path(name, precision))
+
+    import tensorflow as tf
+    path = uint8_model_path(name) if backend == 'uint8' else keras_model_path(name)
+    return tf.keras.models.load_model(path)
+
+
+def run_worker(name, backend, precision, runs, batch_sizes):
+    """Measure one model inside this (fresh) process and print the result as JSON"""
+    import numpy as np
+
+    started = time.perf_counter()
+    # Imported up front so its cost is reported apart from the model load
+    importlib.import_module(RUNTIME_MODULES.get(backend, 'tensorflow'))
+    imported = time.perf_counter()
+    model = load_model(name, backend, precision)
+    loaded = time.perf_counter()
+
+    dtype = np.uint8 if backend == 'uint8' else np.float32
+    rng = np.random.default_rng(0)
+
+    def synthetic_batch(size):
+        if dtype == np.uint8:
+            return rng.integers(0, 256, (size, 224, 224, 3), dtype=np.uint8)
+        return rng.random((size, 224, 224, 3), dtype=np.float32)
+
+    single = synthetic_batch(1)
+    first_started = time.perf_counter()
+    model.predict(single, verbose=0)
+    first_ms = (time.perf_counter() - first_started) * 1000
+
+    timings = []
+    for _ in range(runs):
+        call_started = time.perf_counter()
+        model.predict(single, verbose=0)
+        timings.append((time.perf_counter() - call_started) * 1000)
+
+    throughput = {}
+    for size in batch_sizes:
+        batch = synthetic_batch(size)
+        model.predict(batch, verbose=0)
+        repeats = max(3, 64 // size)
+        batch_started = time.perf_counter()
+        for _ in range(repeats):
+            model.predict(batch, verbose=0)
+        elapsed = time.perf_counter() - batch_started
+        throughput[str(size)] = round(size * repeats / elapsed, 2)
+
+    print(json.dumps({
+        'import_seconds': round(imported - started, 3),
+        'load_seconds': round(loaded - imported, 3),
+        'first_predict_ms': round(first_ms, 2),
+        'latency_ms': percentiles(timings),
+        'throughput_ips': throughput,
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }))
+
+
+def measure_model(name, args):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', name,
+               '--backend', args.backend, '--precision', args.precision, '--runs', str(args.runs),
+               '--batch-sizes', *[str(size) for size in args.batch_sizes]]
+    process = subprocess.run(command, cwd=APP_DIR, capture_output=True, text=True)
+    if process.returncode != 0:
+        error = (process.stderr.strip().splitlines() or ['unknown error'])[-1]
+        return {'error': error}
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def measure_preprocessing(runs):
+    """preprocess_image cost on the bundled sample and on a synthetic 12 MP photo"""
+    import numpy as np
+    from PIL import Image
+    from image_processing import preprocess_image
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        large = os.path.join(tmp, 'synthetic_12mp.jpg')
+        texture = np.random.default_rng(12).integers(0, 255, (250, 333, 3), dtype=np.uint8)
+        Image.fromarray(texture).resize((4000, 3000), Image.BICUBIC).save(large, 'JPEG', quality=90)
+
+        for label, path in (('sample', SAMPLE_IMAGE), ('synthetic_12mp', large)):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            preprocess_image(data)
+            timings = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                preprocess_image(data)
+                timings.append((time.perf_counter() - started) * 1000)
+            results[label] = percentiles(timings)
+    return results
+
+
+def metric(result, path):
+    value = result
+    for key in path.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(results, baseline, tolerance):
+    """Per-metric change against a baseline run; returns (rows, regressions)"""
+    rows, regressions = [], []
+
+    def check(label, current, previous, higher_is_better):
+        if current is None or not previous:
+            return
+        change = (current - previous) / previous
+        worse = -change if higher_is_better else change
+        row = {'metric': label, 'baseline': previous, 'current': current, 'change': round(change, 4)}
+        rows.append(row)
+        if worse > tolerance:
+            regressions.append(row)
+
+    for name, result in results['models'].items():
+        previous = baseline.get('models', {}).get(name, {})
+        for path, higher_is_better in COMPARED_METRICS.items():
+            check(f'{name}.{path}', metric(result, path), metric(previous, path), higher_is_better)
+        for size, value in result.get('throughput_ips', {}).items():
+            check(f'{name}.throughput_ips.{size}', value, metric(previous, f'throughput_ips.{size}'), True)
+
+    for label, result in results['preprocess'].items():
+        check(f'preprocess.{label}.p50', result['p50'], metric(baseline.get('preprocess', {}), f'{label}.p50'), False)
+
+    return rows, regressions
+
+
+def host_info():
+    info = {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'processor': platform.processor()
+    }
+    try:
+        import tensorflow as tf
+        info['tensorflow'] = tf.__version__
+    except ImportError:
+        info['tensorflow'] = None
+    return info
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the maize classifiers on CPU')
+    parser.add_argument('--models', nargs='+', choices=CLASSIFIERS, default=list(CLASSIFIERS))
+    parser.add_argument('--backend', choices=('keras', 'tflite', 'uint8', 'onnx', 'openvino'), default='keras')
+    parser.add_argument('--precision', choices=('float16', 'int8'), default='int8', help='TFLite precision')
+    parser.add_argument('--runs', type=int, default=100, help='Single-image predictions per model')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=list(BATCH_SIZES))
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='Compare against a previous results file')
+    parser.add_argument('--save-baseline', help='Write these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed slowdown before failing (0.10 = 10%%)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.backend, args.precision, args.runs, args.batch_sizes)
+        return 0
+
+    results = {'host': host_info(), 'backend': args.backend, 'models': {}}
+    for name in args.models:
+        print(f"📦 Benchmarking {name} model ({args.backend})...")
+        results['models'][name] = measure_model(name, args)
+        result = results['models'][name]
+        if 'error' in result:
+            print(f"❌ {name}: {result['error']}")
+            continue
+        latency = result['latency_ms']
+        print(f"   load {result['load_seconds']}s, p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+              f"p99 {latency['p99']} ms, peak RSS {result['peak_rss_mb']} MB")
+        print('   throughput (img/s): ' + ', '.join(f"{size}: {ips}" for size, ips in result['throughput_ips'].items()))
+
+    print("📦 Benchmarking preprocess_image...")
+    results['preprocess'] = measure_preprocessing(min(args.runs, 50))
+    for label, result in results['preprocess'].items():
+        print(f"   {label}: p50 {result['p50']} ms, p95 {result['p95']} ms")
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows, regressions = compare(results, json.load(f), args.tolerance)
+        results['comparison'] = {'baseline': args.baseline, 'tolerance': args.tolerance,
+                                 'metrics': rows, 'regressions': regressions}
+        print(f"\n{'metric':<36}{'baseline':>12}{'current':>12}{'change':>10}")
+        for row in rows:
+            flag = '  ⚠️' if row in regressions else ''
+            print(f"{row['metric']:<36}{row['baseline']:>12}{row['current']:>12}{row['change'] * 100:>9.1f}%{flag}")
+        if regressions:
+            print(f"\n❌ {len(regressions)} metric(s) regressed by more than {args.tolerance * 100:.0f}%")
+            status = 1
+        else:
+            print("\n✅ No regressions against the baseline")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"📝 Results written to {path}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Decode benchmark: full-resolution decode vs. reduced-resolution (draft mode) decode.
+
+Usage:
+    python benchmarks/bench_decode.py                   # synthetic 12/24/48 MP photos
+    python benchmarks/bench_decode.py --images photos/  # your own photos
+    python benchmarks/bench_decode.py --output decode.json
+
+Every (mode, image) pair is measured in a fresh subprocess so the peak RSS
+numbers are not polluted by earlier runs.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import peak_rss_mb
+
+SYNTHETIC_MEGAPIXELS = (12, 24, 48)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def make_synthetic_photo(path, megapixels):
+    """Write a 4:3 JPEG with enough texture to behave like a leaf photo"""
+    import numpy as np
+    from PIL import Image
+
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(megapixels)
+    texture = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+    texture[..., 1] = np.maximum(texture[..., 1], 120)  # mostly green
+    Image.fromarray(texture).resize((width, height), Image.BICUBIC).save(path, 'JPEG', quality=90)
+
+
+def run_worker(mode, path, repeats):
+    """Measure one mode on one image inside this (fresh) process"""
+    from image_processing import decode_image, image_to_array
+
+    baseline_rss = peak_rss_mb()
+    fast = mode == 'draft'
+
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        image_to_array(decode_image(path, fast=fast))
+        timings.append((time.perf_counter() - started) * 1000)
+
+    print(json.dumps({
+        'median_ms': round(statistics.median(timings), 1),
+        'min_ms': round(min(timings), 1),
+        'peak_rss_delta_mb': round(peak_rss_mb() - baseline_rss, 1)
+    }))
+
+
+def measure(mode, path, repeats):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', mode, path, '--repeats', str(repeats)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark full vs. draft-mode image decoding')
+    parser.add_argument('--images', help='Folder of photos to use instead of synthetic ones')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--worker', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker[0], args.worker[1], args.repeats)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images:
+            paths = sorted(os.path.join(args.images, name) for name in os.listdir(args.images)
+                           if name.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths = []
+            for megapixels in SYNTHETIC_MEGAPIXELS:
+                path = os.path.join(tmp, f'synthetic_{megapixels}mp.jpg')
+                print(f"Generating {megapixels} MP sample photo...")
+                make_synthetic_photo(path, megapixels)
+                paths.append(path)
+
+        results = []
+        print(f"\n{'image':<28}{'full ms':>10}{'draft ms':>10}{'full MB':>10}{'draft MB':>10}{'speedup':>10}")
+        for path in paths:
+            full = measure('full', path, args.repeats)
+            draft = measure('draft', path, args.repeats)
+            speedup = full['median_ms'] / draft['median_ms'] if draft['median_ms'] else 0
+            results.append({'image': os.path.basename(path), 'full': full, 'draft': draft,
+                            'speedup': round(speedup, 2)})
+            print(f"{os.path.basename(path):<28}{full['median_ms']:>10}{draft['median_ms']:>10}"
+                  f"{full['peak_rss_delta_mb']:>10}{draft['peak_rss_delta_mb']:>10}{speedup:>9.1f}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📝 Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
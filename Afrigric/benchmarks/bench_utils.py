@@ -0,0 +1,18 @@
+"""Helpers shared by the benchmark scripts"""
+
+import resource
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB"""
+    # VmHWM belongs to the current address space; ru_maxrss would also count
+    # the parent's peak, which is inherited across fork/exec
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Offline bulk classification of image folders.
+
+Walks a directory tree and decodes the photos in a pool of worker
+processes. Each batch runs through the disease, pest and/or nutrient
+classifier on the main process, and the results stream to CSV or Parquet.
+Decoding the next photos overlaps with inference on the current batch.
+Only a fixed number of decoded batches are held at once, so memory stays
+flat however large the folder is.
+
+Usage:
+    python bulk_classify.py photos/ --output results.csv
+    python bulk_classify.py photos/ --models disease pest --output results.parquet --workers 8
+
+Every finished batch is recorded in a checkpoint file (<output>.checkpoint).
+Running the same command again skips the photos already classified; pass
+--restart to start over. A crash can repeat at most the batch that was
+being written. Parquet output is a folder with one part file per run
+(pandas.read_parquet reads it as one table); it needs pyarrow.
+
+The models are the ones the server would use: the active model registry
+version of each task when there is one (checksums verified, labels from its
+manifest), otherwise INFERENCE_BACKEND / INFERENCE_BACKEND_<TASK> with
+labels from class_mappings.py.
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_diagnosis import is_image_name
+from class_mappings import CLASS_MAPPINGS
+from image_processing import decode_image, image_to_array
+from model_registry import ManifestError, class_mapping, model_registry
+
+# Photos decoded per worker task; larger chunks mean fewer round trips between processes
+DECODE_CHUNK_SIZE = 16
+
+
+def iter_images(root, done=()):
+    """Relative paths of the images under root, in a stable order, skipping `done`"""
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            if not is_image_name(filename) or filename.startswith('.'):
+                continue
+            path = os.path.relpath(os.path.join(directory, filename), root)
+            if path not in done:
+                yield path
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def decode_chunk(root, paths):
+    """Worker process: (path, uint8 pixels or None, error) for each photo"""
+    decoded = []
+    for path in paths:
+        try:
+            img = decode_image(os.path.join(root, path))
+            decoded.append((path, image_to_array(img, dtype=np.uint8)[0], None))
+        except Exception as e:
+            decoded.append((path, None, str(e)))
+    return decoded
+
+
+def decoded_images(root, paths, workers, prefetch):
+    """Yield decode_chunk() results in order, with at most `prefetch` chunks in flight"""
+    chunks = chunked(paths, DECODE_CHUNK_SIZE)
+    if workers <= 0:
+        for chunk in chunks:
+            yield from decode_chunk(root, chunk)
+        return
+
+    # Fresh interpreters: the workers never inherit TensorFlow's threads
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(decode_chunk, root, chunk))
+            if len(pending) >= prefetch:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class Checkpoint:
+    """Append-only list of the photos whose results have been written"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return {line.rstrip('\n') for line in f if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def record(self, paths):
+        with open(self.path, 'a') as f:
+            f.writelines(f'{path}\n' for path in paths)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def result_columns(names):
+    columns = ['path']
+    for name in names:
+        columns += [name, f'{name}_confidence']
+    return columns + ['error']
+
+
+class CsvResultWriter:
+    def __init__(self, path, columns, append):
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path))
+        self.file = open(path, 'a' if append else 'w', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=columns)
+        if write_header:
+            self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetResultWriter:
+    """Writes one row group per batch into a new part file of the output folder"""
+
+    def __init__(self, path, columns, append):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit('Parquet output needs pyarrow: pip install pyarrow')
+
+        self.pa = pa
+        if not append and os.path.isdir(path):
+            for filename in os.listdir(path):
+                if filename.startswith('part-'):
+                    os.remove(os.path.join(path, filename))
+        os.makedirs(path, exist_ok=True)
+        part = len([filename for filename in os.listdir(path) if filename.startswith('part-')])
+        fields = [(column, pa.float32() if column.endswith('_confidence') else pa.string()) for column in columns]
+        self.schema = pa.schema(fields)
+        self.writer = pq.ParquetWriter(os.path.join(path, f'part-{part:05d}.parquet'), self.schema)
+
+    def write(self, rows):
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_writer(path, columns, append):
+    if path.endswith('.parquet'):
+        return ParquetResultWriter(path, columns, append)
+    return CsvResultWriter(path, columns, append)
+
+
+class TaskModel:
+    """A loaded classifier with the labels and input type it is served with"""
+
+    __slots__ = ('model', 'classes', 'input_dtype')
+
+    def __init__(self, model, classes, input_dtype='float32'):
+        self.model = model
+        self.classes = classes
+        self.input_dtype = input_dtype
+
+
+def classify_batch(models, pixels):
+    """{task: (labels, confidences)} for a uint8 (n, H, W, 3) batch"""
+    batch = None
+    results = {}
+    for name, task in models.items():
+        if task.input_dtype == 'uint8':
+            inputs = pixels
+        else:
+            if batch is None:
+                batch = pixels.astype(np.float32) / 255.0
+            inputs = batch
+        probabilities = np.asarray(task.model.predict(inputs, verbose=0))
+        classes = np.argmax(probabilities, axis=1)
+        results[name] = ([task.classes[int(index)] for index in classes],
+                         probabilities[np.arange(len(classes)), classes])
+    return results
+
+
+def classify_directory(root, models, writer, checkpoint, batch_size=64, workers=0, report_every=10.0):
+    """Classify every image under root that the checkpoint has not seen; returns a summary dict"""
+    done = checkpoint.load()
+    prefetch = max(2, workers * 2) + batch_size // DECODE_CHUNK_SIZE
+    images = decoded_images(root, iter_images(root, done), workers, prefetch)
+
+    started = last_report = time.perf_counter()
+    processed = errors = 0
+    for chunk in chunked(images, batch_size):
+        rows = [{'path': path, 'error': error} for path, _, error in chunk]
+        valid = [index for index, (_, pixels, _) in enumerate(chunk) if pixels is not None]
+        if valid:
+            results = classify_batch(models, np.stack([chunk[index][1] for index in valid]))
+            for position, index in enumerate(valid):
+                for name, (labels, confidences) in results.items():
+                    rows[index][name] = labels[position]
+                    rows[index][f'{name}_confidence'] = round(float(confidences[position]), 4)
+
+        writer.write(rows)
+        checkpoint.record([row['path'] for row in rows])
+        processed += len(rows)
+        errors += len(rows) - len(valid)
+
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            print(f"   {processed} images, {processed / (now - started):.1f} images/sec")
+            last_report = now
+
+    elapsed = time.perf_counter() - started
+    return {
+        'skipped': len(done),
+        'processed': processed,
+        'errors': errors,
+        'seconds': round(elapsed, 2),
+        'images_per_sec': round(processed / elapsed, 2) if elapsed > 0 else 0.0
+    }
+
+
+def resolve_model(name, registry=model_registry):
+    """(path, classes, input_dtype) the server would serve a task from"""
+    from inference_backends import backend_for, backend_model_path
+
+    version = registry.active_version(name)
+    if version:
+        try:
+            manifest = registry.verify(name, version)
+            return (registry.model_path(name, version), class_mapping(manifest),
+                    manifest.get('input_dtype', 'float32'))
+        except ManifestError as e:
+            print(f"⚠️  Ignoring registry version of {name}: {str(e)}")
+    return backend_model_path(name, backend_for(name)), CLASS_MAPPINGS[name], 'float32'
+
+
+def load_models(names, registry=model_registry):
+    from inference_backends import load_backend_model
+
+    models = {}
+    for name in names:
+        path, classes, input_dtype = resolve_model(name, registry)
+        print(f"📦 Loading {name} model from {path}")
+        models[name] = TaskModel(load_backend_model(path), classes, input_dtype)
+    return models
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify every image under a folder')
+    parser.add_argument('input', help='Folder to walk (sub-folders included)')
+    parser.add_argument('--output', required=True, help='.csv file, or .parquet folder')
+    parser.add_argument('--models', nargs='+', choices=tuple(CLASS_MAPPINGS), default=list(CLASS_MAPPINGS))
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Decode processes (0 decodes on the main process)')
+    parser.add_argument('--checkpoint', help='Default: <output>.checkpoint')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and overwrite the output')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input):
+        sys.exit(f'{args.input} is not a folder')
+
+    checkpoint = Checkpoint(args.checkpoint or f'{args.output.rstrip(os.sep)}.checkpoint')
+    if args.restart:
+        checkpoint.clear()
+
+    models = load_models(args.models)
+    writer = open_writer(args.output, result_columns(args.models), append=not args.restart)
+    try:
+        summary = classify_directory(args.input, models, writer, checkpoint, args.batch_size, args.workers)
+    finally:
+        writer.close()
+
+    print(f"✅ {summary['processed']} images classified ({summary['errors']} unreadable, "
+          f"{summary['skipped']} already done) in {summary['seconds']} s: "
+          f"{summary['images_per_sec']} images/sec -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
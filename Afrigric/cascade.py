@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Confidence-gated model cascade: a small model answers first and the full
+model only sees the images the small model is unsure about.
+
+The small models live next to the full ones as models/<task>_model_small.keras
+and take the same 224x224 input (a student from a lower input resolution
+resizes inside its graph). Serving is switched on with CASCADE=true.
+
+Pick a threshold on a held-out set before turning it on:
+
+    python cascade.py evaluate --data-dir heldout/
+    python cascade.py evaluate --data-dir heldout/ --models pest --thresholds 0.8 0.9 0.95
+
+`--data-dir` holds one folder per task, each with one sub-folder per class
+named as in the training data; classes are numbered in sorted folder order,
+the same way flow_from_directory numbered them during training.
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+CASCADE_ENABLED = os.getenv('CASCADE', 'false').lower() == 'true'
+# Small-model top-1 probability below which the full model is consulted
+CASCADE_THRESHOLD = float(os.getenv('CASCADE_THRESHOLD', '0.9'))
+DEFAULT_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99)
+
+# Per-image routing decisions, at DEBUG level
+logger = logging.getLogger('cascade')
+# Level the server logs the cascade logger at; DEBUG shows every decision
+CASCADE_LOG_LEVEL = os.getenv('CASCADE_LOG_LEVEL', 'DEBUG').upper()
+
+
+def configure_logging(level=CASCADE_LOG_LEVEL):
+    """Send the cascade logger to stderr at `level`; the app configures no logging of its own"""
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+
+def small_model_path(name):
+    return os.path.join('models', f'{name}_model_small.keras')
+
+
+class CascadeStats:
+    """Counts how many images each task answers with the small model"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, images, escalated, fallback=False):
+        with self._lock:
+            counts = self._counts.setdefault(name, {'images': 0, 'escalated': 0, 'fallback': 0})
+            counts['images'] += images
+            counts['escalated'] += escalated
+            if fallback:
+                counts['fallback'] += images
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                name: {
+                    **counts,
+                    'escalation_rate': round(counts['escalated'] / counts['images'], 4) if counts['images'] else 0
+                }
+                for name, counts in self._counts.items()
+            }
+
+
+# Global instance
+cascade_stats = CascadeStats()
+
+
+def run_cascade(name, batch, small_predict, full_predict, threshold=CASCADE_THRESHOLD, stats=None):
+    """
+    Class probabilities for a batch, escalating uncertain images to the full model.
+
+    small_predict(batch) and full_predict(batch) return (n, classes) softmax
+    arrays. Returns the probabilities and a boolean mask of escalated images.
+    """
+    probabilities = np.array(small_predict(batch), dtype=np.float32)
+    confidence = probabilities.max(axis=1)
+    escalate = confidence < threshold
+
+    if escalate.any():
+        probabilities[escalate] = full_predict(batch[escalate])
+
+    if logger.isEnabledFor(logging.DEBUG):
+        for index, score in enumerate(confidence):
+            path = f'escalated to full model ({score:.2f} < {threshold:.2f})' if escalate[index] else f'small model ({score:.2f})'
+            logger.debug('%s: %s', name, path)
+
+    if stats is not None:
+        stats.record(name, len(batch), int(escalate.sum()))
+    return probabilities, escalate
+
+
+def sweep_thresholds(labels, small_probabilities, full_probabilities, thresholds, small_ms=0.0, full_ms=0.0):
+    """Accuracy and escalation rate of the cascade at each threshold"""
+    small_pred = np.argmax(small_probabilities, axis=1)
+    full_pred = np.argmax(full_probabilities, axis=1)
+    small_confidence = np.max(small_probabilities, axis=1)
+
+    rows = []
+    for threshold in thresholds:
+        escalate = small_confidence < threshold
+        cascade_pred = np.where(escalate, full_pred, small_pred)
+        rate = float(np.mean(escalate))
+        rows.append({
+            'threshold': threshold,
+            'escalation_rate': round(rate, 4),
+            'accuracy': round(float(np.mean(cascade_pred == labels)), 4),
+            # Every image pays for the small model; escalated ones also pay for the full one
+            'expected_latency_ms': round(small_ms + rate * full_ms, 2)
+        })
+    return {
+        'images': int(len(labels)),
+        'small_accuracy': round(float(np.mean(small_pred == labels)), 4),
+        'full_accuracy': round(float(np.mean(full_pred == labels)), 4),
+        'small_latency_ms': round(small_ms, 2),
+        'full_latency_ms': round(full_ms, 2),
+        'thresholds': rows
+    }
+
+
+def load_labelled_images(directory, limit=None):
+    """Images and integer labels from a folder of class sub-folders"""
+    from model_export import find_images, load_image
+
+    classes = sorted(entry for entry in os.listdir(directory) if os.path.isdir(os.path.join(directory, entry)))
+    images, labels = [], []
+    for label, class_name in enumerate(classes):
+        for path in find_images(os.path.join(directory, class_name), limit=limit):
+            images.append(load_image(path))
+            labels.append(label)
+    return classes, np.stack(images), np.array(labels)
+
+
+def predict_with_latency(model, images, batch_size=32):
+    """Probabilities for all images and the mean single-image latency in ms"""
+    probabilities = np.concatenate([
+        model.predict(images[start:start + batch_size], verbose=0)
+        for start in range(0, len(images), batch_size)
+    ])
+
+    sample = images[:1]
+    model.predict(sample, verbose=0)
+    runs = 20
+    started = time.perf_counter()
+    for _ in range(runs):
+        model.predict(sample, verbose=0)
+    return probabilities, (time.perf_counter() - started) / runs * 1000
+
+
+def evaluate(names, data_dir, thresholds, limit=None):
+    """Compare small, full and cascaded predictions on held-out images"""
+    import tensorflow as tf
+    from model_export import keras_model_path
+
+    report = {}
+    for name in names:
+        directory = os.path.join(data_dir, name)
+        if not os.path.isdir(directory):
+            print(f"⚠️  No held-out images for {name} in {directory}; skipping")
+            continue
+
+        classes, images, labels = load_labelled_images(directory, limit)
+        small = tf.keras.models.load_model(small_model_path(name))
+        full = tf.keras.models.load_model(keras_model_path(name))
+        small_probabilities, small_ms = predict_with_latency(small, images)
+        full_probabilities, full_ms = predict_with_latency(full, images)
+
+        report[name] = sweep_thresholds(labels, small_probabilities, full_probabilities, thresholds, small_ms, full_ms)
+        report[name]['classes'] = classes
+
+        print(f"\n{name}: {len(labels)} images, small {report[name]['small_accuracy'] * 100:.2f}% "
+              f"({small_ms:.1f} ms), full {report[name]['full_accuracy'] * 100:.2f}% ({full_ms:.1f} ms)")
+        print(f"{'threshold':>10}{'escalated':>12}{'accuracy':>10}{'latency ms':>12}")
+        for row in report[name]['thresholds']:
+            print(f"{row['threshold']:>10}{row['escalation_rate'] * 100:>11.1f}%"
+                  f"{row['accuracy'] * 100:>9.2f}%{row['expected_latency_ms']:>12}")
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate the small/full model cascade on held-out images')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    evaluate_parser = subparsers.add_parser('evaluate', help='Sweep confidence thresholds on a held-out set')
+    evaluate_parser.add_argument('--data-dir', required=True, help='Folder with <task>/<class>/ image folders')
+    evaluate_parser.add_argument('--models', nargs='+', choices=('disease', 'pest', 'nutrient'),
+                                 default=['disease', 'pest', 'nutrient'])
+    evaluate_parser.add_argument('--thresholds', nargs='+', type=float, default=list(DEFAULT_THRESHOLDS))
+    evaluate_parser.add_argument('--limit', type=int, help='Images per class at most')
+    evaluate_parser.add_argument('--report', default=os.path.join('models', 'cascade_report.json'))
+
+    args = parser.parse_args()
+    report = evaluate(args.models, args.data_dir, args.thresholds, args.limit)
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📝 Cascade report written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
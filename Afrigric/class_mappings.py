@@ -0,0 +1,40 @@
+"""Class index -> label for each classifier, in the models' output order"""
+
+DISEASE_MAPPING = {
+    0: 'Blight', 
+    1: 'Common_Rust', 
+    2: 'Gray_Leaf_Spot', 
+    3: 'Healthy'
+}
+
+PEST_MAPPING = {
+    0: 'Ants', 
+    1: 'Aphids', 
+    2: 'Caterpillar', 
+    3: 'Corn Worm', 
+    4: 'Earwig', 
+    5: 'Fall Armyworm', 
+    6: 'Grasshopper', 
+    7: 'Leaf Beetle', 
+    8: 'Mole Cricket', 
+    9: 'Red Spider', 
+    10: 'Slug', 
+    11: 'Snail', 
+    12: 'Stem Borer', 
+    13: 'Weevil'
+}
+
+NUTRIENT_MAPPING = {
+    0: 'Healthy (No Deficiency)', 
+    1: 'All Nutrients Deficient', 
+    2: 'Potassium Deficiency', 
+    3: 'Nitrogen Deficiency', 
+    4: 'Phosphorus Deficiency', 
+    5: 'Zinc Deficiency'
+}
+
+CLASS_MAPPINGS = {
+    'disease': DISEASE_MAPPING,
+    'pest': PEST_MAPPING,
+    'nutrient': NUTRIENT_MAPPING
+}
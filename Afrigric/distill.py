@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Distill the maize classifiers into compact student models.
+
+Each teacher (models/<task>_model.keras) labels the training photos with its
+softened class probabilities. A student with a narrower MobileNetV2 backbone
+(lower width multiplier) running at a lower input resolution then learns
+from those probabilities together with the true labels. Optionally the
+student's backbone is pruned afterwards: whole expansion channels of each
+inverted-residual block are removed and the student is fine-tuned again. The
+removed channels really are gone from the model, so it gets smaller and
+faster on any runtime, not just sparser.
+
+Usage:
+    python distill.py --data-dir data/
+    python distill.py --data-dir data/ --models pest --alpha 0.5 --resolution 128 --prune 0.3
+    python distill.py --data-dir data/ --install small      # cascade small model
+    python distill.py --data-dir data/ --install full       # publish and activate in the registry
+
+`--data-dir` holds one folder per task, each with one sub-folder per class
+named as in the training data (classes are numbered in sorted folder order,
+like flow_from_directory). A fixed share of every class is held out, and
+the report compares teacher and student on it: accuracy, top-1 agreement,
+single-image latency, parameters and file size.
+
+Students keep the teachers' interface: 224x224 RGB input scaled to [0, 1]
+(the lower resolution is reached by resizing inside the graph) and the same
+softmax output. They can therefore be served as the cascade's small model or
+in place of the full model. `--install full` publishes the student as a new
+model_registry.py version and activates it, so running servers switch to it
+and `model_registry.py rollback` brings the teacher back. The .keras file is
+only served directly by the keras backend with float32 inputs, so the full
+install is refused for the other backends, for MODEL_INPUT_DTYPE=uint8 and for
+SHARED_BACKBONE, whose model files are derived from the teacher. Runs are
+reproducible for a given --seed.
+"""
+
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+
+from cascade import predict_with_latency, small_model_path
+from class_mappings import CLASS_MAPPINGS
+from inference_backends import backend_for
+from model_export import CLASSIFIERS, MODELS_DIR, find_images, keras_model_path, load_image
+
+# MobileNetV2 resolutions with ImageNet weights; others start from those for 224
+IMAGENET_RESOLUTIONS = (96, 128, 160, 192, 224)
+# Width multipliers keras.applications.MobileNetV2 has ImageNet weights for
+MOBILENET_ALPHAS = (0.35, 0.5, 0.75, 1.0, 1.3, 1.4)
+# Pruned channel counts are kept at multiples of this, which vectorized kernels prefer
+CHANNEL_MULTIPLE = 8
+# Layers of an inverted-residual block whose width follows its expansion channels
+BLOCK_LAYERS = ('expand', 'expand_BN', 'depthwise', 'depthwise_BN', 'project')
+
+
+def student_model_path(name):
+    return os.path.join(MODELS_DIR, f'{name}_model_student.keras')
+
+
+def load_labelled_pixels(directory, limit=None):
+    """uint8 images and integer labels from a folder of class sub-folders"""
+    classes = sorted(entry for entry in os.listdir(directory) if os.path.isdir(os.path.join(directory, entry)))
+    images, labels = [], []
+    for label, class_name in enumerate(classes):
+        for path in find_images(os.path.join(directory, class_name), limit=limit):
+            images.append(load_image(path, dtype=np.uint8))
+            labels.append(label)
+    return classes, np.stack(images), np.array(labels)
+
+
+def split_indices(labels, holdout, seed):
+    """Train and held-out indices with the same share of every class held out"""
+    rng = np.random.default_rng(seed)
+    train, heldout = [], []
+    for label in np.unique(labels):
+        indices = rng.permutation(np.flatnonzero(labels == label))
+        count = int(round(len(indices) * holdout)) if len(indices) > 1 else 0
+        heldout.extend(indices[:count])
+        train.extend(indices[count:])
+    return np.sort(np.array(train, dtype=np.int64)), np.sort(np.array(heldout, dtype=np.int64))
+
+
+def build_student(num_classes, alpha, resolution, backbone=None, weights='imagenet', name=None):
+    """
+    Student with the teachers' layout: 224x224 [0, 1] input, MobileNetV2
+    backbone, pooling, Dense(128) and a softmax layer.
+    """
+    import tensorflow as tf
+    from tensorflow.keras import layers
+
+    if backbone is None:
+        if weights == 'imagenet' and resolution not in IMAGENET_RESOLUTIONS:
+            print(f"⚠️  No ImageNet weights for {resolution} px; starting from the 224 px weights")
+        backbone = tf.keras.applications.MobileNetV2(
+            input_shape=(resolution, resolution, 3), alpha=alpha, include_top=False, weights=weights
+        )
+
+    inputs = tf.keras.Input(shape=(224, 224, 3))
+    x = layers.Resizing(resolution, resolution, name='student_resize')(inputs)
+    # MobileNetV2 was pretrained on [-1, 1] inputs
+    x = layers.Rescaling(2.0, offset=-1.0, name='student_rescale')(x)
+    x = backbone(x)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dense(128, activation='relu')(x)
+    x = layers.Dropout(0.5)(x)
+    outputs = layers.Dense(num_classes, activation='softmax')(x)
+    return tf.keras.Model(inputs, outputs, name=name or f'student_{alpha}_{resolution}')
+
+
+def distillation_loss(num_classes, temperature, alpha):
+    """
+    alpha * T^2 * KL(teacher_T || student_T) + (1 - alpha) * cross-entropy.
+
+    Targets are [one-hot labels | teacher log-probabilities]. Both models end
+    in a softmax, and log-probabilities differ from logits only by a
+    constant, so dividing them by T softens the distributions the same way.
+    """
+    import tensorflow as tf
+
+    def loss(targets, probabilities):
+        labels, teacher_log_probs = targets[:, :num_classes], targets[:, num_classes:]
+        student_log_probs = tf.math.log(tf.clip_by_value(probabilities, 1e-7, 1.0))
+        hard = tf.keras.losses.categorical_crossentropy(labels, probabilities)
+        soft = tf.keras.losses.kl_divergence(
+            tf.nn.softmax(teacher_log_probs / temperature),
+            tf.nn.softmax(student_log_probs / temperature)
+        )
+        return alpha * temperature ** 2 * soft + (1 - alpha) * hard
+
+    return loss
+
+
+def teacher_targets(teacher_probabilities, labels, num_classes):
+    """[one-hot labels | teacher log-probabilities] rows for distillation_loss"""
+    one_hot = np.eye(num_classes, dtype=np.float32)[labels]
+    log_probs = np.log(np.clip(teacher_probabilities, 1e-7, 1.0)).astype(np.float32)
+    return np.concatenate([one_hot, log_probs], axis=1)
+
+
+def train_student(student, pixels, targets, args, epochs, learning_rate):
+    import tensorflow as tf
+
+    num_classes = student.output_shape[-1]
+    dataset = (
+        tf.data.Dataset.from_tensor_slices((pixels, targets))
+        .shuffle(len(pixels), seed=args.seed)
+        .batch(args.batch_size)
+        .map(lambda x, y: (tf.cast(x, tf.float32) / 255.0, y), num_parallel_calls=tf.data.AUTOTUNE)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+    student.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+        loss=distillation_loss(num_classes, args.temperature, args.distill_weight)
+    )
+    student.fit(dataset, epochs=epochs, verbose=2)
+    return student
+
+
+def predict_all(model, pixels, batch_size=64):
+    return np.concatenate([
+        model.predict(pixels[start:start + batch_size].astype(np.float32) / 255.0, verbose=0)
+        for start in range(0, len(pixels), batch_size)
+    ])
+
+
+def channel_scores(kernel, gamma, variance, epsilon=1e-3):
+    """
+    Importance of each output channel of a 1x1 expansion conv: the L1 norm of
+    its filter scaled by the following batch norm, i.e. the filter as it
+    acts after BN folding.
+    """
+    l1 = np.abs(kernel).reshape(-1, kernel.shape[-1]).sum(axis=0)
+    return l1 * np.abs(gamma) / np.sqrt(variance + epsilon)
+
+
+def kept_channels(scores, ratio, multiple=CHANNEL_MULTIPLE):
+    """Sorted indices of the channels that survive pruning `ratio` of them"""
+    total = len(scores)
+    keep = int(np.ceil(total * (1 - ratio) / multiple) * multiple)
+    keep = min(total, max(multiple, keep))
+    return np.sort(np.argsort(scores)[::-1][:keep])
+
+
+def slice_block(weights, keep):
+    """
+    Weights of one inverted-residual block with only the `keep` expansion channels.
+
+    `weights` maps 'expand', 'expand_BN', 'depthwise', 'depthwise_BN' and
+    'project' to their get_weights() lists. The block's input and output
+    widths stay as they were, so residual connections are unaffected.
+    """
+    return {
+        'expand': [weights['expand'][0][..., keep]],
+        'expand_BN': [array[keep] for array in weights['expand_BN']],
+        'depthwise': [weights['depthwise'][0][:, :, keep, :]],
+        'depthwise_BN': [array[keep] for array in weights['depthwise_BN']],
+        'project': [weights['project'][0][:, :, keep, :]] + weights['project'][1:]
+    }
+
+
+def prune_backbone(backbone, ratio):
+    """A copy of a MobileNetV2 backbone with `ratio` of every block's expansion channels removed"""
+    import tensorflow as tf
+
+    layers = {layer.name: layer for layer in backbone.layers}
+    blocks = sorted({name[:-len('_expand')] for name in layers if name.startswith('block_') and name.endswith('_expand')})
+
+    kept = {}
+    config = backbone.get_config()
+    for block in blocks:
+        bn = layers[f'{block}_expand_BN']
+        gamma, _, _, variance = bn.get_weights()
+        scores = channel_scores(layers[f'{block}_expand'].get_weights()[0], gamma, variance, bn.epsilon)
+        kept[block] = kept_channels(scores, ratio)
+    for layer_config in config['layers']:
+        name = layer_config['name']
+        if name.endswith('_expand') and name[:-len('_expand')] in kept:
+            layer_config['config']['filters'] = len(kept[name[:-len('_expand')]])
+
+    pruned = tf.keras.Model.from_config(config)
+    pruned_layers = {layer.name: layer for layer in pruned.layers}
+    sliced = {f'{block}_{part}' for block in kept for part in BLOCK_LAYERS}
+    for name, layer in layers.items():
+        if layer.weights and name not in sliced:
+            pruned_layers[name].set_weights(layer.get_weights())
+    for block, keep in kept.items():
+        weights = {part: layers[f'{block}_{part}'].get_weights() for part in BLOCK_LAYERS}
+        for part, values in slice_block(weights, keep).items():
+            pruned_layers[f'{block}_{part}'].set_weights(values)
+    return pruned
+
+
+def prune_student(student, ratio):
+    """The student rebuilt around a pruned backbone, with its other weights copied"""
+    import tensorflow as tf
+
+    backbone = next(layer for layer in student.layers if isinstance(layer, tf.keras.Model))
+    resolution = backbone.input_shape[1]
+    pruned = build_student(student.output_shape[-1], None, resolution, backbone=prune_backbone(backbone, ratio),
+                           name=f'{student.name}_pruned')
+    for layer, source in zip(pruned.layers, student.layers):
+        if layer.weights and not isinstance(layer, tf.keras.Model):
+            layer.set_weights(source.get_weights())
+    return pruned
+
+
+def describe(model, path, probabilities, latency_ms, labels, teacher_predictions=None):
+    predictions = np.argmax(probabilities, axis=1)
+    figures = {
+        'accuracy': round(float(np.mean(predictions == labels)), 4),
+        'latency_ms': round(latency_ms, 2),
+        'params': int(model.count_params()),
+        'size_mb': round(os.path.getsize(path) / 1e6, 2)
+    }
+    if teacher_predictions is not None:
+        figures['top1_agreement'] = round(float(np.mean(predictions == teacher_predictions)), 4)
+    return figures
+
+
+def distill(name, args):
+    import tensorflow as tf
+
+    directory = os.path.join(args.data_dir, name)
+    if not os.path.isdir(directory):
+        print(f"⚠️  No training images for {name} in {directory}; skipping")
+        return None
+
+    tf.keras.utils.set_random_seed(args.seed)
+    classes, pixels, labels = load_labelled_pixels(directory, args.limit)
+    teacher_path = keras_model_path(name)
+    teacher = tf.keras.models.load_model(teacher_path)
+    num_classes = teacher.output_shape[-1]
+    if len(classes) != num_classes:
+        raise SystemExit(f"{directory} has {len(classes)} class folders, the {name} model predicts {num_classes}")
+
+    train, heldout = split_indices(labels, args.holdout, args.seed)
+    if not len(heldout):
+        raise SystemExit(f"Not enough images in {directory} to hold any out for the report")
+    print(f"\n🎓 {name}: {len(train)} training and {len(heldout)} held-out images, teacher {teacher_path}")
+    targets = teacher_targets(predict_all(teacher, pixels[train]), labels[train], num_classes)
+
+    student = build_student(num_classes, args.alpha, args.resolution)
+    train_student(student, pixels[train], targets, args, args.epochs, args.learning_rate)
+    if args.prune:
+        print(f"✂️  Pruning {args.prune * 100:.0f}% of the expansion channels")
+        student = prune_student(student, args.prune)
+        train_student(student, pixels[train], targets, args, args.finetune_epochs, args.learning_rate / 10)
+
+    output_path = student_model_path(name)
+    student.save(output_path)
+
+    eval_images = pixels[heldout].astype(np.float32) / 255.0
+    teacher_probabilities, teacher_ms = predict_with_latency(teacher, eval_images)
+    student_probabilities, student_ms = predict_with_latency(student, eval_images)
+    teacher_predictions = np.argmax(teacher_probabilities, axis=1)
+
+    report = {
+        'classes': classes,
+        'heldout_images': int(len(heldout)),
+        'settings': {
+            'alpha': args.alpha, 'resolution': args.resolution, 'prune': args.prune,
+            'temperature': args.temperature, 'distill_weight': args.distill_weight,
+            'epochs': args.epochs, 'finetune_epochs': args.finetune_epochs if args.prune else 0, 'seed': args.seed
+        },
+        'teacher': describe(teacher, teacher_path, teacher_probabilities, teacher_ms, labels[heldout]),
+        'student': dict(describe(student, output_path, student_probabilities, student_ms, labels[heldout],
+                                 teacher_predictions), path=output_path)
+    }
+    report['installed'] = install(name, output_path, args.install, num_classes)
+
+    t, s = report['teacher'], report['student']
+    print(f"✅ {name} -> {output_path}: accuracy {s['accuracy'] * 100:.2f}% vs {t['accuracy'] * 100:.2f}%, "
+          f"{s['latency_ms']} ms vs {t['latency_ms']} ms, {s['size_mb']} MB vs {t['size_mb']} MB, "
+          f"top-1 agreement {s['top1_agreement'] * 100:.2f}%")
+    return report
+
+
+def full_install_blockers(names, environ=os.environ):
+    """Reasons the served model of these tasks is not the .keras file a full install would replace"""
+    blockers = []
+    if environ.get('SHARED_BACKBONE', 'false').lower() == 'true':
+        blockers.append('SHARED_BACKBONE serves models/combined_model.keras')
+    if environ.get('MODEL_INPUT_DTYPE', 'float32').lower() == 'uint8':
+        blockers.append('MODEL_INPUT_DTYPE=uint8 serves models/<task>_model_uint8.keras')
+    for name in names:
+        backend = backend_for(name, environ)
+        if backend != 'keras':
+            blockers.append(f'{name} is served by the {backend} backend')
+    return blockers
+
+
+def registry_classes(name, registry, num_classes):
+    """Class names for a published student: the active version's, else class_mappings.py's"""
+    active = registry.active_version(name)
+    if active:
+        classes = registry.manifest(name, active)['classes']
+    else:
+        classes = [CLASS_MAPPINGS[name][index] for index in sorted(CLASS_MAPPINGS[name])]
+    if len(classes) != num_classes:
+        raise SystemExit(f"The {name} student predicts {num_classes} classes, the registry lists {len(classes)}")
+    return classes
+
+
+def install(name, student_path, target, num_classes):
+    """Make the student servable; returns where it went, or None"""
+    if target == 'small':
+        destination = small_model_path(name)
+        shutil.copy2(student_path, destination)
+        print(f"📦 Installed {student_path} as {destination}")
+        return destination
+    if target == 'full':
+        from model_registry import model_registry
+
+        classes = registry_classes(name, model_registry, num_classes)
+        manifest = model_registry.publish(name, student_path, classes)
+        model_registry.activate(name, manifest['version'])
+        print(f"📦 Published {student_path} as {name} version {manifest['version']} and activated it "
+              f"(undo with: python model_registry.py rollback --task {name})")
+        return model_registry.model_path(name, manifest['version'])
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Distill the maize classifiers into compact students')
+    parser.add_argument('--data-dir', required=True, help='Folder with <task>/<class>/ image folders')
+    parser.add_argument('--models', nargs='+', choices=CLASSIFIERS, default=list(CLASSIFIERS))
+    parser.add_argument('--alpha', type=float, default=0.35, help='MobileNetV2 width multiplier of the student')
+    parser.add_argument('--resolution', type=int, default=160, help='Input resolution of the student backbone')
+    parser.add_argument('--prune', type=float, default=0.0, help='Share of expansion channels to remove (0-0.9)')
+    parser.add_argument('--temperature', type=float, default=4.0)
+    parser.add_argument('--distill-weight', type=float, default=0.7, help='Weight of the teacher term in the loss')
+    parser.add_argument('--epochs', type=int, default=15)
+    parser.add_argument('--finetune-epochs', type=int, default=5, help='Epochs after pruning')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--learning-rate', type=float, default=1e-3)
+    parser.add_argument('--holdout', type=float, default=0.1, help='Share of each class held out for the report')
+    parser.add_argument('--limit', type=int, help='Images per class at most')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--install', choices=('none', 'small', 'full'), default='none',
+                        help='small: cascade model; full: publish and activate a model registry version')
+    parser.add_argument('--report', default=os.path.join(MODELS_DIR, 'distill_report.json'))
+    args = parser.parse_args()
+
+    if not 0 <= args.prune < 1:
+        parser.error('--prune must be in [0, 1)')
+    if args.alpha not in MOBILENET_ALPHAS:
+        parser.error(f'--alpha must be one of {", ".join(map(str, MOBILENET_ALPHAS))}')
+    if args.install == 'full':
+        blockers = full_install_blockers(args.models)
+        if blockers:
+            parser.error('--install full only applies to the keras backend with float32 inputs: '
+                         f'{"; ".join(blockers)}. Use --install small, or publish the student with '
+                         'model_registry.py after exporting it for that runtime')
+
+    report = {}
+    for name in args.models:
+        result = distill(name, args)
+        if result is not None:
+            report[name] = result
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📝 Distillation report written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+Grad-CAM explanations for the disease, pest and nutrient classifiers.
+
+A heatmap shows which part of the photo drove a prediction. Computing it
+needs a backward pass, so it never runs on the request path: the results
+page gets a URL straight away and the heatmap is rendered by a background
+worker after the prediction has been returned. Finished heatmaps are PNG
+overlays stored under EXPLANATION_DIR, keyed by task, model version and a
+hash of the uploaded file, so every gunicorn worker can serve them and the
+same photo is never explained twice.
+
+Gradients come from the Keras model. When a task is served by another
+runtime (tflite, onnx, openvino) or from the shared-backbone model, that
+would mean loading the original models/<task>_model.keras next to it, so
+by default (EXPLANATIONS=auto) such tasks are not explained.
+EXPLANATIONS=true opts in, and the .keras file is then loaded once, on the
+background thread.
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image
+
+from image_processing import MODEL_INPUT_SIZE, decode_image, image_to_array
+
+# Load environment variables
+load_dotenv()
+
+# auto: only tasks served by a Keras model; true: every task; false: none
+EXPLANATIONS = os.getenv('EXPLANATIONS', 'auto').lower()
+EXPLANATIONS_ENABLED = EXPLANATIONS != 'false'
+EXPLANATION_DIR = os.getenv('EXPLANATION_DIR', 'cache/explanations')
+# Heatmaps waiting for the worker; further requests are dropped rather than queued
+EXPLANATION_MAX_PENDING = int(os.getenv('EXPLANATION_MAX_PENDING', '16'))
+# Longer side of the stored overlay
+EXPLANATION_MAX_SIDE = 448
+
+
+def explanation_key(name, model_version, data):
+    """Key of the heatmap for an uploaded file, as served by one model version"""
+    digest = hashlib.sha256(data).hexdigest()
+    return hashlib.sha1(f'{name}:{model_version}:{digest}'.encode()).hexdigest()
+
+
+def keras_extras_enabled(setting, served_by_keras):
+    """Whether an EXPLANATIONS / SIMILAR_CASES setting covers a task, given how the task is served"""
+    if setting == 'auto':
+        return served_by_keras
+    return setting == 'true'
+
+
+def split_model(model):
+    """
+    Split a classifier into the layers before its MobileNetV2 backbone, the
+    backbone and the head layers after it.
+
+    Handles the notebook models (Input -> MobileNetV2 -> pooling/dense head)
+    and the uint8 exports, which wrap such a model behind resize/rescale layers.
+    """
+    import tensorflow as tf
+
+    before, after = [], []
+    backbone = None
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.layers.InputLayer):
+            continue
+        if backbone is not None:
+            after.append(layer)
+        elif isinstance(layer, tf.keras.Model):
+            if any(isinstance(inner, tf.keras.Model) for inner in layer.layers):
+                # A whole classifier wrapped by preprocessing layers
+                inner_before, backbone, inner_after = split_model(layer)
+                before.extend(inner_before)
+                after.extend(inner_after)
+            else:
+                backbone = layer
+        else:
+            before.append(layer)
+
+    if backbone is None:
+        raise ValueError(f"{model.name} has no nested backbone model")
+    return before, backbone, after
+
+
+class GradCam:
+    """
+    Grad-CAM on the last feature map of a classifier's backbone.
+
+    The forward and backward pass are traced into a single tf.function with a
+    fixed input signature when the explainer is created, so every later
+    heatmap for this model reuses the same graph.
+    """
+
+    def __init__(self, model):
+        import tensorflow as tf
+
+        self.model = model
+        self.before, self.backbone, self.after = split_model(model)
+
+        input_shape = model.input_shape
+        self.input_size = tuple(dim or size for dim, size in zip(input_shape[1:3], MODEL_INPUT_SIZE))
+        self.dtype = np.uint8 if model.inputs[0].dtype == tf.uint8 else np.float32
+        signature = [
+            tf.TensorSpec((1,) + self.input_size + (3,), tf.as_dtype(self.dtype)),
+            tf.TensorSpec((), tf.int32)
+        ]
+        self._heatmap = tf.function(self._compute, input_signature=signature)
+
+    def _compute(self, batch, class_index):
+        import tensorflow as tf
+
+        x = batch
+        for layer in self.before:
+            x = layer(x)
+        with tf.GradientTape() as tape:
+            features = self.backbone(x, training=False)
+            tape.watch(features)
+            y = features
+            for layer in self.after:
+                y = layer(y, training=False)
+            score = y[0, class_index]
+
+        gradients = tape.gradient(score, features)
+        weights = tf.reduce_mean(gradients, axis=(1, 2))
+        cam = tf.nn.relu(tf.reduce_sum(features[0] * weights[0], axis=-1))
+        return cam / (tf.reduce_max(cam) + 1e-8)
+
+    def heatmap(self, img, class_index):
+        """(h, w) map in [0, 1] of where a decoded image supports class_index"""
+        batch = image_to_array(img, target_size=self.input_size, dtype=self.dtype)
+        return self._heatmap(batch, np.int32(class_index)).numpy()
+
+
+def colorize(heatmap):
+    """Map [0, 1] values to a blue-green-yellow-red ramp as uint8 RGB"""
+    heatmap = np.clip(heatmap, 0.0, 1.0)
+    red = np.clip(1.5 - np.abs(4 * heatmap - 3), 0, 1)
+    green = np.clip(1.5 - np.abs(4 * heatmap - 2), 0, 1)
+    blue = np.clip(1.5 - np.abs(4 * heatmap - 1), 0, 1)
+    return (np.stack([red, green, blue], axis=-1) * 255).astype(np.uint8)
+
+
+def overlay_heatmap(img, heatmap, alpha=0.45, max_side=EXPLANATION_MAX_SIDE):
+    """PNG bytes of the photo with the heatmap blended over it"""
+    img = img.convert('RGB')
+    img.thumbnail((max_side, max_side))
+    heat = Image.fromarray((np.clip(heatmap, 0, 1) * 255).astype(np.uint8)).resize(img.size, Image.BILINEAR)
+    colored = Image.fromarray(colorize(np.asarray(heat, dtype=np.float32) / 255.0))
+    buffer = io.BytesIO()
+    Image.blend(img, colored, alpha).save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+class ExplanationService:
+    """
+    Renders Grad-CAM overlays on a single background thread and stores them on disk.
+
+    One explainer (and so one compiled tf.function) is kept per task and
+    rebuilt only when the served model object changes, e.g. after a
+    registry hot swap. A heatmap already stored or in progress is not
+    submitted again.
+    """
+
+    def __init__(self, directory=EXPLANATION_DIR, max_pending=EXPLANATION_MAX_PENDING, enabled=EXPLANATIONS_ENABLED):
+        self.directory = directory
+        self.max_pending = max_pending
+        self.enabled = enabled
+
+        self._models = {}
+        self._explained = set()
+        self._explainers = {}
+        self._fallbacks = {}
+        self._pending = OrderedDict()
+        self._executor = None
+        self._lock = threading.Lock()
+        # Separate from _lock, so submit() never waits for a .keras file to load
+        self._fallback_lock = threading.Lock()
+
+        self.rendered = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def register(self, name, served_model, keras_path, explain=True):
+        """
+        served_model() returns the model serving a task; keras_path is used
+        when that is not a Keras model. With explain=False the task is only
+        a source for keras_model(), e.g. for similar cases.
+        """
+        self._models[name] = (served_model, keras_path)
+        if explain:
+            self._explained.add(name)
+        else:
+            self._explained.discard(name)
+
+    def _get_executor(self):
+        # Created on first use so forked workers get their own thread
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='explanations')
+        return self._executor
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.png')
+
+    def get(self, key):
+        """PNG bytes of a finished heatmap, or None"""
+        try:
+            with open(self.path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def is_pending(self, key):
+        with self._lock:
+            return key in self._pending
+
+    def submit(self, name, key, data, class_index):
+        """Queue the heatmap for an uploaded file; returns False when it cannot be produced"""
+        if not self.enabled or name not in self._explained:
+            return False
+        if os.path.exists(self.path(key)):
+            return True
+        with self._lock:
+            if key in self._pending:
+                return True
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending[key] = name
+            self._get_executor().submit(self._render, name, key, data, class_index)
+        return True
+
+    def keras_model(self, name):
+        """
+        The Keras classifier behind a task: the served model, or its .keras
+        file for other runtimes. Only call this from a background thread.
+        """
+        import tensorflow as tf
+
+        served_model, keras_path = self._models[name]
+        model = served_model()
+        if isinstance(model, tf.keras.Model):
+            return model
+        with self._fallback_lock:
+            if name not in self._fallbacks:
+                self._fallbacks[name] = tf.keras.models.load_model(keras_path)
+            return self._fallbacks[name]
+
+    def _explainer(self, name):
+        model = self.keras_model(name)
+        explainer = self._explainers.get(name)
+        if explainer is None or explainer.model is not model:
+            explainer = self._explainers[name] = GradCam(model)
+        return explainer
+
+    def _render(self, name, key, data, class_index):
+        try:
+            img = decode_image(data, target_size=(EXPLANATION_MAX_SIDE, EXPLANATION_MAX_SIDE))
+            heatmap = self._explainer(name).heatmap(img, class_index)
+            png = overlay_heatmap(img, heatmap)
+
+            os.makedirs(self.directory, exist_ok=True)
+            # Write then rename, so other workers never read a partial file
+            temp_path = f'{self.path(key)}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(png)
+            os.replace(temp_path, self.path(key))
+            self.rendered += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"⚠️  Failed to explain {name} prediction: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def get_stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'enabled': self.enabled,
+            'pending': pending,
+            'rendered': self.rendered,
+            'failed': self.failed,
+            'dropped': self.dropped
+        }
+
+
+explanation_service = ExplanationService()
@@ -0,0 +1,54 @@
+"""
+Gunicorn settings for serving Afrigric with several workers.
+
+    gunicorn app:app            # picks up this file from the working directory
+
+The app is imported once in the master (preload_app) so Flask, pandas,
+NumPy and the models listed in PREFORK_PRELOAD are shared copy-on-write
+by every worker. TensorFlow is not fork-safe once its thread pools exist,
+so the master never imports it: each worker loads the TensorFlow models
+itself after the fork (post_worker_init), and every worker holds its own
+copy of the Keras weights. With INFERENCE_BACKEND=tflite the .tflite files
+are memory-mapped read-only, so only their file pages are shared through
+the page cache. The XNNPACK delegate repacks the weights into private
+buffers of every interpreter, so most of the weight memory is still per
+worker.
+
+Per-worker memory (Rss/Pss) is available at /api/workers/memory.
+"""
+
+import gc
+import os
+
+# Tell app.py it is being imported by the master, before any worker exists
+os.environ['PREFORK_MASTER'] = 'true'
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+# Threads let concurrent uploads in one worker share a micro-batch
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # Move everything imported so far out of the collector's reach; otherwise
+    # the first collection in a worker touches every object and un-shares
+    # the pages it lives on
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    from app import registry_watcher, upload_reaper
+    from similarity_index import similarity_service
+    from model_manager import model_manager
+    from worker_memory import process_memory
+
+    model_manager.start()
+    registry_watcher.start()
+    upload_reaper.start()
+    similarity_service.start()
+    memory = process_memory()
+    worker.log.info(f"Worker {worker.pid} started (rss {memory.get('rss_mb')} MB, pss {memory.get('pss_mb')} MB); "
+                    f"loading models in {model_manager.mode} mode")
@@ -0,0 +1,130 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageOps
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+MODEL_INPUT_SIZE = (224, 224)
+# Decode large photos close to the model input size instead of at full resolution
+FAST_DECODE = os.getenv('FAST_DECODE', 'true').lower() == 'true'
+# Keep at least this multiple of the target size before the final resize, so
+# the last step is still a proper downscale rather than an upscale
+DECODE_OVERSAMPLE = 2
+
+
+def decode_image(source, target_size=MODEL_INPUT_SIZE, fast=None):
+    """
+    Open an image from raw bytes, a file-like object or a path as RGB.
+
+    With fast decoding on and a target size given, JPEGs are decoded with
+    DCT scaling (draft mode) straight to 1/2, 1/4 or 1/8 resolution and other
+    formats are reduced right after decoding. EXIF orientation is applied so
+    phone photos come out upright. Pass target_size=None for full resolution.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    fast = FAST_DECODE if fast is None else fast
+
+    img = Image.open(source)
+    if fast and target_size:
+        min_size = (target_size[0] * DECODE_OVERSAMPLE, target_size[1] * DECODE_OVERSAMPLE)
+        if img.format == 'JPEG':
+            img.draft('RGB', min_size)
+
+    # Decode now rather than on first pixel access, so callers control which thread pays for it
+    img.load()
+
+    if fast:
+        if target_size and img.format != 'JPEG':
+            factor = min(img.size[0] // min_size[0], img.size[1] // min_size[1])
+            if factor >= 2:
+                img = img.reduce(factor)
+        img = ImageOps.exif_transpose(img)
+
+    # Convert to RGB if not already
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+def image_to_array(img, target_size=MODEL_INPUT_SIZE, dtype=np.float32):
+    """
+    Resize a PIL image and turn it into a (1, H, W, 3) batch.
+
+    float32 batches are scaled to [0, 1]. uint8 batches are the raw pixels,
+    for models that rescale inside the graph (model_export.py uint8), and
+    cost a single quarter-size copy.
+    """
+    img = img.resize(target_size)
+    if dtype == np.uint8:
+        return np.asarray(img, dtype=np.uint8)[np.newaxis]
+    img_array = np.asarray(img, dtype=np.float32)[np.newaxis]
+    img_array /= 255.0
+    return img_array
+
+
+def preprocess_image(source, target_size=MODEL_INPUT_SIZE, dtype=np.float32):
+    """Improved image preprocessing with error handling"""
+    try:
+        return image_to_array(decode_image(source, target_size), target_size, dtype)
+    except Exception as e:
+        print(f"Error preprocessing image: {str(e)}")
+        raise
+
+
+class UploadWriter:
+    """
+    Persists uploads in the background so the request never waits on disk.
+
+    Files are kept in memory until the write completes, so a results page
+    that asks for the image straight away can still be served.
+    """
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created on first use so forked workers get their own threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='upload-writer')
+            return self._executor
+
+    def save_async(self, data, filepath):
+        """Queue `data` to be written to `filepath` and return a Future"""
+        with self._lock:
+            self._pending[filepath] = data
+        return self._get_executor().submit(self._write, data, filepath)
+
+    def _write(self, data, filepath):
+        try:
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            tmp_path = f'{filepath}.part'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, filepath)
+        except Exception as e:
+            print(f'Failed to save upload {filepath}. Reason: {e}')
+            raise
+        finally:
+            with self._lock:
+                if self._pending.get(filepath) is data:
+                    del self._pending[filepath]
+
+    def get_pending(self, filepath):
+        """Bytes of an upload that has not reached the disk yet, if any"""
+        with self._lock:
+            return self._pending.get(filepath)
+
+
+# Global instance
+upload_writer = UploadWriter()
@@ -0,0 +1,153 @@
+"""
+Classifier runtimes behind the disease, pest and nutrient models.
+
+Every backend object exposes the same call as a Keras model,
+predict(batch, verbose=0) -> (n, classes) probabilities, and an input_shape,
+so the app, the micro-batching engine and the cascade never need to know
+which runtime serves a task.
+
+    keras     models/<task>_model.keras            TensorFlow (tf.keras)
+    tflite    models/<task>_model_<precision>.tflite
+    onnx      models/<task>_model.onnx             ONNX Runtime, CPU execution provider
+    openvino  models/<task>_model.xml (+ .bin)     OpenVINO, CPU plugin
+
+The runtime is chosen per task: INFERENCE_BACKEND_DISEASE=onnx overrides
+INFERENCE_BACKEND for the disease model only. The ONNX and OpenVINO files come
+from `model_export.py onnx` / `model_export.py openvino`; neither runtime
+imports TensorFlow.
+"""
+
+import os
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BACKENDS = ('keras', 'tflite', 'onnx', 'openvino')
+TFLITE_PRECISION = os.getenv('TFLITE_PRECISION', 'int8').lower()
+# Threads one ONNX Runtime / OpenVINO model may use for a forward pass; 0 lets the runtime decide
+BACKEND_THREADS = int(os.getenv('BACKEND_THREADS', '0'))
+# OpenVINO performance hint: LATENCY suits single uploads, THROUGHPUT large batches
+OPENVINO_HINT = os.getenv('OPENVINO_HINT', 'LATENCY').upper()
+MODELS_DIR = 'models'
+
+
+def backend_for(name, environ=os.environ):
+    """Runtime configured for a task, e.g. INFERENCE_BACKEND_PEST=openvino"""
+    default = environ.get('INFERENCE_BACKEND', 'keras')
+    backend = environ.get(f'INFERENCE_BACKEND_{name.upper()}', default).lower()
+    if backend not in BACKENDS:
+        print(f"⚠️  Unknown inference backend {backend!r} for {name}; using keras")
+        return 'keras'
+    return backend
+
+
+def backend_model_path(name, backend, precision=TFLITE_PRECISION):
+    """Model file a task is served from with the given runtime"""
+    if backend == 'tflite':
+        return os.path.join(MODELS_DIR, f'{name}_model_{precision}.tflite')
+    if backend == 'onnx':
+        return os.path.join(MODELS_DIR, f'{name}_model.onnx')
+    if backend == 'openvino':
+        return os.path.join(MODELS_DIR, f'{name}_model.xml')
+    return os.path.join(MODELS_DIR, f'{name}_model.keras')
+
+
+def backend_of_file(path):
+    """Runtime that reads a model file, judged by its extension"""
+    extension = os.path.splitext(path)[1].lower()
+    return {'.tflite': 'tflite', '.onnx': 'onnx', '.xml': 'openvino'}.get(extension, 'keras')
+
+
+def load_backend_model(path, num_threads=BACKEND_THREADS):
+    """Load a classifier file with the runtime that matches its extension"""
+    backend = backend_of_file(path)
+    if backend == 'tflite':
+        from tflite_backend import TFLiteClassifier
+        return TFLiteClassifier(path, num_threads=num_threads or None)
+    if backend == 'onnx':
+        return OnnxClassifier(path, num_threads)
+    if backend == 'openvino':
+        return OpenVINOClassifier(path, num_threads)
+
+    import tensorflow as tf
+    return tf.keras.models.load_model(path)
+
+
+def as_batch(batch, dtype=np.float32):
+    batch = np.asarray(batch, dtype=dtype)
+    if batch.ndim == 3:
+        batch = np.expand_dims(batch, axis=0)
+    return np.ascontiguousarray(batch)
+
+
+class OnnxClassifier:
+    """
+    Runs an exported .onnx classifier through ONNX Runtime on the CPU.
+
+    InferenceSession.run is thread-safe, so concurrent requests share one
+    session without a lock.
+    """
+
+    def __init__(self, model_path, num_threads=BACKEND_THREADS):
+        import onnxruntime as ort
+
+        self.model_path = model_path
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+        self._input = self.session.get_inputs()[0]
+        self._output_name = self.session.get_outputs()[0].name
+        self._dtype = np.uint8 if self._input.type == 'tensor(uint8)' else np.float32
+
+    @property
+    def input_shape(self):
+        return tuple(dim if isinstance(dim, int) else None for dim in self._input.shape)
+
+    def predict(self, batch, verbose=0):
+        """Predict class probabilities for an (n, H, W, 3) batch"""
+        return self.session.run([self._output_name], {self._input.name: as_batch(batch, self._dtype)})[0]
+
+
+class OpenVINOClassifier:
+    """
+    Runs an OpenVINO IR classifier (.xml with its .bin weights) on the CPU plugin.
+
+    The model is compiled once; each thread gets its own infer request, since
+    a single request cannot run two inferences at the same time.
+    """
+
+    def __init__(self, model_path, num_threads=BACKEND_THREADS, hint=OPENVINO_HINT):
+        import openvino as ov
+
+        self.model_path = model_path
+        config = {'PERFORMANCE_HINT': hint}
+        if num_threads:
+            config['INFERENCE_NUM_THREADS'] = num_threads
+        self.compiled = ov.Core().compile_model(model_path, 'CPU', config)
+
+        self._input = self.compiled.input(0)
+        self._output = self.compiled.output(0)
+        self._dtype = np.uint8 if self._input.get_element_type().get_type_name() == 'u8' else np.float32
+        self._local = threading.local()
+
+    @property
+    def input_shape(self):
+        return tuple(dim.get_length() if dim.is_static else None for dim in self._input.get_partial_shape())
+
+    def _request(self):
+        request = getattr(self._local, 'request', None)
+        if request is None:
+            request = self._local.request = self.compiled.create_infer_request()
+        return request
+
+    def predict(self, batch, verbose=0):
+        """Predict class probabilities for an (n, H, W, 3) batch"""
+        results = self._request().infer({0: as_batch(batch, self._dtype)})
+        return np.array(results[self._output])
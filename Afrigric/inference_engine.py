@@ -0,0 +1,196 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+class _PendingRequest:
+    """A preprocessed image batch waiting for its forward pass"""
+
+    __slots__ = ('inputs', 'predict_fn', 'future', 'enqueued_at')
+
+    def __init__(self, inputs, predict_fn=None):
+        self.inputs = inputs
+        self.predict_fn = predict_fn
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Groups single-image requests for one model into a single forward pass.
+
+    Requests are queued and a worker thread drains the queue until either
+    `max_batch_size` images are collected or `max_wait_ms` has passed since
+    the first request of the batch arrived.
+
+    A request may bring its own predict_fn, e.g. to finish on the model
+    version it started with while a new one is swapped in. Only requests
+    with the same predict_fn share a batch.
+    """
+
+    def __init__(self, name, predict_fn, max_batch_size=8, max_wait_ms=15):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        # First request of the next batch, taken off the queue by the previous one
+        self._carry = None
+        self._worker = None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self.batches_run = 0
+        self.requests_processed = 0
+        self.images_processed = 0
+        self.max_batch_seen = 0
+        self.batch_size_histogram = {}
+        self.total_wait_ms = 0.0
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so the worker is started on first use
+        # in the process that actually serves requests.
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=f'batcher-{self.name}', daemon=True)
+                self._worker.start()
+
+    def submit(self, inputs, predict_fn=None):
+        """Queue an (n, H, W, C) array and return a Future for its predictions"""
+        inputs = np.asarray(inputs)
+        if inputs.ndim == 3:
+            inputs = np.expand_dims(inputs, axis=0)
+
+        self._ensure_worker()
+        pending = _PendingRequest(inputs, predict_fn)
+        self._queue.put(pending)
+        return pending.future
+
+    def predict(self, inputs, timeout=None, predict_fn=None):
+        """Blocking helper around submit()"""
+        return self.submit(inputs, predict_fn).result(timeout=timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _collect_batch(self):
+        first, self._carry = self._carry or self._queue.get(), None
+        batch = [first]
+        size = len(first.inputs)
+        deadline = time.perf_counter() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if pending.predict_fn is not first.predict_fn:
+                self._carry = pending
+                break
+            batch.append(pending)
+            size += len(pending.inputs)
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+
+            try:
+                if len(batch) == 1:
+                    stacked = batch[0].inputs
+                else:
+                    stacked = np.concatenate([pending.inputs for pending in batch], axis=0)
+                outputs = (batch[0].predict_fn or self.predict_fn)(stacked)
+            except Exception as e:
+                print(f"❌ Batched inference failed for {self.name}: {str(e)}")
+                for pending in batch:
+                    pending.future.set_exception(e)
+                continue
+
+            # Hand each request its own slice of the batch output
+            offset = 0
+            for pending in batch:
+                count = len(pending.inputs)
+                if isinstance(outputs, (list, tuple)):
+                    result = [np.asarray(output[offset:offset + count]) for output in outputs]
+                else:
+                    result = np.asarray(outputs[offset:offset + count])
+                pending.future.set_result(result)
+                offset += count
+
+            self._record_batch(batch, offset, started)
+
+    def _record_batch(self, batch, size, started):
+        with self._stats_lock:
+            self.batches_run += 1
+            self.requests_processed += len(batch)
+            self.images_processed += size
+            self.max_batch_seen = max(self.max_batch_seen, size)
+            self.batch_size_histogram[size] = self.batch_size_histogram.get(size, 0) + 1
+            # Waits are summed per request, so they are averaged per request below
+            self.total_wait_ms += sum((started - pending.enqueued_at) * 1000 for pending in batch)
+
+    def get_metrics(self):
+        with self._stats_lock:
+            requests = self.requests_processed
+            return {
+                'queue_depth': self.queue_depth(),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'batches_run': self.batches_run,
+                'requests_processed': requests,
+                'images_processed': self.images_processed,
+                'avg_batch_size': round(self.images_processed / self.batches_run, 2) if self.batches_run else 0,
+                'max_batch_seen': self.max_batch_seen,
+                'avg_queue_wait_ms': round(self.total_wait_ms / requests, 2) if requests else 0,
+                'batch_size_histogram': {str(size): count for size, count in sorted(self.batch_size_histogram.items())}
+            }
+
+
+class InferenceEngine:
+    """Holds one MicroBatcher per classifier"""
+
+    def __init__(self):
+        self.max_batch_size = int(os.getenv('INFERENCE_MAX_BATCH_SIZE', '8'))
+        self.max_wait_ms = float(os.getenv('INFERENCE_MAX_WAIT_MS', '15'))
+        self.batchers = {}
+
+    def register(self, name, predict_fn, max_batch_size=None, max_wait_ms=None):
+        """Register a model; predict_fn takes an (n, H, W, C) array and returns its outputs"""
+        self.batchers[name] = MicroBatcher(
+            name,
+            predict_fn,
+            max_batch_size=max_batch_size or self.max_batch_size,
+            max_wait_ms=self.max_wait_ms if max_wait_ms is None else max_wait_ms
+        )
+
+    def submit(self, name, inputs, predict_fn=None):
+        if name not in self.batchers:
+            raise KeyError(f"No model registered under '{name}'")
+        return self.batchers[name].submit(inputs, predict_fn)
+
+    def predict(self, name, inputs, timeout=None, predict_fn=None):
+        """Run inputs through the named model, sharing the forward pass with concurrent requests"""
+        return self.submit(name, inputs, predict_fn).result(timeout=timeout)
+
+    def get_metrics(self):
+        return {name: batcher.get_metrics() for name, batcher in self.batchers.items()}
+
+
+# Global instance
+inference_engine = InferenceEngine()
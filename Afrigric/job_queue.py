@@ -0,0 +1,223 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+FINISHED_STATES = ('done', 'failed')
+STALE_JOB_ERROR = 'The worker running this job stopped before it finished'
+JOB_COLUMNS = ('job_id', 'kind', 'status', 'result', 'error', 'created_at', 'started_at', 'finished_at')
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are already waiting"""
+
+
+class JobQueue:
+    """
+    Runs diagnosis work on a fixed-size worker pool, away from the HTTP workers.
+
+    A job runs in the process that accepted it, but its status and result
+    are kept in a SQLite file (JOB_STORE_DB for the module's job_queue), so
+    any gunicorn worker can answer a poll or stream its events. With a
+    ':memory:' store, jobs are only visible to the process that accepted them.
+
+    Finished jobs are kept for `retention_seconds` and at most `max_jobs`
+    are retained; the oldest finished jobs are dropped first.
+    `max_pending` bounds the jobs waiting for this process's pool. A job
+    still queued or running `stale_seconds` after it was accepted is taken
+    to belong to a worker that crashed or was recycled, and is marked failed.
+    """
+
+    def __init__(self, max_workers=2, max_pending=100, max_jobs=1000, retention_seconds=600,
+                 db_path=':memory:', poll_interval=0.5, stale_seconds=1800):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.retention_seconds = retention_seconds
+        self.db_path = db_path
+        # How often wait_for_change looks for updates written by other processes
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._db = None
+        self._db_pid = None
+        self._pending = 0
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _open_db(self):
+        if self.db_path != ':memory:':
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+        self._db_pid = os.getpid()
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)')
+        self._db.commit()
+
+    def _get_db(self):
+        # A SQLite connection must not be used across fork(); a gunicorn
+        # worker opens its own instead of the one inherited from the master
+        if self._db is None or self._db_pid != os.getpid():
+            self._open_db()
+        return self._db
+
+    def _get_executor(self):
+        # Created on first use so forked workers get their own threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='diagnosis-job')
+        return self._executor
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) and return the new job id"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f'{self._pending} jobs are already waiting')
+
+            db = self._get_db()
+            self._prune(db)
+            job_id = uuid.uuid4().hex
+            db.execute('INSERT INTO jobs (job_id, kind, status, created_at) VALUES (?, ?, ?, ?)',
+                       (job_id, kind, 'queued', time.time()))
+            db.commit()
+            self._pending += 1
+            self.submitted += 1
+            self._get_executor().submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _update(self, job_id, **fields):
+        with self._changed:
+            db = self._get_db()
+            assignments = ', '.join(f'{column} = ?' for column in fields)
+            db.execute(f'UPDATE jobs SET {assignments} WHERE job_id = ?', (*fields.values(), job_id))
+            db.commit()
+            self._changed.notify_all()
+
+    def _run(self, job_id, fn, args, kwargs):
+        with self._lock:
+            self._pending -= 1
+        self._update(job_id, status='running', started_at=time.time())
+
+        try:
+            # Results are stored as JSON so every worker can read them
+            result = json.dumps(fn(*args, **kwargs))
+            error = None
+        except Exception as e:
+            result = None
+            error = str(e)
+
+        with self._lock:
+            if error:
+                self.failed += 1
+            else:
+                self.completed += 1
+        self._update(job_id, status='failed' if error else 'done', result=result, error=error,
+                     finished_at=time.time())
+
+    def _is_stale(self, job):
+        return job['status'] not in FINISHED_STATES and job['created_at'] < time.time() - self.stale_seconds
+
+    def _expire_stale(self, db, job_id=None):
+        """Mark unfinished jobs older than stale_seconds (all of them, or just job_id) as failed"""
+        now = time.time()
+        query = ("UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                 "WHERE status IN ('queued', 'running') AND created_at < ?")
+        params = ('failed', STALE_JOB_ERROR, now, now - self.stale_seconds)
+        if job_id is not None:
+            query += ' AND job_id = ?'
+            params += (job_id,)
+        db.execute(query, params)
+
+    def _prune(self, db):
+        self._expire_stale(db)
+        db.execute('DELETE FROM jobs WHERE finished_at < ?', (time.time() - self.retention_seconds,))
+        count = db.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+        if count > self.max_jobs:
+            db.execute(
+                'DELETE FROM jobs WHERE job_id IN '
+                '(SELECT job_id FROM jobs WHERE finished_at IS NOT NULL ORDER BY finished_at LIMIT ?)',
+                (count - self.max_jobs,)
+            )
+
+    def get(self, job_id):
+        """Snapshot of a job, or None if it never existed or has expired"""
+        query = f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs WHERE job_id = ?'
+        with self._lock:
+            db = self._get_db()
+            row = db.execute(query, (job_id,)).fetchone()
+            # A poll for a job whose worker is gone gets its failure, not 'running' forever
+            if row is not None and self._is_stale(dict(zip(JOB_COLUMNS, row))):
+                self._expire_stale(db, job_id)
+                db.commit()
+                row = db.execute(query, (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(JOB_COLUMNS, row))
+        if job['result'] is not None:
+            job['result'] = json.loads(job['result'])
+        return job
+
+    def wait_for_change(self, job_id, last_status, timeout=15):
+        """Block until the job's status differs from last_status (or timeout)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] != last_status or remaining <= 0:
+                return job
+            # Jobs of this process wake the wait early; the others are polled
+            with self._changed:
+                self._changed.wait(min(self.poll_interval, remaining))
+
+    def get_stats(self):
+        with self._lock:
+            states = dict(self._get_db().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+            return {
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'retained_jobs': sum(states.values()),
+                'states': states,
+                'store': self.db_path,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
+
+
+# Global instance
+job_queue = JobQueue(
+    max_workers=int(os.getenv('JOB_CONCURRENCY', '2')),
+    max_pending=int(os.getenv('JOB_MAX_PENDING', '100')),
+    max_jobs=int(os.getenv('JOB_MAX_RETAINED', '1000')),
+    retention_seconds=int(os.getenv('JOB_RETENTION_SECONDS', '600')),
+    db_path=os.getenv('JOB_STORE_DB', os.path.join('cache', 'jobs.db')),
+    stale_seconds=int(os.getenv('JOB_STALE_SECONDS', '1800'))
+)
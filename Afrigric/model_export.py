@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Export tools for the maize classifiers.
+
+Usage:
+    python model_export.py tflite --data-dir samples/
+    python model_export.py tflite --models disease pest --precision int8
+    python model_export.py combined --data-dir samples/
+    python model_export.py uint8 --data-dir samples/
+    python model_export.py onnx --data-dir samples/
+    python model_export.py openvino --data-dir samples/
+
+`--data-dir` should contain one folder per model (disease/, pest/, nutrient/)
+with representative maize photos. They are used to calibrate int8
+quantization and to measure how often the exported model agrees with the
+original Keras model.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from image_processing import preprocess_image
+
+MODELS_DIR = 'models'
+CLASSIFIERS = ('disease', 'pest', 'nutrient')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+COMBINED_MODEL_PATH = os.path.join(MODELS_DIR, 'combined_model.keras')
+
+
+def keras_model_path(name):
+    return os.path.join(MODELS_DIR, f'{name}_model.keras')
+
+
+def tflite_model_path(name, precision):
+    return os.path.join(MODELS_DIR, f'{name}_model_{precision}.tflite')
+
+
+def uint8_model_path(name):
+    return os.path.join(MODELS_DIR, f'{name}_model_uint8.keras')
+
+
+def onnx_model_path(name):
+    return os.path.join(MODELS_DIR, f'{name}_model.onnx')
+
+
+def openvino_model_path(name):
+    return os.path.join(MODELS_DIR, f'{name}_model.xml')
+
+
+def find_images(directory, limit=None, seed=42):
+    """Recursively collect image paths under a directory"""
+    if not directory or not os.path.isdir(directory):
+        return []
+
+    paths = []
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, filename))
+
+    paths.sort()
+    if limit and len(paths) > limit:
+        random.Random(seed).shuffle(paths)
+        paths = paths[:limit]
+    return paths
+
+
+def load_image(path, target_size=(224, 224), dtype=np.float32):
+    """Same preprocessing as the request path: RGB, resize, scale to [0, 1]"""
+    return preprocess_image(path, target_size, dtype)[0]
+
+
+def synthetic_samples(count, target_size=(224, 224), dtype=np.float32, seed=42):
+    rng = np.random.default_rng(seed)
+    if dtype == np.uint8:
+        return rng.integers(0, 256, (count, target_size[0], target_size[1], 3), dtype=np.uint8)
+    return rng.random((count, target_size[0], target_size[1], 3), dtype=np.float32)
+
+
+def load_samples(directory, limit, target_size=(224, 224), dtype=np.float32):
+    """Load sample images, falling back to random noise when none are available"""
+    paths = find_images(directory, limit=limit)
+    if paths:
+        return np.stack([load_image(path, target_size, dtype) for path in paths])
+
+    print(f"⚠️  No sample images found in {directory!r}; using synthetic images. "
+          "Int8 calibration and agreement numbers will not be representative.")
+    return synthetic_samples(limit, target_size, dtype)
+
+
+def split_sample_paths(paths, calibration_size, eval_size, seed=42):
+    """
+    Shuffle the sample paths once and split them into disjoint calibration
+    and evaluation lists, so agreement is never measured on calibration
+    images. A folder too small for both sets is split in proportion.
+    """
+    paths = list(paths)
+    random.Random(seed).shuffle(paths)
+    wanted = calibration_size + eval_size
+    if len(paths) < wanted:
+        calibration_size = max(1, len(paths) * calibration_size // wanted)
+    return paths[:calibration_size], paths[calibration_size:calibration_size + eval_size]
+
+
+def load_calibration_and_eval(directory, calibration_size, eval_size, target_size=(224, 224)):
+    """Disjoint (calibration, evaluation) image batches from one sample folder"""
+    paths = find_images(directory)
+    if not paths:
+        print(f"⚠️  No sample images found in {directory!r}; using synthetic images. "
+              "Int8 calibration and agreement numbers will not be representative.")
+        return (synthetic_samples(calibration_size, target_size, seed=42),
+                synthetic_samples(eval_size, target_size, seed=43))
+
+    calibration_paths, eval_paths = split_sample_paths(paths, calibration_size, eval_size)
+    if not eval_paths:
+        raise SystemExit(f'{directory!r} needs at least 2 sample images: one to calibrate with, one to evaluate on')
+    if len(paths) < calibration_size + eval_size:
+        print(f"⚠️  {directory!r} holds {len(paths)} images, fewer than {calibration_size} for calibration plus "
+              f"{eval_size} for evaluation. Using {len(calibration_paths)} and {len(eval_paths)}; "
+              "agreement numbers will be noisier.")
+    load = lambda selected: np.stack([load_image(path, target_size) for path in selected])
+    return load(calibration_paths), load(eval_paths)
+
+
+def convert_to_tflite(model, precision, calibration_images=None):
+    """Convert a Keras model to a float16 or int8 TFLite flatbuffer"""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if precision == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif precision == 'int8':
+        if calibration_images is None or len(calibration_images) == 0:
+            raise ValueError("int8 export needs a representative dataset")
+
+        def representative_dataset():
+            for img in calibration_images:
+                yield [np.expand_dims(img, axis=0).astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        # Keep float input/output so preprocess_image stays unchanged
+    else:
+        raise ValueError(f"Unsupported precision: {precision}")
+
+    return converter.convert()
+
+
+def build_uint8_model(model, target_size=(224, 224)):
+    """
+    Wrap a classifier so it takes raw uint8 HWC pixels of any size.
+
+    Resizing and the 1/255 scaling run inside the graph, so callers can pass
+    the decoded image buffer as-is. Inputs already at the target size pass
+    through the resize unchanged.
+    """
+    import tensorflow as tf
+
+    inputs = tf.keras.Input(shape=(None, None, 3), dtype='uint8', name='pixels')
+    x = tf.keras.layers.Resizing(target_size[0], target_size[1], name='resize')(inputs)
+    x = tf.keras.layers.Rescaling(1.0 / 255, name='rescale')(x)
+    outputs = model(x)
+    return tf.keras.Model(inputs, outputs, name=f'{model.name}_uint8')
+
+
+def top1_agreement(reference_model, candidate_model, images, batch_size=32):
+    """Fraction of images where both models predict the same class"""
+    matches = 0
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        expected = np.argmax(reference_model.predict(batch, verbose=0), axis=1)
+        actual = np.argmax(candidate_model.predict(batch), axis=1)
+        matches += int(np.sum(expected == actual))
+    return matches / len(images) if len(images) else 0.0
+
+
+def mean_latency_ms(model, images, runs=20):
+    sample = images[:1]
+    model.predict(sample)
+    started = time.perf_counter()
+    for _ in range(runs):
+        model.predict(sample)
+    return (time.perf_counter() - started) / runs * 1000
+
+
+def export_tflite(names, precisions, data_dir=None, calibration_size=200, eval_size=500):
+    """Export each classifier to TFLite and report top-1 agreement with Keras"""
+    import tensorflow as tf
+    from tflite_backend import TFLiteClassifier
+
+    report = {}
+    for name in names:
+        keras_path = keras_model_path(name)
+        print(f"\n📦 Exporting {name} model from {keras_path}")
+        model = tf.keras.models.load_model(keras_path)
+
+        samples_dir = os.path.join(data_dir, name) if data_dir else None
+        calibration_images, eval_images = load_calibration_and_eval(samples_dir, calibration_size, eval_size)
+
+        report[name] = {'keras_size_mb': round(os.path.getsize(keras_path) / 1e6, 2)}
+        for precision in precisions:
+            output_path = tflite_model_path(name, precision)
+            flatbuffer = convert_to_tflite(model, precision, calibration_images)
+            with open(output_path, 'wb') as f:
+                f.write(flatbuffer)
+
+            tflite_model = TFLiteClassifier(output_path)
+            agreement = top1_agreement(model, tflite_model, eval_images)
+            report[name][precision] = {
+                'path': output_path,
+                'size_mb': round(len(flatbuffer) / 1e6, 2),
+                'top1_agreement': round(agreement, 4),
+                'calibration_images': int(len(calibration_images)),
+                'eval_images': int(len(eval_images)),
+                'latency_ms': round(mean_latency_ms(tflite_model, eval_images), 2)
+            }
+            print(f"✅ {name} [{precision}] -> {output_path} "
+                  f"({report[name][precision]['size_mb']} MB, "
+                  f"top-1 agreement {agreement * 100:.2f}% on {len(eval_images)} held-out images)")
+
+    return report
+
+
+def export_combined(data_dir=None, eval_size=200):
+    """Build the shared-backbone model and check each head against its source model"""
+    import tensorflow as tf
+    from multi_head_model import COMBINED_OUTPUTS, build_combined_model
+
+    models = {name: tf.keras.models.load_model(keras_model_path(name)) for name in COMBINED_OUTPUTS}
+    combined = build_combined_model(models)
+    combined.save(COMBINED_MODEL_PATH)
+    print(f"✅ Combined model saved to {COMBINED_MODEL_PATH}")
+
+    report = {
+        'path': COMBINED_MODEL_PATH,
+        'params': int(combined.count_params()),
+        'separate_params': int(sum(model.count_params() for model in models.values()))
+    }
+    for index, name in enumerate(COMBINED_OUTPUTS):
+        samples_dir = os.path.join(data_dir, name) if data_dir else None
+        images = load_samples(samples_dir, eval_size)
+        expected = np.argmax(models[name].predict(images, verbose=0), axis=1)
+        actual = np.argmax(combined.predict(images, verbose=0)[index], axis=1)
+        report[name] = {'top1_agreement': round(float(np.mean(expected == actual)), 4)}
+        print(f"   {name}: top-1 agreement {report[name]['top1_agreement'] * 100:.2f}%")
+
+    print(f"   Parameters: {report['params']:,} combined vs {report['separate_params']:,} separate")
+    return report
+
+
+def export_uint8(names, data_dir=None, eval_size=200):
+    """Export each classifier with a uint8 input and in-graph preprocessing"""
+    import tensorflow as tf
+
+    report = {}
+    for name in names:
+        model = tf.keras.models.load_model(keras_model_path(name))
+        wrapped = build_uint8_model(model)
+        output_path = uint8_model_path(name)
+        wrapped.save(output_path)
+
+        samples_dir = os.path.join(data_dir, name) if data_dir else None
+        pixels = load_samples(samples_dir, eval_size, dtype=np.uint8)
+        expected = np.argmax(model.predict(pixels.astype(np.float32) / 255.0, verbose=0), axis=1)
+        actual = np.argmax(wrapped.predict(pixels, verbose=0), axis=1)
+        report[name] = {
+            'path': output_path,
+            'top1_agreement': round(float(np.mean(expected == actual)), 4),
+            'eval_images': int(len(pixels))
+        }
+        print(f"✅ {name} [uint8] -> {output_path} "
+              f"(top-1 agreement {report[name]['top1_agreement'] * 100:.2f}%)")
+
+    return report
+
+
+def convert_to_onnx(model, output_path, opset=13):
+    """Convert a Keras classifier to ONNX with a dynamic batch dimension"""
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output_path)
+
+
+def convert_to_openvino(model, output_path, onnx_path=None):
+    """Convert a classifier to OpenVINO IR, from its ONNX export when there is one"""
+    import openvino as ov
+
+    if onnx_path and os.path.exists(onnx_path):
+        ov_model = ov.convert_model(onnx_path)
+    else:
+        ov_model = ov.convert_model(model)
+    # Keep the batch dimension dynamic so micro-batches of any size fit
+    ov_model.reshape([-1] + [dim.get_length() for dim in ov_model.input(0).get_partial_shape()[1:]])
+    # fp16 weights halve the file; the CPU plugin still computes in fp32
+    ov.save_model(ov_model, output_path, compress_to_fp16=True)
+
+
+class KerasPredictor:
+    """Calls a Keras model directly, without predict()'s per-call overhead, for fair latency numbers"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, batch, verbose=0):
+        return self.model(batch, training=False).numpy()
+
+
+def export_runtime(names, runtime, data_dir=None, eval_size=200):
+    """Export each classifier for ONNX Runtime or OpenVINO and compare it with Keras"""
+    import tensorflow as tf
+    from inference_backends import load_backend_model
+
+    report = {}
+    for name in names:
+        keras_path = keras_model_path(name)
+        print(f"\n📦 Exporting {name} model from {keras_path} for {runtime}")
+        model = tf.keras.models.load_model(keras_path)
+
+        if runtime == 'onnx':
+            output_path = onnx_model_path(name)
+            convert_to_onnx(model, output_path)
+            size = os.path.getsize(output_path)
+        else:
+            output_path = openvino_model_path(name)
+            convert_to_openvino(model, output_path, onnx_model_path(name))
+            size = os.path.getsize(output_path) + os.path.getsize(os.path.splitext(output_path)[0] + '.bin')
+
+        samples_dir = os.path.join(data_dir, name) if data_dir else None
+        eval_images = load_samples(samples_dir, eval_size)
+        exported = load_backend_model(output_path)
+        agreement = top1_agreement(model, exported, eval_images)
+        report[name] = {
+            'path': output_path,
+            'size_mb': round(size / 1e6, 2),
+            'top1_agreement': round(agreement, 4),
+            'eval_images': int(len(eval_images)),
+            'latency_ms': round(mean_latency_ms(exported, eval_images), 2),
+            'keras_latency_ms': round(mean_latency_ms(KerasPredictor(model), eval_images), 2)
+        }
+        print(f"✅ {name} [{runtime}] -> {output_path} ({report[name]['size_mb']} MB, "
+              f"top-1 agreement {agreement * 100:.2f}%, {report[name]['latency_ms']} ms "
+              f"vs {report[name]['keras_latency_ms']} ms with Keras)")
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the maize classifiers for CPU serving')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    tflite_parser = subparsers.add_parser('tflite', help='Export float16 / int8 TFLite models')
+    tflite_parser.add_argument('--models', nargs='+', choices=CLASSIFIERS, default=list(CLASSIFIERS))
+    tflite_parser.add_argument('--precision', nargs='+', choices=('float16', 'int8'), default=['float16', 'int8'])
+    tflite_parser.add_argument('--data-dir', help='Folder with one sub-folder of sample images per model')
+    tflite_parser.add_argument('--calibration-size', type=int, default=200)
+    tflite_parser.add_argument('--eval-size', type=int, default=500)
+    tflite_parser.add_argument('--report', default=os.path.join(MODELS_DIR, 'tflite_export_report.json'))
+
+    combined_parser = subparsers.add_parser('combined', help='Build the shared-backbone multi-head model')
+    combined_parser.add_argument('--data-dir', help='Folder with one sub-folder of sample images per model')
+    combined_parser.add_argument('--eval-size', type=int, default=200)
+    combined_parser.add_argument('--report', default=os.path.join(MODELS_DIR, 'combined_export_report.json'))
+
+    uint8_parser = subparsers.add_parser('uint8', help='Export models that take raw uint8 pixels')
+    uint8_parser.add_argument('--models', nargs='+', choices=CLASSIFIERS, default=list(CLASSIFIERS))
+    uint8_parser.add_argument('--data-dir', help='Folder with one sub-folder of sample images per model')
+    uint8_parser.add_argument('--eval-size', type=int, default=200)
+    uint8_parser.add_argument('--report', default=os.path.join(MODELS_DIR, 'uint8_export_report.json'))
+
+    for runtime, description in (('onnx', 'ONNX Runtime'), ('openvino', 'OpenVINO')):
+        runtime_parser = subparsers.add_parser(runtime, help=f'Export models for {description} on CPU')
+        runtime_parser.add_argument('--models', nargs='+', choices=CLASSIFIERS, default=list(CLASSIFIERS))
+        runtime_parser.add_argument('--data-dir', help='Folder with one sub-folder of sample images per model')
+        runtime_parser.add_argument('--eval-size', type=int, default=200)
+        runtime_parser.add_argument('--report', default=os.path.join(MODELS_DIR, f'{runtime}_export_report.json'))
+
+    args = parser.parse_args()
+
+    if args.command == 'tflite':
+        report = export_tflite(args.models, args.precision, args.data_dir, args.calibration_size, args.eval_size)
+    elif args.command == 'combined':
+        report = export_combined(args.data_dir, args.eval_size)
+    elif args.command == 'uint8':
+        report = export_uint8(args.models, args.data_dir, args.eval_size)
+    elif args.command in ('onnx', 'openvino'):
+        report = export_runtime(args.models, args.command, args.data_dir, args.eval_size)
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📝 Export report written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+class ModelNotReady(Exception):
+    """Raised when a request needs a model that is still loading or warming up"""
+
+    def __init__(self, name, state):
+        super().__init__(f"Model '{name}' is not ready yet ({state})")
+        self.name = name
+        self.state = state
+
+
+def classifier_warmup(input_shape=(224, 224, 3), dtype=np.float32):
+    """Warmup step that runs one dummy image so graph tracing happens before real traffic"""
+    def warmup(model):
+        model.predict(np.zeros((1,) + tuple(input_shape), dtype=dtype), verbose=0)
+    return warmup
+
+
+class ModelManager:
+    """
+    Loads models off the request path and tracks their readiness.
+
+    Modes (MODEL_LOADING):
+      background - start loading every model in a thread as soon as start() is called
+      lazy       - load a model the first time a request asks for it
+      eager      - load everything before start() returns (the old behaviour)
+
+    In background and lazy mode a request for a model that is not ready gets
+    ModelNotReady straight away instead of waiting for the load.
+    """
+
+    def __init__(self, mode=None):
+        self.mode = (mode or os.getenv('MODEL_LOADING', 'background')).lower()
+        self._loaders = {}
+        self._models = {}
+        self._state = {}
+        self._errors = {}
+        self._timings = {}
+        # Bumped by swap(), so a slow initial load cannot overwrite a newer model
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._ready_changed = threading.Condition(self._lock)
+        self._started = False
+
+    def register(self, name, loader, warmup=None):
+        """Register a loader callable and an optional warmup(model) step"""
+        with self._lock:
+            self._loaders[name] = (loader, warmup)
+            self._state[name] = 'pending'
+
+    def start(self):
+        """Begin loading according to the configured mode"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        if self.mode == 'eager':
+            for name in list(self._loaders):
+                self._load(name)
+        elif self.mode == 'background':
+            thread = threading.Thread(target=self._load_all, name='model-loader', daemon=True)
+            thread.start()
+
+    def preload(self, names):
+        """Load the named models right now, without starting the rest"""
+        for name in names:
+            if name in self._loaders:
+                self._load(name)
+
+    def _load_all(self):
+        for name in list(self._loaders):
+            self._load(name)
+
+    def _claim(self, name):
+        """Mark a pending model as loading and return its swap generation; False if someone else already has it"""
+        with self._lock:
+            if self._state.get(name) not in ('pending', 'error'):
+                return False
+            self._state[name] = 'loading'
+            return self._generations.get(name, 0)
+
+    def _load(self, name):
+        generation = self._claim(name)
+        if generation is False:
+            return
+
+        loader, warmup = self._loaders[name]
+        try:
+            started = time.perf_counter()
+            model = loader()
+            loaded = time.perf_counter()
+
+            if warmup is not None:
+                with self._lock:
+                    if self._generations.get(name, 0) == generation:
+                        self._state[name] = 'warming_up'
+                warmup(model)
+            finished = time.perf_counter()
+
+            with self._ready_changed:
+                if self._generations.get(name, 0) != generation:
+                    print(f"⚠️  Discarding load of '{name}'; a newer version was swapped in meanwhile")
+                    return
+                self._models[name] = model
+                self._state[name] = 'ready'
+                self._ready_changed.notify_all()
+                self._errors.pop(name, None)
+                self._timings[name] = {
+                    'load_seconds': round(loaded - started, 2),
+                    'warmup_seconds': round(finished - loaded, 2)
+                }
+            print(f"✅ Model '{name}' ready (load {loaded - started:.1f}s, warmup {finished - loaded:.1f}s)")
+        except Exception as e:
+            with self._ready_changed:
+                if self._generations.get(name, 0) == generation:
+                    self._state[name] = 'error'
+                    self._errors[name] = str(e)
+                self._ready_changed.notify_all()
+            print(f"❌ Error loading model '{name}': {str(e)}")
+
+    def swap(self, name, model):
+        """Atomically replace the model served under `name` with a loaded, warmed-up one"""
+        with self._ready_changed:
+            self._models[name] = model
+            self._state[name] = 'ready'
+            self._errors.pop(name, None)
+            self._generations[name] = self._generations.get(name, 0) + 1
+            self._ready_changed.notify_all()
+
+    def is_ready(self, name):
+        return self._state.get(name) == 'ready'
+
+    def get(self, name):
+        """Return a ready model or raise ModelNotReady"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"No model registered under '{name}'")
+
+        if self.mode == 'lazy' and self._state.get(name) in ('pending', 'error'):
+            threading.Thread(target=self._load, args=(name,), name=f'model-loader-{name}', daemon=True).start()
+
+        raise ModelNotReady(name, self._state.get(name))
+
+    def wait_until_ready(self, name, timeout=60):
+        """Like get(), but block up to `timeout` seconds for a model that is still loading"""
+        try:
+            return self.get(name)
+        except ModelNotReady:
+            pass
+
+        with self._ready_changed:
+            self._ready_changed.wait_for(lambda: self._state.get(name) in ('ready', 'error'), timeout=timeout)
+        return self.get(name)
+
+    def all_ready(self):
+        return all(state == 'ready' for state in self._state.values())
+
+    def status(self):
+        with self._lock:
+            return {
+                name: {
+                    'state': self._state[name],
+                    'error': self._errors.get(name),
+                    **self._timings.get(name, {})
+                }
+                for name in self._loaders
+            }
+
+
+# Global instance
+model_manager = ModelManager()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Versioned model registry.
+
+Layout (MODEL_REGISTRY_DIR, default models/registry):
+
+    <task>/<version>/manifest.json    class names, input size, checksum of every file
+    <task>/<version>/model.keras      (or .tflite, .onnx, or OpenVINO .xml + .bin)
+    <task>/ACTIVE                     version currently served
+    <task>/history.json               versions in activation order, for rollback
+
+Usage:
+    python model_registry.py publish --task disease --model new_disease.keras --version 2024-06 --classes Blight Common_Rust Gray_Leaf_Spot Healthy
+    python model_registry.py list
+    python model_registry.py activate --task disease --version 2024-06
+    python model_registry.py rollback --task disease
+
+Running servers pick up ACTIVE changes through the registry watcher, or
+straight away through the admin endpoints in app.py.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from image_processing import MODEL_INPUT_SIZE
+
+# Load environment variables
+load_dotenv()
+
+REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', os.path.join('models', 'registry'))
+# Seconds between checks of the ACTIVE files; 0 turns the watcher off
+REGISTRY_WATCH_SECONDS = float(os.getenv('MODEL_REGISTRY_WATCH_SECONDS', '10'))
+MANIFEST_FIELDS = ('task', 'version', 'model_file', 'classes', 'input_size', 'sha256')
+
+
+class ManifestError(Exception):
+    """Raised for a missing, incomplete or corrupted registry version"""
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_atomic(path, text):
+    """Replace a file in one step so readers never see half of it"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def check_input_size(task, version, input_size):
+    """The server resizes every photo to MODEL_INPUT_SIZE, so a model must take exactly that"""
+    if tuple(input_size) != tuple(MODEL_INPUT_SIZE):
+        raise ManifestError(f'{task} {version} takes {input_size[0]}x{input_size[1]} input but the server '
+                            f'feeds {MODEL_INPUT_SIZE[0]}x{MODEL_INPUT_SIZE[1]}')
+
+
+def class_mapping(manifest):
+    """{index: class name} in the same shape as DISEASE_MAPPING and friends"""
+    return dict(enumerate(manifest['classes']))
+
+
+class ModelRegistry:
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def task_dir(self, task):
+        return os.path.join(self.root, task)
+
+    def version_dir(self, task, version):
+        if not version or version.startswith('.') or '/' in version or '\\' in version:
+            raise ManifestError(f'Invalid version name: {version!r}')
+        return os.path.join(self.root, task, version)
+
+    def versions(self, task):
+        """Published versions of a task, oldest first"""
+        directory = self.task_dir(task)
+        if not os.path.isdir(directory):
+            return []
+        found = [entry for entry in os.listdir(directory)
+                 if os.path.isfile(os.path.join(directory, entry, 'manifest.json'))]
+        return sorted(found, key=lambda version: os.path.getmtime(os.path.join(directory, version, 'manifest.json')))
+
+    def manifest(self, task, version):
+        path = os.path.join(self.version_dir(task, version), 'manifest.json')
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ManifestError(f'Cannot read manifest for {task} {version}: {e}')
+
+        missing = [field for field in MANIFEST_FIELDS if field not in manifest]
+        if missing:
+            raise ManifestError(f"Manifest for {task} {version} is missing {', '.join(missing)}")
+        return manifest
+
+    def model_path(self, task, version):
+        return os.path.join(self.version_dir(task, version), self.manifest(task, version)['model_file'])
+
+    def verify(self, task, version):
+        """Check the input size and every model file against the manifest checksums; returns the manifest"""
+        manifest = self.manifest(task, version)
+        check_input_size(task, version, manifest['input_size'])
+        # Manifests written before 'files' existed only cover the model file
+        files = manifest.get('files') or {manifest['model_file']: manifest['sha256']}
+        for name, sha256 in files.items():
+            path = os.path.join(self.version_dir(task, version), name)
+            if not os.path.exists(path):
+                raise ManifestError(f'Model file missing for {task} {version}: {path}')
+            if file_sha256(path) != sha256:
+                raise ManifestError(f'Checksum mismatch for {task} {version}; {name} is corrupted or was replaced')
+        return manifest
+
+    def active_version(self, task):
+        try:
+            with open(os.path.join(self.task_dir(task), 'ACTIVE')) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def history(self, task):
+        try:
+            with open(os.path.join(self.task_dir(task), 'history.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def activate(self, task, version):
+        """Mark a version as the one to serve (it is verified first)"""
+        self.verify(task, version)
+        with self._lock:
+            history = [entry for entry in self.history(task) if entry != version] + [version]
+            write_atomic(os.path.join(self.task_dir(task), 'history.json'), json.dumps(history, indent=2))
+            write_atomic(os.path.join(self.task_dir(task), 'ACTIVE'), version)
+        return version
+
+    def _earlier_history(self, task):
+        history = self.history(task)
+        active = self.active_version(task)
+        if active in history:
+            history = history[:history.index(active)]
+        if not history:
+            raise ManifestError(f'No earlier version of {task} to roll back to')
+        return history
+
+    def previous_version(self, task):
+        """The version a rollback would switch to"""
+        return self._earlier_history(task)[-1]
+
+    def rollback(self, task):
+        """Go back to the version that was active before the current one"""
+        with self._lock:
+            history = self._earlier_history(task)
+            previous = history[-1]
+            self.verify(task, previous)
+            write_atomic(os.path.join(self.task_dir(task), 'history.json'), json.dumps(history, indent=2))
+            write_atomic(os.path.join(self.task_dir(task), 'ACTIVE'), previous)
+        return previous
+
+    def publish(self, task, model_file, classes, version=None, input_size=(224, 224), input_dtype='float32'):
+        """Copy a model into a new version directory and write its manifest"""
+        version = version or time.strftime('%Y%m%d-%H%M%S')
+        check_input_size(task, version, input_size)
+        directory = self.version_dir(task, version)
+        if os.path.exists(directory):
+            raise ManifestError(f'{task} version {version} already exists')
+
+        os.makedirs(directory)
+        target_name = 'model' + os.path.splitext(model_file)[1]
+        target = os.path.join(directory, target_name)
+        shutil.copyfile(model_file, target)
+        artifacts = [target_name]
+        if target_name.endswith('.xml'):
+            # OpenVINO IR keeps its weights in a .bin file next to the .xml
+            shutil.copyfile(os.path.splitext(model_file)[0] + '.bin', os.path.join(directory, 'model.bin'))
+            artifacts.append('model.bin')
+        files = {name: file_sha256(os.path.join(directory, name)) for name in artifacts}
+
+        manifest = {
+            'task': task,
+            'version': version,
+            'model_file': target_name,
+            'classes': list(classes),
+            'input_size': list(input_size),
+            'input_dtype': input_dtype,
+            'sha256': files[target_name],
+            'files': files,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+        # Written last: a version only counts once its manifest exists
+        write_atomic(os.path.join(directory, 'manifest.json'), json.dumps(manifest, indent=2))
+        return manifest
+
+    def status(self, tasks):
+        return {
+            task: {
+                'active': self.active_version(task),
+                'versions': self.versions(task),
+                'history': self.history(task)
+            }
+            for task in tasks
+        }
+
+
+class RegistryWatcher:
+    """
+    Polls the ACTIVE files and calls on_change(task, version) when one moves.
+
+    Every server process runs its own watcher, so a version activated through
+    one worker (or the CLI) reaches all of them.
+    """
+
+    def __init__(self, registry, tasks, current_version, on_change, interval=REGISTRY_WATCH_SECONDS):
+        self.registry = registry
+        self.tasks = tasks
+        self.current_version = current_version
+        self.on_change = on_change
+        self.interval = interval
+        self._thread = None
+        # Versions that failed to load are not retried on every poll
+        self._failed = {}
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='registry-watcher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            for task in self.tasks:
+                version = self.registry.active_version(task)
+                if not version or version == self.current_version(task) or self._failed.get(task) == version:
+                    continue
+                try:
+                    self.on_change(task, version)
+                except Exception as e:
+                    self._failed[task] = version
+                    print(f"❌ Could not switch {task} to version {version}: {str(e)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage versioned classifier models')
+    parser.add_argument('--root', default=REGISTRY_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    publish_parser = subparsers.add_parser('publish', help='Add a new model version')
+    publish_parser.add_argument('--task', required=True, choices=('disease', 'pest', 'nutrient'))
+    publish_parser.add_argument('--model', required=True, help='.keras, .tflite, .onnx or OpenVINO .xml file to publish')
+    publish_parser.add_argument('--version', help='Version name (default: timestamp)')
+    publish_parser.add_argument('--classes', nargs='+', help='Class names in output order (default: copy from the active version)')
+    publish_parser.add_argument('--input-size', nargs=2, type=int, default=[224, 224])
+    publish_parser.add_argument('--input-dtype', choices=('float32', 'uint8'), default='float32')
+    publish_parser.add_argument('--activate', action='store_true')
+
+    subparsers.add_parser('list', help='Show versions of every task')
+
+    activate_parser = subparsers.add_parser('activate', help='Serve a published version')
+    activate_parser.add_argument('--task', required=True)
+    activate_parser.add_argument('--version', required=True)
+
+    rollback_parser = subparsers.add_parser('rollback', help='Serve the previously active version again')
+    rollback_parser.add_argument('--task', required=True)
+
+    args = parser.parse_args()
+    registry = ModelRegistry(args.root)
+
+    if args.command == 'publish':
+        classes = args.classes
+        if not classes:
+            active = registry.active_version(args.task)
+            if not active:
+                parser.error('--classes is required for the first version of a task')
+            classes = registry.manifest(args.task, active)['classes']
+        manifest = registry.publish(args.task, args.model, classes, args.version, args.input_size, args.input_dtype)
+        print(f"✅ Published {args.task} {manifest['version']} ({len(classes)} classes)")
+        if args.activate:
+            registry.activate(args.task, manifest['version'])
+            print(f"✅ {args.task} {manifest['version']} is now active")
+    elif args.command == 'list':
+        print(json.dumps(registry.status(('disease', 'pest', 'nutrient')), indent=2))
+    elif args.command == 'activate':
+        registry.activate(args.task, args.version)
+        print(f"✅ {args.task} {args.version} is now active")
+    elif args.command == 'rollback':
+        version = registry.rollback(args.task)
+        print(f"✅ {args.task} rolled back to {version}")
+
+
+# Global instance
+model_registry = ModelRegistry()
+
+
+if __name__ == '__main__':
+    main()
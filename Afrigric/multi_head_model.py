@@ -0,0 +1,77 @@
+import numpy as np
+
+# Order of the heads in the combined model's outputs
+COMBINED_OUTPUTS = ('disease', 'pest', 'nutrient')
+
+
+def find_backbone(model):
+    """Return the nested MobileNetV2 feature extractor and the head layers after it"""
+    import tensorflow as tf
+
+    for index, layer in enumerate(model.layers):
+        if isinstance(layer, tf.keras.Model):
+            return layer, model.layers[index + 1:]
+    raise ValueError(f"{model.name} has no nested backbone model")
+
+
+def backbone_max_difference(first, second):
+    """Largest absolute weight difference between two backbones"""
+    first_weights = first.get_weights()
+    second_weights = second.get_weights()
+    if len(first_weights) != len(second_weights):
+        return float('inf')
+    return max(float(np.max(np.abs(a - b))) if a.size else 0.0
+               for a, b in zip(first_weights, second_weights))
+
+
+def _clone_head_layer(layer, prefix):
+    # Every notebook names its layers 'dense', 'dropout', ... so the copies
+    # need unique names to live in one functional model
+    config = layer.get_config()
+    config['name'] = f'{prefix}_{layer.name}'
+    return layer.__class__.from_config(config)
+
+
+def build_combined_model(models):
+    """
+    Build one model with a shared MobileNetV2 backbone and one head per task.
+
+    `models` maps 'disease' / 'pest' / 'nutrient' to the trained Keras models.
+    All three notebooks freeze the ImageNet MobileNetV2 backbone, so the
+    backbone weights are identical and only the small dense heads differ.
+    """
+    import tensorflow as tf
+
+    backbones = {name: find_backbone(models[name]) for name in COMBINED_OUTPUTS}
+    backbone = backbones[COMBINED_OUTPUTS[0]][0]
+
+    for name in COMBINED_OUTPUTS[1:]:
+        difference = backbone_max_difference(backbone, backbones[name][0])
+        if difference > 1e-5:
+            print(f"⚠️  {name} backbone differs from the {COMBINED_OUTPUTS[0]} backbone "
+                  f"(max weight difference {difference:.2e}); its predictions may shift slightly")
+
+    inputs = tf.keras.Input(shape=backbone.input_shape[1:], name='image')
+    features = backbone(inputs, training=False)
+
+    outputs = []
+    for name in COMBINED_OUTPUTS:
+        x = features
+        head_layers = backbones[name][1]
+        for position, layer in enumerate(head_layers):
+            clone = _clone_head_layer(layer, name)
+            if position == len(head_layers) - 1:
+                # Name the final layer after the task so outputs are easy to find
+                config = layer.get_config()
+                config['name'] = name
+                clone = layer.__class__.from_config(config)
+            x = clone(x)
+            clone.set_weights(layer.get_weights())
+        outputs.append(x)
+
+    return tf.keras.Model(inputs, outputs, name='maize_multi_head')
+
+
+def split_outputs(outputs):
+    """Map the combined model's output list to {task: probabilities}"""
+    return dict(zip(COMBINED_OUTPUTS, outputs))
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def image_digest(img):
+    """Content hash of a decoded PIL image (pixels, size and mode)"""
+    digest = hashlib.sha256()
+    digest.update(f'{img.mode}:{img.size[0]}x{img.size[1]}:'.encode())
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+def file_version(path):
+    """Short version tag for a model file, changes whenever the file is replaced"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 'missing'
+    return hashlib.sha1(f'{path}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()[:12]
+
+
+class PredictionCache:
+    """
+    LRU cache of classifier outputs keyed by image content and model version.
+
+    Entries hold the softmax vector, predicted class and confidence. An
+    optional SQLite file keeps entries across restarts; memory is checked
+    first and disk hits are promoted back into memory. The file is trimmed
+    to `max_db_entries` every `db_prune_every` writes, so in between it may
+    hold up to `db_prune_every` extra rows.
+    """
+
+    def __init__(self, max_entries=2048, db_path=None, max_db_entries=100000, db_prune_every=256):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.max_db_entries = max_db_entries
+        self.db_prune_every = db_prune_every
+        self._writes_since_prune = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if db_path:
+            self._open_db()
+
+    def _open_db(self):
+        try:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db_pid = os.getpid()
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS predictions (
+                    key TEXT PRIMARY KEY,
+                    probabilities BLOB NOT NULL,
+                    predicted_class INTEGER NOT NULL,
+                    confidence REAL NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️  Prediction cache database unavailable ({self.db_path}): {str(e)}")
+            self._db = None
+
+    def _get_db(self):
+        # A SQLite connection must not be used across fork(); a gunicorn
+        # worker opens its own instead of the one inherited from the master
+        if self._db is not None and self._db_pid != os.getpid():
+            self._open_db()
+        return self._db
+
+    @staticmethod
+    def make_key(digest, model_id, model_version):
+        return f'{model_id}:{model_version}:{digest}'
+
+    def get(self, key):
+        """Cached result dict for `key`, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry
+
+            db = self._get_db()
+            if db is not None:
+                row = db.execute(
+                    'SELECT probabilities, predicted_class, confidence FROM predictions WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = {
+                        'probabilities': np.frombuffer(row[0], dtype=np.float32),
+                        'predicted_class': row[1],
+                        'confidence': row[2]
+                    }
+                    self._remember(key, entry)
+                    self.disk_hits += 1
+                    return entry
+
+            self.misses += 1
+            return None
+
+    def put(self, key, probabilities):
+        """Store a softmax vector and return the cached result dict"""
+        probabilities = np.asarray(probabilities, dtype=np.float32).reshape(-1)
+        entry = {
+            'probabilities': probabilities,
+            'predicted_class': int(np.argmax(probabilities)),
+            'confidence': float(np.max(probabilities))
+        }
+
+        with self._lock:
+            self._remember(key, entry)
+            db = self._get_db()
+            if db is not None:
+                try:
+                    db.execute(
+                        'INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)',
+                        (key, probabilities.tobytes(), entry['predicted_class'], entry['confidence'], time.time())
+                    )
+                    self._writes_since_prune += 1
+                    if self._writes_since_prune >= self.db_prune_every:
+                        # Counting rows scans the table, so it is not done on every write
+                        self._prune_db()
+                        self._writes_since_prune = 0
+                    db.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️  Failed to persist prediction: {str(e)}")
+
+        return entry
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _prune_db(self):
+        count = self._db.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+        if count > self.max_db_entries:
+            self._db.execute(
+                'DELETE FROM predictions WHERE key IN '
+                '(SELECT key FROM predictions ORDER BY created_at LIMIT ?)',
+                (count - self.max_db_entries,)
+            )
+
+    def get_stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': hits,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'disk_tier': self.db_path if self._db is not None else None
+            }
+
+
+# Global instance
+prediction_cache = PredictionCache(
+    max_entries=int(os.getenv('PREDICTION_CACHE_SIZE', '2048')),
+    db_path=os.getenv('PREDICTION_CACHE_DB') or None
+)
@@ -0,0 +1,168 @@
+"""
+Pipelined preprocessing for the classifiers.
+
+Decoding and resizing uploads (PIL releases the GIL for both) run on a small
+shared thread pool instead of on each request thread. The inference stage
+(the micro-batcher's worker thread) keeps running while the pool prepares
+the next images, so under concurrent load the decode of request N+1 overlaps
+the forward pass of request N. The pool also caps how many cores
+preprocessing may take at once, leaving the rest to TensorFlow's own thread
+pools, whose sizes are set here too.
+
+    INFERENCE_PIPELINE=true      route decode/resize through the pool
+    PREPROCESS_WORKERS=4         decode/resize threads
+    PREPROCESS_MAX_PENDING=16    queued + running tasks before submit() blocks
+    TF_INTRA_OP_THREADS=0        threads inside one op (0 = TensorFlow default)
+    TF_INTER_OP_THREADS=0        ops run in parallel (0 = TensorFlow default)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+PIPELINE_ENABLED = os.getenv('INFERENCE_PIPELINE', 'false').lower() == 'true'
+PREPROCESS_WORKERS = int(os.getenv('PREPROCESS_WORKERS', str(min(4, os.cpu_count() or 1))))
+PREPROCESS_MAX_PENDING = int(os.getenv('PREPROCESS_MAX_PENDING', str(PREPROCESS_WORKERS * 4)))
+TF_INTRA_OP_THREADS = int(os.getenv('TF_INTRA_OP_THREADS', '0'))
+TF_INTER_OP_THREADS = int(os.getenv('TF_INTER_OP_THREADS', '0'))
+
+_tf_configured = False
+_tf_lock = threading.Lock()
+
+
+def configure_tensorflow_threads(intra_op=TF_INTRA_OP_THREADS, inter_op=TF_INTER_OP_THREADS):
+    """Apply the TF thread pool sizes once, before the first model is loaded"""
+    global _tf_configured
+    with _tf_lock:
+        if _tf_configured:
+            return
+        _tf_configured = True
+        if not intra_op and not inter_op:
+            return
+
+        import tensorflow as tf
+        try:
+            if intra_op:
+                tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+            if inter_op:
+                tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+        except RuntimeError as e:
+            # TensorFlow was already initialised by someone else
+            print(f"⚠️  Could not set TensorFlow thread pools: {str(e)}")
+
+
+class PreprocessPool:
+    """
+    Bounded thread pool for the CPU-bound preprocessing stage.
+
+    At most `max_pending` tasks are queued or running; submit() blocks
+    beyond that, so a burst of uploads waits here instead of piling decoded
+    images up in memory.
+    """
+
+    def __init__(self, max_workers=PREPROCESS_WORKERS, max_pending=PREPROCESS_MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.in_flight = 0
+        self.total_busy_ms = 0.0
+        self.total_wait_ms = 0.0
+
+    def _get_executor(self):
+        # Created on first use so forked workers get their own threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='preprocess')
+            return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool and return its Future"""
+        self._slots.acquire()
+        with self._stats_lock:
+            self.submitted += 1
+            self.in_flight += 1
+        try:
+            return self._get_executor().submit(self._run, time.perf_counter(), fn, args, kwargs)
+        except Exception:
+            self._release(0.0, 0.0)
+            raise
+
+    def _run(self, submitted_at, fn, args, kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            finished = time.perf_counter()
+            self._release((finished - started) * 1000, (started - submitted_at) * 1000)
+
+    def _release(self, busy_ms, wait_ms):
+        with self._stats_lock:
+            self.completed += 1
+            self.in_flight -= 1
+            self.total_busy_ms += busy_ms
+            self.total_wait_ms += wait_ms
+        self._slots.release()
+
+    def run(self, fn, *args, **kwargs):
+        """Blocking helper around submit()"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def imap(self, fn, items, prefetch=None):
+        """
+        Yield fn(item) for each item in order, keeping up to `prefetch` items
+        in progress ahead of the consumer.
+
+        The caller can run inference on one result while the pool prepares
+        the following ones.
+        """
+        prefetch = prefetch or self.max_workers * 2
+        pending = deque()
+        for item in items:
+            pending.append(self.submit(fn, item))
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                'enabled': PIPELINE_ENABLED,
+                'workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'in_flight': self.in_flight,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'avg_task_ms': round(self.total_busy_ms / self.completed, 2) if self.completed else 0,
+                'avg_queue_wait_ms': round(self.total_wait_ms / self.completed, 2) if self.completed else 0
+            }
+
+
+def pipeline_settings():
+    """Thread settings for the preprocessing and inference stages, for the startup log"""
+    return {
+        'pipeline': PIPELINE_ENABLED,
+        'preprocess_workers': PREPROCESS_WORKERS,
+        'preprocess_max_pending': PREPROCESS_MAX_PENDING,
+        'tf_intra_op_threads': TF_INTRA_OP_THREADS or 'default',
+        'tf_inter_op_threads': TF_INTER_OP_THREADS or 'default',
+        'cpu_count': os.cpu_count()
+    }
+
+
+# Global instance
+preprocess_pool = PreprocessPool()
@@ -0,0 +1,101 @@
+"""
+In-flight deduplication of identical classifier requests (singleflight).
+
+When a group uploads the same photo at once, every request misses the
+prediction cache until the first forward pass has finished. The coalescer
+closes that window: the first request for a key (image content hash, model
+and model version, see app.prediction_key) becomes its leader and runs the
+model, and identical requests arriving meanwhile wait for the leader's
+result instead of starting their own pass. Once the result is in the
+prediction cache, later requests are served from there.
+
+Coalescing is per process; each gunicorn worker keeps its own table.
+
+    COALESCE_REQUESTS=true       false runs every request on its own
+"""
+
+import os
+import threading
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+COALESCE_ENABLED = os.getenv('COALESCE_REQUESTS', 'true').lower() == 'true'
+
+
+class RequestCoalescer:
+    """
+    Table of in-flight computations, one Future per key.
+
+    claim() tells the caller whether it leads a key. A leader must call
+    resolve() or fail() for every key it claimed; followers wait on the
+    returned Future and receive the leader's result or exception.
+    """
+
+    def __init__(self, enabled=COALESCE_ENABLED):
+        self.enabled = enabled
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self.leaders = 0
+        self.coalesced = 0
+
+    def claim(self, key):
+        """(future, is_leader) for a key"""
+        if not self.enabled:
+            return Future(), True
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._inflight[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key):
+        with self._lock:
+            return self._inflight.pop(key, None)
+
+    def resolve(self, key, result):
+        """Hand a leader's result to everyone waiting on the key"""
+        future = self._finish(key)
+        if future is not None:
+            future.set_result(result)
+
+    def fail(self, key, error):
+        """Pass a leader's exception on; a key already resolved is left alone"""
+        future = self._finish(key)
+        if future is not None:
+            future.set_exception(error)
+
+    def run(self, key, fn):
+        """fn() for the leader of a key, the leader's result for everyone else"""
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.fail(key, e)
+            raise
+        self.resolve(key, result)
+        return result
+
+    def get_stats(self):
+        with self._lock:
+            requests = self.leaders + self.coalesced
+            return {
+                'enabled': self.enabled,
+                'in_flight': len(self._inflight),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'coalesce_rate': round(self.coalesced / requests, 4) if requests else 0
+            }
+
+
+# Global instance
+request_coalescer = RequestCoalescer()
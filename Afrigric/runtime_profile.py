@@ -0,0 +1,84 @@
+"""
+Tuned runtime settings for this machine, written by `python autotune.py`.
+
+The profile stores environment settings (TensorFlow and OpenMP thread
+counts, runtime threads for ONNX/OpenVINO, the micro-batch size) together
+with the numbers measured for them. apply_runtime_profile() copies those
+settings into os.environ, so it has to run before inference_engine,
+preprocess_pool and TensorFlow are imported. A variable that is already
+set, in the shell or in .env, always takes precedence over the profile.
+
+    RUNTIME_PROFILE=models/runtime_profile.json   '' turns the profile off
+"""
+
+import json
+import os
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+RUNTIME_PROFILE_PATH = os.getenv('RUNTIME_PROFILE', 'models/runtime_profile.json')
+
+# Settings a profile may provide
+PROFILE_SETTINGS = (
+    'OMP_NUM_THREADS',
+    'TF_INTRA_OP_THREADS',
+    'TF_INTER_OP_THREADS',
+    'BACKEND_THREADS',
+    'INFERENCE_MAX_BATCH_SIZE'
+)
+
+
+def available_cpus():
+    """Cores this process may run on (the cgroup/affinity limit, not the host total)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def load_runtime_profile(path=RUNTIME_PROFILE_PATH):
+    """The profile dict, or None when there is none"""
+    if not path:
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Ignoring runtime profile {path}: {str(e)}")
+        return None
+
+
+def apply_runtime_profile(path=RUNTIME_PROFILE_PATH, environ=None):
+    """
+    Fill unset environment variables from the profile.
+
+    Returns {'path', 'applied', 'overridden'} or None when no profile was
+    applied. A profile tuned on a machine with a different number of cores
+    is skipped, since its thread counts would not fit this one.
+    """
+    environ = os.environ if environ is None else environ
+    profile = load_runtime_profile(path)
+    if profile is None:
+        return None
+
+    tuned_cpus = profile.get('host', {}).get('cpus')
+    if tuned_cpus != available_cpus():
+        print(f"⚠️  Runtime profile {path} was tuned for {tuned_cpus} cores, "
+              f"this machine has {available_cpus()}; run autotune.py again")
+        return None
+
+    applied, overridden = {}, []
+    for key, value in profile.get('settings', {}).items():
+        if key not in PROFILE_SETTINGS:
+            continue
+        if key in environ:
+            overridden.append(key)
+        else:
+            environ[key] = str(value)
+            applied[key] = str(value)
+    return {'path': path, 'applied': applied, 'overridden': overridden}
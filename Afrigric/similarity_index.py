@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""
+Similar confirmed cases for the disease, pest and nutrient classifiers.
+
+Each task has an index of confirmed cases under SIMILARITY_DIR/<task>/:
+
+    vectors.f16      unit-length penultimate-layer embeddings, float16, row after row
+    lists.i32        inverted list each row belongs to (-1 before `train`)
+    cases.jsonl      label, image and source of each row
+    centroids.npy    inverted-list centroids, written by `train`
+    images/<row>.jpg thumbnail shown on the results pages
+
+The vector file is memory-mapped, and adding cases only appends to these
+files, so the index is never rebuilt. Until `train` has run, queries are an
+exact chunked dot-product scan, which is fine for tens of thousands of cases.
+For large indices `train` clusters the vectors into inverted lists (IVF).
+Queries then score only the `nprobe` lists closest to the query, which keeps
+a 1M-case lookup to a few thousand rows. Cases added after training join
+their nearest existing list.
+
+Usage:
+    python similarity_index.py add --task disease --data-dir confirmed/disease/
+    python similarity_index.py train --task disease --lists 1024
+    python similarity_index.py stats
+
+`--data-dir` holds one folder per class name, e.g. confirmed/disease/Common_Rust/*.jpg.
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+
+from explanations import explanation_key, split_model
+from image_processing import MODEL_INPUT_SIZE, decode_image, image_to_array
+
+# Load environment variables
+load_dotenv()
+
+# auto: only tasks served by a Keras model; true: every task; false: none (see explanations.keras_extras_enabled)
+SIMILAR_CASES = os.getenv('SIMILAR_CASES', 'auto').lower()
+SIMILARITY_ENABLED = SIMILAR_CASES != 'false'
+SIMILARITY_DIR = os.getenv('SIMILARITY_DIR', 'models/similar_cases')
+# Finished lookups, shared by every worker like the explanation heatmaps
+SIMILAR_RESULTS_DIR = os.getenv('SIMILAR_RESULTS_DIR', 'cache/similar_cases')
+# Lookups waiting for the worker; further requests are dropped rather than queued
+SIMILAR_MAX_PENDING = int(os.getenv('SIMILAR_MAX_PENDING', '16'))
+SIMILAR_CASES_K = int(os.getenv('SIMILAR_CASES_K', '4'))
+# Inverted lists scored per query once the index is trained
+SIMILARITY_NPROBE = int(os.getenv('SIMILARITY_NPROBE', '8'))
+# Rows scored per step of an exact scan
+SCAN_CHUNK_ROWS = 65536
+THUMBNAIL_SIZE = (320, 320)
+
+
+def normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+
+def kmeans(vectors, n_clusters, iterations=10, seed=0):
+    """Spherical k-means on unit vectors; returns unit-length centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        empty = counts == 0
+        # Restart empty clusters on random vectors
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+class EmbeddingIndex:
+    """
+    Append-only float16 embedding matrix with exact or IVF top-k search.
+
+    Readers pick up rows appended by other processes on their next query;
+    writers serialise on a lock file.
+    """
+
+    def __init__(self, directory, dim=None):
+        self.directory = directory
+        self.dim = dim
+        self.vectors_path = os.path.join(directory, 'vectors.f16')
+        self.lists_path = os.path.join(directory, 'lists.i32')
+        self.cases_path = os.path.join(directory, 'cases.jsonl')
+        self.centroids_path = os.path.join(directory, 'centroids.npy')
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.images_dir = os.path.join(directory, 'images')
+
+        self._lock = threading.RLock()
+        self._vectors = None
+        self._count = 0
+        self._vectors_size = -1
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._case_offsets = np.empty(0, dtype=np.int64)
+        self._cases_read = 0
+        self._centroids = None
+        self._centroids_mtime = None
+        # Rows grouped by list: _order[_list_starts[l]:_list_starts[l + 1]]
+        self._order = np.empty(0, dtype=np.int64)
+        self._list_starts = None
+        self._sorted_count = 0
+
+        self.refresh()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def trained(self):
+        return self._centroids is not None
+
+    def _read_dim(self):
+        # Another process may have created the index after this one was opened
+        if not self.dim and os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.dim = json.load(f)['dim']
+
+    def _rows_on_disk(self):
+        try:
+            return os.path.getsize(self.vectors_path) // (self.dim * 2)
+        except OSError:
+            return 0
+
+    def refresh(self):
+        """Map rows that were appended since the last call, by this or another process"""
+        with self._lock:
+            self._read_dim()
+            try:
+                size = os.path.getsize(self.vectors_path)
+            except OSError:
+                size = 0
+            try:
+                centroids_mtime = os.path.getmtime(self.centroids_path)
+            except OSError:
+                centroids_mtime = None
+            if size == self._vectors_size and centroids_mtime == self._centroids_mtime:
+                return
+
+            if centroids_mtime != self._centroids_mtime:
+                # `train` rewrote every row's list, so read them all again
+                self._centroids = np.load(self.centroids_path) if centroids_mtime else None
+                self._centroids_mtime = centroids_mtime
+                self._assignments = np.empty(0, dtype=np.int32)
+                self._list_starts = None
+                self._sorted_count = 0
+            if not self.dim or not size:
+                return
+            self._vectors_size = size
+
+            self._assignments = np.concatenate([self._assignments, self._read_new_assignments()])
+            self._case_offsets = np.concatenate([self._case_offsets, self._read_new_case_offsets()])
+            # A writer appends cases and lists before vectors, so the vector file bounds the row count
+            count = min(size // (self.dim * 2), len(self._assignments), len(self._case_offsets))
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float16, mode='r', shape=(count, self.dim))
+            self._count = count
+
+            # Regroup rows by list once the unsorted tail is more than a tenth of the index
+            tail = count - self._sorted_count
+            if self.trained and (self._list_starts is None or tail > max(1000, self._sorted_count // 10)):
+                self._group_lists()
+
+    def _read_new_assignments(self):
+        try:
+            with open(self.lists_path, 'rb') as f:
+                f.seek(len(self._assignments) * 4)
+                data = f.read()
+        except OSError:
+            return np.empty(0, dtype=np.int32)
+        return np.frombuffer(data[:len(data) // 4 * 4], dtype=np.int32)
+
+    def _read_new_case_offsets(self):
+        offsets = []
+        try:
+            with open(self.cases_path, 'rb') as f:
+                f.seek(self._cases_read)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # Still being written
+                        break
+                    offsets.append(self._cases_read)
+                    self._cases_read += len(line)
+        except OSError:
+            pass
+        return np.asarray(offsets, dtype=np.int64)
+
+    def _group_lists(self):
+        assignments = self._assignments[:self._count]
+        self._order = np.argsort(assignments, kind='stable')
+        self._list_starts = np.searchsorted(assignments[self._order], np.arange(len(self._centroids) + 1))
+        self._sorted_count = len(assignments)
+
+    def _assign(self, vectors):
+        if self._centroids is None:
+            return np.full(len(vectors), -1, dtype=np.int32)
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def add(self, vectors, cases):
+        """Append embeddings with one metadata dict per row; returns the new row ids"""
+        vectors = normalize(vectors)
+        if len(vectors) != len(cases):
+            raise ValueError('Need one case per vector')
+
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(os.path.join(self.directory, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.refresh()
+            if not self.dim:
+                self.dim = vectors.shape[1]
+                with open(self.manifest_path, 'w') as f:
+                    json.dump({'dim': self.dim, 'created_at': time.time()}, f)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f'Index holds {self.dim}-d vectors, got {vectors.shape[1]}-d')
+
+            # Count from the file rather than self._count, which trails any rows not fully written yet
+            first_row = self._rows_on_disk()
+            with open(self.cases_path, 'ab') as f:
+                for case in cases:
+                    f.write((json.dumps(case) + '\n').encode())
+            with open(self.lists_path, 'ab') as f:
+                f.write(self._assign(vectors).tobytes())
+            with open(self.vectors_path, 'ab') as f:
+                f.write(vectors.astype(np.float16).tobytes())
+            self.refresh()
+        return list(range(first_row, first_row + len(vectors)))
+
+    def train(self, n_lists=1024, sample_size=100000, iterations=10):
+        """Cluster the vectors into inverted lists and assign every row to one"""
+        with self._lock, open(os.path.join(self.directory, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.refresh()
+            n_lists = min(n_lists, self._count)
+            if n_lists < 1:
+                raise ValueError('The index is empty')
+
+            rng = np.random.default_rng(0)
+            sample = rng.choice(self._count, min(sample_size, self._count), replace=False)
+            centroids = kmeans(self._vectors[np.sort(sample)].astype(np.float32), n_lists, iterations)
+
+            self._centroids = centroids
+            assignments = np.concatenate([
+                self._assign(self._vectors[start:start + SCAN_CHUNK_ROWS].astype(np.float32))
+                for start in range(0, self._count, SCAN_CHUNK_ROWS)
+            ])
+            assignments.tofile(self.lists_path)
+            np.save(self.centroids_path, centroids)
+            self.refresh()
+
+    def search(self, query, k=SIMILAR_CASES_K, nprobe=SIMILARITY_NPROBE):
+        """[(row, cosine similarity)] of the k nearest rows, best first"""
+        self.refresh()
+        with self._lock:
+            vectors, count, centroids = self._vectors, self._count, self._centroids
+            order, starts, sorted_count = self._order, self._list_starts, self._sorted_count
+        if not count:
+            return []
+        query = normalize(query)[0]
+
+        if centroids is None:
+            scores = np.concatenate([
+                vectors[start:start + SCAN_CHUNK_ROWS].astype(np.float32) @ query
+                for start in range(0, count, SCAN_CHUNK_ROWS)
+            ])
+            best = top_k(scores, k)
+            return [(int(row), float(scores[row])) for row in best]
+
+        probe = top_k(centroids @ query, nprobe)
+        candidates = [order[starts[l]:starts[l + 1]] for l in probe]
+        # Rows appended since the lists were last grouped are scanned exactly
+        candidates.append(np.arange(sorted_count, count))
+        rows = np.sort(np.concatenate(candidates))
+        scores = vectors[rows].astype(np.float32) @ query
+        best = top_k(scores, k)
+        return [(int(rows[index]), float(scores[index])) for index in best]
+
+    def case(self, row):
+        with open(self.cases_path, 'rb') as f:
+            f.seek(int(self._case_offsets[row]))
+            return json.loads(f.readline())
+
+    def image_path(self, row):
+        return os.path.join(self.images_dir, f'{row}.jpg')
+
+    def stats(self):
+        return {
+            'cases': self._count,
+            'dim': self.dim,
+            'trained': self.trained,
+            'lists': 0 if self._centroids is None else len(self._centroids)
+        }
+
+
+class Embedder:
+    """
+    Penultimate-layer embeddings of a classifier: backbone plus every head
+    layer except the final softmax, traced once into a tf.function.
+    """
+
+    def __init__(self, model):
+        import tensorflow as tf
+
+        self.model = model
+        self.before, self.backbone, after = split_model(model)
+        self.after = after[:-1]
+
+        self.input_size = tuple(dim or size for dim, size in zip(model.input_shape[1:3], MODEL_INPUT_SIZE))
+        self.dtype = np.uint8 if model.inputs[0].dtype == tf.uint8 else np.float32
+        signature = [tf.TensorSpec((None,) + self.input_size + (3,), tf.as_dtype(self.dtype))]
+        self._embed = tf.function(self._compute, input_signature=signature)
+
+    def _compute(self, batch):
+        x = batch
+        for layer in self.before:
+            x = layer(x)
+        x = self.backbone(x, training=False)
+        for layer in self.after:
+            x = layer(x, training=False)
+        return x
+
+    def embed(self, imgs):
+        """(n, dim) float32 embeddings of decoded images"""
+        batch = np.concatenate([image_to_array(img, target_size=self.input_size, dtype=self.dtype) for img in imgs])
+        return self._embed(batch).numpy()
+
+
+class SimilarityService:
+    """
+    Embeds photos with each task's Keras classifier and looks them up in its case index.
+
+    Lookups for the results pages run on a single background thread, like
+    the explanation heatmaps: submit() queues one and the page polls for the
+    stored JSON, so a request never loads a model or embeds a photo.
+    start() opens the indexes on that thread too, since mapping a large
+    vector file takes a noticeable part of a second.
+    """
+
+    def __init__(self, directory=SIMILARITY_DIR, enabled=SIMILARITY_ENABLED, results_dir=SIMILAR_RESULTS_DIR,
+                 max_pending=SIMILAR_MAX_PENDING):
+        self.directory = directory
+        self.enabled = enabled
+        self.results_dir = results_dir
+        self.max_pending = max_pending
+        self._models = {}
+        self._embedders = {}
+        self._indexes = {}
+        self._pending = OrderedDict()
+        self._executor = None
+        self._lock = threading.Lock()
+
+        self.looked_up = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def register(self, name, keras_model):
+        """keras_model() returns the Keras classifier to take a task's embeddings from"""
+        self._models[name] = keras_model
+
+    def start(self):
+        """Open the registered tasks' indexes on the background thread"""
+        if self.enabled:
+            for name in self._models:
+                self._get_executor().submit(self.index, name)
+
+    def index(self, name):
+        """A task's index, opened on first use; keep that first call off the request path"""
+        with self._lock:
+            index = self._indexes.get(name)
+        if index is None:
+            # Opened without holding _lock, so submit() and is_pending() never wait for it
+            index = EmbeddingIndex(os.path.join(self.directory, name))
+            with self._lock:
+                index = self._indexes.setdefault(name, index)
+        return index
+
+    def images_dir(self, name):
+        return os.path.join(self.directory, name, 'images')
+
+    def case_count(self, name):
+        """Cases in a task's index, including rows other processes added; 0 until the index is open"""
+        with self._lock:
+            index = self._indexes.get(name)
+        if index is None:
+            return 0
+        # Only a stat of the vector file unless rows were added
+        index.refresh()
+        return len(index)
+
+    def _get_executor(self):
+        # Created on first use so forked workers get their own thread
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='similar-cases')
+        return self._executor
+
+    def lookup_key(self, name, model_version, data):
+        """Key of the lookup for an uploaded file; changes with the model version and as cases are added"""
+        return explanation_key(name, f'{model_version}:{self.case_count(name)}', data)
+
+    def result_path(self, key):
+        return os.path.join(self.results_dir, f'{key}.json')
+
+    def get(self, key):
+        """{'task', 'cases'} of a finished lookup, or None"""
+        try:
+            with open(self.result_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_pending(self, key):
+        with self._lock:
+            return key in self._pending
+
+    def submit(self, name, key, data):
+        """Queue the lookup for an uploaded file; returns False when there is nothing to look up"""
+        if not self.enabled or name not in self._models or not self.case_count(name):
+            return False
+        if os.path.exists(self.result_path(key)):
+            return True
+        with self._lock:
+            if key in self._pending:
+                return True
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending[key] = name
+            self._get_executor().submit(self._lookup, name, key, data)
+        return True
+
+    def _lookup(self, name, key, data):
+        try:
+            cases = self.similar(name, decode_image(data))
+            os.makedirs(self.results_dir, exist_ok=True)
+            # Write then rename, so other workers never read a partial file
+            temp_path = f'{self.result_path(key)}.{os.getpid()}.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump({'task': name, 'cases': cases}, f)
+            os.replace(temp_path, self.result_path(key))
+            self.looked_up += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"⚠️  Failed to look up similar {name} cases: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def embed(self, name, imgs):
+        model = self._models[name]()
+        with self._lock:
+            embedder = self._embedders.get(name)
+            if embedder is None or embedder.model is not model:
+                embedder = self._embedders[name] = Embedder(model)
+        return embedder.embed(imgs)
+
+    def similar(self, name, img, k=SIMILAR_CASES_K):
+        """The k confirmed cases closest to a photo, best first; embeds, so keep it off the request path"""
+        index = self.index(name)
+        if not self.enabled or not len(index):
+            return []
+        matches = index.search(self.embed(name, [img])[0], k)
+        return [dict(index.case(row), row=row, similarity=round(score, 4)) for row, score in matches]
+
+    def confirm(self, name, imgs, labels, source):
+        """Add confirmed photos to a task's index and keep a thumbnail of each; returns their rows"""
+        index = self.index(name)
+        vectors = self.embed(name, imgs)
+        cases = [{'label': label, 'source': source, 'added_at': time.time()} for label in labels]
+        rows = index.add(vectors, cases)
+
+        os.makedirs(index.images_dir, exist_ok=True)
+        for row, img in zip(rows, imgs):
+            thumbnail = img.copy()
+            thumbnail.thumbnail(THUMBNAIL_SIZE)
+            thumbnail.save(index.image_path(row), format='JPEG', quality=85)
+        return rows
+
+    def get_stats(self):
+        with self._lock:
+            pending = len(self._pending)
+            indexes = dict(self._indexes)
+        return {
+            'enabled': self.enabled,
+            'pending': pending,
+            'looked_up': self.looked_up,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'indexes': {name: index.stats() for name, index in indexes.items()}
+        }
+
+
+similarity_service = SimilarityService()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the similar-cases indexes')
+    parser.add_argument('--root', default=SIMILARITY_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help='Add confirmed photos, one folder per class')
+    add_parser.add_argument('--task', required=True, choices=('disease', 'pest', 'nutrient'))
+    add_parser.add_argument('--data-dir', required=True)
+    add_parser.add_argument('--model', help='Keras classifier (default: models/<task>_model.keras)')
+    add_parser.add_argument('--batch-size', type=int, default=64)
+
+    train_parser = subparsers.add_parser('train', help='Cluster an index into inverted lists for fast search')
+    train_parser.add_argument('--task', required=True, choices=('disease', 'pest', 'nutrient'))
+    train_parser.add_argument('--lists', type=int, default=1024)
+
+    subparsers.add_parser('stats', help='Show the size of every index')
+
+    args = parser.parse_args()
+    service = SimilarityService(args.root, enabled=True)
+
+    if args.command == 'add':
+        import tensorflow as tf
+        from batch_diagnosis import is_image_name
+
+        model = tf.keras.models.load_model(args.model or f'models/{args.task}_model.keras')
+        service.register(args.task, lambda: model)
+        photos = []
+        for label in sorted(os.listdir(args.data_dir)):
+            folder = os.path.join(args.data_dir, label)
+            if os.path.isdir(folder):
+                photos.extend((label, os.path.join(folder, filename))
+                              for filename in sorted(os.listdir(folder)) if is_image_name(filename))
+        for start in range(0, len(photos), args.batch_size):
+            chunk = photos[start:start + args.batch_size]
+            service.confirm(args.task, [decode_image(path) for _, path in chunk],
+                            [label for label, _ in chunk], source='import')
+            print(f"   {min(start + args.batch_size, len(photos))}/{len(photos)} photos added")
+        print(f"✅ {args.task} index: {service.index(args.task).stats()}")
+    elif args.command == 'train':
+        index = service.index(args.task)
+        index.train(args.lists)
+        print(f"✅ {args.task} index: {index.stats()}")
+    else:
+        for task in ('disease', 'pest', 'nutrient'):
+            print(f"{task}: {service.index(task).stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -100,4 +100,71 @@ document.addEventListener('DOMContentLoaded', function() {
     // Initialize all forms on page
     const forms = document.querySelectorAll('form[id^="uploadForm"]');
     forms.forEach(form => initFileUploadForm(form));
+
+    // Results pages: fetch the Grad-CAM heatmap once the server has rendered it
+    const explanation = document.getElementById('explanation');
+    if (explanation) {
+        const status = explanation.querySelector('.explanation-status');
+        const image = explanation.querySelector('img');
+        const caption = explanation.querySelector('.explanation-caption');
+        let attempts = 0;
+
+        const poll = function() {
+            fetch(explanation.dataset.url).then(function(response) {
+                // 202: still rendering; 404: possibly rendering in another server process
+                if ((response.status === 202 || response.status === 404) && ++attempts < 30) {
+                    setTimeout(poll, 1000);
+                    return;
+                }
+                if (!response.ok) throw new Error('Explanation unavailable');
+                return response.blob().then(function(blob) {
+                    image.src = URL.createObjectURL(blob);
+                    image.classList.remove('d-none');
+                    caption.classList.remove('d-none');
+                    status.classList.add('d-none');
+                });
+            }).catch(function() {
+                explanation.classList.add('d-none');
+            });
+        };
+        poll();
+    }
+
+    // Results pages: show the confirmed cases that look most like this photo
+    const similarCases = document.getElementById('similar-cases');
+    if (similarCases) {
+        let similarAttempts = 0;
+
+        const pollSimilar = function() {
+            fetch(similarCases.dataset.url).then(function(response) {
+                // 202: still being looked up; 404: possibly looked up in another server process
+                if ((response.status === 202 || response.status === 404) && ++similarAttempts < 30) {
+                    setTimeout(pollSimilar, 1000);
+                    return;
+                }
+                return response.json().then(showSimilarCases);
+            }).catch(function() {});
+        };
+
+        const showSimilarCases = function(data) {
+            if (!data.success || !data.cases || !data.cases.length) return;
+            const list = similarCases.querySelector('.similar-cases-list');
+            data.cases.forEach(function(item) {
+                const column = document.createElement('div');
+                column.className = 'col-6 col-md-3 mb-3 text-center';
+                const image = document.createElement('img');
+                image.src = item.image_url;
+                image.alt = item.label;
+                image.className = 'img-fluid rounded shadow-sm';
+                const label = document.createElement('p');
+                label.className = 'small mt-2 mb-0';
+                label.textContent = item.label + ' (' + Math.round(item.similarity * 100) + '%)';
+                column.appendChild(image);
+                column.appendChild(label);
+                list.appendChild(column);
+            });
+            similarCases.classList.remove('d-none');
+        };
+        pollSimilar();
+    }
 });
\ No newline at end of file
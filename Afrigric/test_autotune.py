@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Tests for the runtime autotuner and the profile applied at startup"""
+
+import json
+import os
+import tempfile
+
+from autotune import build_profile, candidate_env, combine, pick_batch_size, select, thread_candidates
+from runtime_profile import apply_runtime_profile, available_cpus
+
+
+class _Args:
+    objective = 'latency'
+    latency_budget_ms = None
+
+
+def _result(intra_op, inter_op, latency, throughput):
+    model = {
+        'latency_ms': {'p50': latency, 'p95': latency * 1.2},
+        'batch_ms': {size: latency * int(size) / 2 for size in throughput},
+        'throughput_ips': throughput,
+        'backend': 'keras'
+    }
+    result = {'intra_op': intra_op, 'inter_op': inter_op, 'tensorflow': '2.x', 'models': {'disease': model}}
+    result.update(combine({'disease': model}, [int(size) for size in throughput]))
+    return result
+
+
+def test_thread_grid_stays_within_the_machine():
+    assert thread_candidates(1) == [(1, 1)]
+    grid = thread_candidates(8)
+    assert (8, 2) in grid and (2, 1) in grid
+    assert all(1 <= intra <= 8 and inter <= 2 for intra, inter in grid)
+
+
+def test_combine_adds_latency_and_chains_throughput():
+    model = {'latency_ms': {'p50': 10.0, 'p95': 12.0}, 'batch_ms': {'1': 10.0}, 'throughput_ips': {'1': 100.0}}
+    summary = combine({'disease': model, 'pest': model}, [1])
+    assert summary['latency_ms'] == {'p50': 20.0, 'p95': 24.0}
+    assert summary['throughput_ips']['1'] == 50.0
+
+
+def test_smallest_batch_near_the_best_throughput_is_picked():
+    result = {'throughput_ips': {'1': 50.0, '8': 95.0, '32': 100.0}, 'batch_ms': {'1': 20, '8': 84, '32': 320}}
+    assert pick_batch_size(result) == 8
+    assert pick_batch_size(result, latency_budget_ms=50) == 1
+
+
+def test_selection_follows_the_objective():
+    fast = _result(2, 1, latency=20.0, throughput={'1': 50.0, '8': 60.0})
+    wide = _result(8, 2, latency=30.0, throughput={'1': 33.0, '8': 150.0})
+    failed = {'intra_op': 4, 'inter_op': 1, 'error': 'boom'}
+
+    assert select([fast, wide, failed], 'latency') is fast
+    assert select([fast, wide, failed], 'throughput') is wide
+    assert select([failed], 'latency') is None
+
+
+def test_profile_settings_round_trip_through_the_environment():
+    baseline = _result(0, 0, latency=40.0, throughput={'1': 25.0, '8': 40.0})
+    best = _result(4, 1, latency=20.0, throughput={'1': 50.0, '8': 90.0})
+    select([baseline, best], 'latency')
+    profile = build_profile(best, baseline, [baseline, best], _Args())
+
+    assert profile['settings'] == dict(
+        {key: value for key, value in candidate_env(4, 1).items()}, INFERENCE_MAX_BATCH_SIZE='8')
+    assert profile['baseline']['latency_ms']['p50'] == 40.0
+    assert profile['selected']['batch_size'] == 8
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'runtime_profile.json')
+        with open(path, 'w') as f:
+            json.dump(profile, f)
+
+        environ = {'TF_INTER_OP_THREADS': '3'}
+        applied = apply_runtime_profile(path, environ)
+        assert environ['OMP_NUM_THREADS'] == '4'
+        assert environ['INFERENCE_MAX_BATCH_SIZE'] == '8'
+        # An explicit setting wins over the profile
+        assert environ['TF_INTER_OP_THREADS'] == '3'
+        assert applied['overridden'] == ['TF_INTER_OP_THREADS']
+
+
+def test_profile_from_another_machine_or_missing_file_is_skipped():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'runtime_profile.json')
+        with open(path, 'w') as f:
+            json.dump({'host': {'cpus': available_cpus() + 1}, 'settings': {'OMP_NUM_THREADS': '2'}}, f)
+
+        environ = {}
+        assert apply_runtime_profile(path, environ) is None
+        assert environ == {}
+        assert apply_runtime_profile(os.path.join(tmp, 'missing.json'), environ) is None
+
+
+if __name__ == "__main__":
+    test_thread_grid_stays_within_the_machine()
+    test_combine_adds_latency_and_chains_throughput()
+    test_smallest_batch_near_the_best_throughput_is_picked()
+    test_selection_follows_the_objective()
+    test_profile_settings_round_trip_through_the_environment()
+    test_profile_from_another_machine_or_missing_file_is_skipped()
+    print("Autotune tests passed!")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Tests for collecting and decoding field survey uploads"""
+
+import io
+import zipfile
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from batch_diagnosis import collect_survey_images, decode_images
+
+
+def _jpeg():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), (30, 150, 40)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def _upload(filename, data):
+    return FileStorage(stream=io.BytesIO(data), filename=filename)
+
+
+def _archive(names, data):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name in names:
+            archive.writestr(name, data)
+    return _upload('survey.zip', buffer.getvalue())
+
+
+def test_oversized_surveys_are_refused_before_reading():
+    files = [_upload(f'leaf{index}.jpg', _jpeg()) for index in range(4)]
+    try:
+        collect_survey_images(files, max_images=3)
+        assert False, 'expected a survey with too many photos to be refused'
+    except ValueError:
+        pass
+    assert all(file.stream.tell() == 0 for file in files)
+
+    # Photos and archive members share the one limit
+    try:
+        collect_survey_images(files[:2], [_archive(['a.jpg', 'b.jpg'], _jpeg())], max_images=3)
+        assert False, 'expected archive images to count towards the limit'
+    except ValueError:
+        pass
+
+    assert len(collect_survey_images(files[:1], [_archive(['a.jpg', 'b.jpg'], _jpeg())], max_images=3)) == 3
+
+
+def test_mixed_uploads_keep_valid_photos_and_report_broken_ones():
+    files = [
+        _upload('leaf.jpg', _jpeg()),
+        _upload('notes.txt', b'not a photo'),
+        _upload('broken.png', b'not a png either'),
+        _upload('', b'')
+    ]
+    archive = _archive(['field/a.jpg', 'field/.hidden.jpg', 'field/readme.md'], _jpeg())
+
+    images = collect_survey_images(files, [archive], max_images=3)
+    assert [name for name, _ in images] == ['leaf.jpg', 'broken.png', 'field/a.jpg']
+
+    decoded = decode_images(images)
+    assert [name for name, _, _ in decoded] == ['leaf.jpg', 'broken.png', 'field/a.jpg']
+    assert decoded[0][1] is not None and decoded[2][1] is not None
+    assert decoded[1][1] is None and decoded[1][2]
+
+
+if __name__ == "__main__":
+    test_oversized_surveys_are_refused_before_reading()
+    test_mixed_uploads_keep_valid_photos_and_report_broken_ones()
+    print("Batch diagnosis tests passed!")
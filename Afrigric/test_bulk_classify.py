@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Tests for the offline bulk classification CLI"""
+
+import csv
+import os
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from bulk_classify import Checkpoint, CsvResultWriter, TaskModel, classify_directory, resolve_model, result_columns
+from class_mappings import CLASS_MAPPINGS
+from model_registry import ModelRegistry
+
+
+class _GreenModel:
+    """Class 3 (Healthy) for green photos, class 0 (Blight) otherwise"""
+
+    def predict(self, batch, verbose=0):
+        green = batch[:, :, :, 1].mean(axis=(1, 2)) > 0.5
+        probabilities = np.full((len(batch), 4), 0.1, dtype=np.float32)
+        probabilities[green, 3] = 0.7
+        probabilities[~green, 0] = 0.7
+        return probabilities
+
+
+def _make_folder(root):
+    os.makedirs(os.path.join(root, 'field_b'))
+    Image.new('RGB', (64, 48), (20, 200, 20)).save(os.path.join(root, 'leaf1.jpg'))
+    Image.new('RGB', (64, 48), (150, 80, 30)).save(os.path.join(root, 'field_b', 'leaf2.png'))
+    with open(os.path.join(root, 'field_b', 'broken.jpg'), 'wb') as f:
+        f.write(b'not an image')
+    with open(os.path.join(root, 'notes.txt'), 'w') as f:
+        f.write('ignored')
+
+
+def _read(path):
+    with open(path, newline='') as f:
+        return {row['path']: row for row in csv.DictReader(f)}
+
+
+def test_classifies_and_resumes():
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as out:
+        _make_folder(root)
+        output = os.path.join(out, 'results.csv')
+        checkpoint = Checkpoint(output + '.checkpoint')
+        models = {'disease': TaskModel(_GreenModel(), CLASS_MAPPINGS['disease'])}
+
+        writer = CsvResultWriter(output, result_columns(['disease']), append=True)
+        summary = classify_directory(root, models, writer, checkpoint, batch_size=2)
+        writer.close()
+
+        assert summary['processed'] == 3
+        assert summary['errors'] == 1
+        rows = _read(output)
+        assert rows['leaf1.jpg']['disease'] == 'Healthy'
+        assert rows[os.path.join('field_b', 'leaf2.png')]['disease'] == 'Blight'
+        assert rows[os.path.join('field_b', 'broken.jpg')]['error']
+
+        # A second run finds nothing new and leaves the output as it was
+        writer = CsvResultWriter(output, result_columns(['disease']), append=True)
+        summary = classify_directory(root, models, writer, checkpoint, batch_size=2)
+        writer.close()
+        assert summary == dict(summary, skipped=3, processed=0)
+        assert len(_read(output)) == 3
+
+
+def test_models_come_from_the_active_registry_version():
+    with tempfile.TemporaryDirectory() as root:
+        registry = ModelRegistry(root)
+        path, classes, input_dtype = resolve_model('disease', registry)
+        assert classes == CLASS_MAPPINGS['disease'] and input_dtype == 'float32'
+
+        model_file = os.path.join(root, 'student.tflite')
+        with open(model_file, 'wb') as f:
+            f.write(b'weights')
+        registry.publish('disease', model_file, ['Healthy', 'Blight'], version='v2', input_dtype='uint8')
+        registry.activate('disease', 'v2')
+        path, classes, input_dtype = resolve_model('disease', registry)
+        assert path == registry.model_path('disease', 'v2')
+        assert classes == {0: 'Healthy', 1: 'Blight'} and input_dtype == 'uint8'
+
+        # A corrupted version is skipped, as the server does
+        with open(path, 'ab') as f:
+            f.write(b'tampered')
+        assert resolve_model('disease', registry)[1] == CLASS_MAPPINGS['disease']
+
+
+if __name__ == "__main__":
+    test_classifies_and_resumes()
+    test_models_come_from_the_active_registry_version()
+    print("Bulk classification tests passed!")
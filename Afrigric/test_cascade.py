@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Tests for the small/full model cascade"""
+
+import io
+import logging
+
+import numpy as np
+
+from cascade import CascadeStats, configure_logging, logger, run_cascade, sweep_thresholds
+
+
+def test_only_uncertain_images_reach_the_full_model():
+    small_outputs = np.array([[0.95, 0.05], [0.55, 0.45], [0.2, 0.8]], dtype=np.float32)
+    seen_by_full = []
+
+    def full_predict(batch):
+        seen_by_full.append(len(batch))
+        return np.array([[0.1, 0.9]] * len(batch), dtype=np.float32)
+
+    stats = CascadeStats()
+    batch = np.zeros((3, 4, 4, 3), dtype=np.float32)
+    probabilities, escalated = run_cascade('disease', batch, lambda b: small_outputs, full_predict,
+                                           threshold=0.9, stats=stats)
+
+    assert escalated.tolist() == [False, True, True]
+    assert seen_by_full == [2]
+    np.testing.assert_allclose(probabilities[0], [0.95, 0.05])
+    np.testing.assert_allclose(probabilities[1], [0.1, 0.9])
+    assert stats.get_stats()['disease'] == {'images': 3, 'escalated': 2, 'fallback': 0, 'escalation_rate': 0.6667}
+
+
+def test_threshold_sweep_trades_escalation_for_accuracy():
+    labels = np.array([0, 1, 1, 0])
+    small = np.array([[0.99, 0.01], [0.6, 0.4], [0.3, 0.7], [0.97, 0.03]])
+    full = np.array([[0.9, 0.1], [0.2, 0.8], [0.1, 0.9], [0.8, 0.2]])
+
+    report = sweep_thresholds(labels, small, full, [0.5, 0.9], small_ms=2.0, full_ms=10.0)
+
+    assert report['small_accuracy'] == 0.75
+    assert report['full_accuracy'] == 1.0
+    low, high = report['thresholds']
+    assert low['escalation_rate'] == 0.0 and low['accuracy'] == 0.75
+    assert high['escalation_rate'] == 0.5 and high['accuracy'] == 1.0
+    assert high['expected_latency_ms'] == 7.0
+
+
+def test_configured_logger_shows_each_decision():
+    configure_logging('DEBUG')
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    logger.addHandler(handler)
+    try:
+        run_cascade('disease', np.zeros((2, 1)), lambda batch: np.array([[0.95, 0.05], [0.6, 0.4]]),
+                    lambda batch: np.array([[0.1, 0.9]]), 0.9)
+    finally:
+        logger.removeHandler(handler)
+    lines = stream.getvalue().splitlines()
+    assert lines == ['disease: small model (0.95)', 'disease: escalated to full model (0.60 < 0.90)']
+
+
+if __name__ == "__main__":
+    test_only_uncertain_images_reach_the_full_model()
+    test_threshold_sweep_trades_escalation_for_accuracy()
+    test_configured_logger_shows_each_decision()
+    print("Cascade tests passed!")
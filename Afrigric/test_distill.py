@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Tests for the distillation pipeline's data split, targets and channel pruning"""
+
+import tempfile
+
+import numpy as np
+
+from class_mappings import CLASS_MAPPINGS
+from distill import (channel_scores, full_install_blockers, kept_channels, registry_classes, slice_block,
+                     split_indices, teacher_targets)
+from model_registry import ModelRegistry
+
+
+def _batch_norm(x, gamma, beta, mean, variance, epsilon=1e-3):
+    return gamma * (x - mean) / np.sqrt(variance + epsilon) + beta
+
+
+def _block(x, weights):
+    """A MobileNetV2 inverted-residual block on 1x1 feature maps (only the depthwise centre tap applies)"""
+    relu6 = lambda values: np.clip(values, 0, 6)
+    x = relu6(_batch_norm(x @ weights['expand'][0][0, 0], *weights['expand_BN']))
+    x = relu6(_batch_norm(x * weights['depthwise'][0][1, 1, :, 0], *weights['depthwise_BN']))
+    return x @ weights['project'][0][0, 0]
+
+
+def test_split_holds_out_the_same_share_of_every_class():
+    labels = np.array([0] * 50 + [1] * 20 + [2])
+    train, heldout = split_indices(labels, 0.1, seed=42)
+
+    assert np.bincount(labels[heldout]).tolist() == [5, 2]
+    assert len(set(train) | set(heldout)) == len(labels) and not set(train) & set(heldout)
+    assert np.array_equal(heldout, split_indices(labels, 0.1, seed=42)[1])
+
+
+def test_teacher_targets_pack_labels_and_log_probabilities():
+    targets = teacher_targets(np.array([[0.9, 0.1, 0.0]]), np.array([1]), 3)
+    assert targets.shape == (1, 6)
+    assert targets[0, :3].tolist() == [0, 1, 0]
+    assert np.isclose(targets[0, 3], np.log(0.9)) and np.isfinite(targets[0, 5])
+
+
+def test_kept_channels_round_to_the_channel_multiple():
+    scores = np.arange(96, dtype=np.float32)
+    keep = kept_channels(scores, 0.3)
+    assert len(keep) == 72
+    assert keep.tolist() == sorted(keep.tolist()) and keep.min() == 24
+    assert len(kept_channels(scores[:8], 0.9)) == 8
+
+
+def test_removing_dead_channels_keeps_the_block_output():
+    rng = np.random.default_rng(3)
+    inputs, expanded, outputs = 16, 48, 16
+    weights = {
+        'expand': [rng.normal(size=(1, 1, inputs, expanded))],
+        'expand_BN': [rng.uniform(0.5, 1.5, expanded), rng.normal(size=expanded),
+                      rng.normal(size=expanded), rng.uniform(0.5, 2, expanded)],
+        'depthwise': [rng.normal(size=(3, 3, expanded, 1))],
+        'depthwise_BN': [rng.uniform(0.5, 1.5, expanded), rng.normal(size=expanded),
+                         rng.normal(size=expanded), rng.uniform(0.5, 2, expanded)],
+        'project': [rng.normal(size=(1, 1, expanded, outputs))]
+    }
+    # A third of the channels never fire: zero after the expansion and after the depthwise stage
+    dead = rng.choice(expanded, 16, replace=False)
+    weights['expand_BN'][0][dead] = 0
+    weights['expand_BN'][1][dead] = 0
+    weights['depthwise_BN'][1][dead] = 0
+    weights['depthwise_BN'][2][dead] = 0
+
+    gamma, _, _, variance = weights['expand_BN']
+    keep = kept_channels(channel_scores(weights['expand'][0], gamma, variance), 1 / 3)
+    assert not set(keep) & set(dead)
+
+    pruned = slice_block(weights, keep)
+    assert pruned['expand'][0].shape == (1, 1, inputs, 32)
+    assert pruned['depthwise'][0].shape == (3, 3, 32, 1)
+    assert pruned['project'][0].shape == (1, 1, 32, outputs)
+
+    x = rng.normal(size=(4, inputs))
+    assert np.allclose(_block(x, weights), _block(x, pruned))
+
+
+def test_full_install_is_refused_when_the_keras_file_is_not_served():
+    assert full_install_blockers(['disease'], {}) == []
+    blockers = full_install_blockers(['disease'], {'SHARED_BACKBONE': 'true', 'MODEL_INPUT_DTYPE': 'uint8'})
+    assert len(blockers) == 2
+
+
+def test_published_students_keep_the_served_class_names():
+    with tempfile.TemporaryDirectory() as root:
+        registry = ModelRegistry(root)
+        pest_classes = registry_classes('pest', registry, len(CLASS_MAPPINGS['pest']))
+        assert pest_classes == [CLASS_MAPPINGS['pest'][index] for index in range(len(pest_classes))]
+
+        try:
+            registry_classes('pest', registry, len(CLASS_MAPPINGS['pest']) + 1)
+            assert False, 'expected a class count mismatch to stop the install'
+        except SystemExit:
+            pass
+
+
+if __name__ == "__main__":
+    test_split_holds_out_the_same_share_of_every_class()
+    test_teacher_targets_pack_labels_and_log_probabilities()
+    test_kept_channels_round_to_the_channel_multiple()
+    test_removing_dead_channels_keeps_the_block_output()
+    test_full_install_is_refused_when_the_keras_file_is_not_served()
+    test_published_students_keep_the_served_class_names()
+    print("Distillation tests passed!")
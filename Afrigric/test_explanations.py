@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Tests for the Grad-CAM explanation store (no TensorFlow needed)"""
+
+import io
+import os
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from explanations import ExplanationService, colorize, explanation_key, keras_extras_enabled, overlay_heatmap
+
+
+def test_key_depends_on_task_version_and_contents():
+    key = explanation_key('disease', 'abc123', b'photo')
+
+    assert key == explanation_key('disease', 'abc123', b'photo')
+    assert key != explanation_key('pest', 'abc123', b'photo')
+    assert key != explanation_key('disease', 'def456', b'photo')
+    assert key != explanation_key('disease', 'abc123', b'other photo')
+    assert len(key) == 40
+
+
+def test_overlay_keeps_aspect_ratio():
+    img = Image.new('RGB', (900, 600), (40, 160, 40))
+    heatmap = np.linspace(0, 1, 49, dtype=np.float32).reshape(7, 7)
+
+    overlay = Image.open(io.BytesIO(overlay_heatmap(img, heatmap, max_side=448)))
+    assert overlay.format == 'PNG'
+    assert overlay.size == (448, 299)
+    assert colorize(np.array([0.0, 1.0])).dtype == np.uint8
+
+
+def test_submit_skips_stored_and_unknown_tasks():
+    with tempfile.TemporaryDirectory() as directory:
+        service = ExplanationService(directory=directory, max_pending=4, enabled=True)
+        service.register('disease', lambda: None, 'missing.keras')
+
+        with open(service.path('stored'), 'wb') as f:
+            f.write(b'png')
+
+        assert service.submit('disease', 'stored', b'photo', 0)
+        assert service.get('stored') == b'png'
+        assert not service.is_pending('stored')
+        assert not service.submit('pest', 'key', b'photo', 0)
+        assert service.get('missing') is None
+        assert not os.path.exists(service.path('missing'))
+
+
+def test_disabled_service_accepts_nothing():
+    service = ExplanationService(enabled=False)
+    service.register('disease', lambda: None, 'missing.keras')
+    assert not service.submit('disease', 'key', b'photo', 0)
+
+
+def test_other_runtimes_are_only_explained_when_opted_in():
+    assert keras_extras_enabled('auto', served_by_keras=True)
+    assert not keras_extras_enabled('auto', served_by_keras=False)
+    assert keras_extras_enabled('true', served_by_keras=False)
+    assert not keras_extras_enabled('false', served_by_keras=True)
+
+    # A task registered only as a Keras model source is never explained
+    service = ExplanationService(enabled=True)
+    service.register('pest', lambda: None, 'missing.keras', explain=False)
+    assert not service.submit('pest', 'key', b'photo', 0)
+
+
+if __name__ == "__main__":
+    test_key_depends_on_task_version_and_contents()
+    test_overlay_keeps_aspect_ratio()
+    test_submit_skips_stored_and_unknown_tasks()
+    test_disabled_service_accepts_nothing()
+    test_other_runtimes_are_only_explained_when_opted_in()
+    print("Explanation tests passed!")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Tests for upload decoding and preprocessing"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+from image_processing import decode_image, preprocess_image
+
+
+def _jpeg(width, height, exif=None):
+    buffer = io.BytesIO()
+    img = Image.new('RGB', (width, height), (40, 160, 60))
+    if exif is not None:
+        img.save(buffer, 'JPEG', exif=exif)
+    else:
+        img.save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def test_fast_decode_reduces_large_jpegs():
+    data = _jpeg(4000, 3000)
+
+    full = decode_image(data, fast=False)
+    fast = decode_image(data, fast=True)
+
+    assert full.size == (4000, 3000)
+    # Draft mode decodes at a DCT scale that still covers twice the model input
+    assert 448 <= fast.size[0] < 4000
+    assert fast.size[1] >= 448
+
+
+def test_fast_decode_applies_exif_orientation():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 degrees
+    data = _jpeg(800, 600, exif=exif.tobytes())
+
+    assert decode_image(data, fast=True).size == (600, 800)
+    assert decode_image(data, fast=False).size == (800, 600)
+
+
+def test_preprocess_image_shape_and_range():
+    batch = preprocess_image(_jpeg(1200, 900))
+
+    assert batch.shape == (1, 224, 224, 3)
+    assert batch.dtype == np.float32
+    assert 0.0 <= batch.min() and batch.max() <= 1.0
+
+
+def test_uint8_batch_matches_float_batch():
+    data = _jpeg(1200, 900)
+    raw = preprocess_image(data, dtype=np.uint8)
+    scaled = preprocess_image(data)
+
+    assert raw.shape == (1, 224, 224, 3)
+    assert raw.dtype == np.uint8
+    np.testing.assert_allclose(raw / 255.0, scaled, atol=1e-6)
+
+
+if __name__ == "__main__":
+    test_fast_decode_reduces_large_jpegs()
+    test_fast_decode_applies_exif_orientation()
+    test_preprocess_image_shape_and_range()
+    test_uint8_batch_matches_float_batch()
+    print("Image processing tests passed!")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Tests for per-task backend selection and model file resolution"""
+
+import os
+
+import inference_backends
+from inference_backends import backend_for, backend_model_path, backend_of_file
+from tflite_backend import plan_batches
+
+
+def test_per_task_override():
+    environ = {'INFERENCE_BACKEND': 'onnx', 'INFERENCE_BACKEND_PEST': 'OpenVINO'}
+
+    assert backend_for('disease', environ) == 'onnx'
+    assert backend_for('pest', environ) == 'openvino'
+    assert backend_for('disease', {}) == 'keras'
+
+
+def test_unknown_backend_falls_back_to_keras():
+    assert backend_for('nutrient', {'INFERENCE_BACKEND_NUTRIENT': 'tensorrt'}) == 'keras'
+
+
+def test_model_paths_round_trip():
+    for backend in inference_backends.BACKENDS:
+        path = backend_model_path('disease', backend, precision='float16')
+        assert os.path.basename(path).startswith('disease_model')
+        assert backend_of_file(path) == backend
+
+    assert backend_of_file('models/registry/pest/v2/model.XML') == 'openvino'
+
+
+def test_tflite_batches_are_padded_to_fixed_sizes():
+    sizes = (1, 2, 4, 8)
+    assert plan_batches(1, sizes) == [(0, 1, 1)]
+    assert plan_batches(3, sizes) == [(0, 3, 4)]
+    assert plan_batches(8, sizes) == [(0, 8, 8)]
+    # Larger batches run as full chunks plus one padded remainder
+    assert plan_batches(19, sizes) == [(0, 8, 8), (8, 8, 8), (16, 3, 4)]
+
+
+if __name__ == "__main__":
+    test_per_task_override()
+    test_unknown_backend_falls_back_to_keras()
+    test_model_paths_round_trip()
+    test_tflite_batches_are_padded_to_fixed_sizes()
+    print("Inference backend tests passed!")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Tests for the micro-batching inference engine"""
+
+import threading
+import time
+
+import numpy as np
+
+from inference_engine import InferenceEngine, _PendingRequest
+
+
+def _fake_model(calls):
+    def predict(batch):
+        calls.append(len(batch))
+        # One "probability" row per image, echoing the image's first pixel
+        return np.stack([batch[:, 0, 0, 0], 1 - batch[:, 0, 0, 0]], axis=1)
+    return predict
+
+
+def test_concurrent_requests_share_a_batch():
+    calls = []
+    engine = InferenceEngine()
+    engine.register('disease', _fake_model(calls), max_batch_size=8, max_wait_ms=200)
+
+    results = {}
+
+    def worker(i):
+        img = np.full((1, 4, 4, 3), i / 10.0, dtype=np.float32)
+        results[i] = engine.predict('disease', img, timeout=5)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Every request gets its own row back
+    for i in range(8):
+        assert results[i].shape == (1, 2)
+        assert np.isclose(results[i][0, 0], i / 10.0)
+
+    assert sum(calls) == 8
+    assert len(calls) < 8
+
+    metrics = engine.get_metrics()['disease']
+    assert metrics['images_processed'] == 8
+    assert metrics['queue_depth'] == 0
+
+
+def test_errors_are_returned_to_every_request():
+    engine = InferenceEngine()
+
+    def broken(batch):
+        raise ValueError('bad model')
+
+    engine.register('pest', broken, max_wait_ms=0)
+    future = engine.submit('pest', np.zeros((4, 4, 3), dtype=np.float32))
+    try:
+        future.result(timeout=5)
+        assert False, 'expected the model error to propagate'
+    except ValueError as e:
+        assert 'bad model' in str(e)
+
+
+def test_queue_wait_is_averaged_per_request():
+    engine = InferenceEngine()
+    engine.register('nutrient', _fake_model([]))
+    batcher = engine.batchers['nutrient']
+
+    # One batch of two requests with two images each, queued 10 ms and 30 ms
+    started = time.perf_counter()
+    batch = [_PendingRequest(np.zeros((2, 4, 4, 3), dtype=np.float32)) for _ in range(2)]
+    batch[0].enqueued_at = started - 0.010
+    batch[1].enqueued_at = started - 0.030
+    batcher._record_batch(batch, 4, started)
+
+    metrics = engine.get_metrics()['nutrient']
+    assert metrics['requests_processed'] == 2
+    assert metrics['images_processed'] == 4
+    assert np.isclose(metrics['avg_queue_wait_ms'], 20.0)
+
+
+def test_requests_for_different_model_versions_are_not_batched_together():
+    release = threading.Event()
+    engine = InferenceEngine()
+    engine.register('disease', lambda batch: release.wait(5) and np.zeros((len(batch), 2)), max_wait_ms=200)
+
+    old_calls, new_calls = [], []
+    old_version = _fake_model(old_calls)
+
+    def new_version(batch):
+        new_calls.append(len(batch))
+        return np.ones((len(batch), 2))
+
+    # The first request holds the worker while the others queue up behind it
+    blocker = engine.submit('disease', np.zeros((4, 4, 3), dtype=np.float32))
+    time.sleep(0.05)
+    img = np.full((1, 4, 4, 3), 0.25, dtype=np.float32)
+    futures = [engine.submit('disease', img, old_version),
+               engine.submit('disease', img, new_version),
+               engine.submit('disease', img, old_version)]
+    release.set()
+
+    assert blocker.result(timeout=5).shape == (1, 2)
+    old_first, new, old_second = [future.result(timeout=5) for future in futures]
+    assert np.isclose(old_first[0, 0], 0.25) and np.isclose(old_second[0, 0], 0.25)
+    assert np.isclose(new[0, 0], 1.0)
+    assert old_calls == [1, 1] and new_calls == [1]
+
+
+if __name__ == "__main__":
+    test_concurrent_requests_share_a_batch()
+    test_errors_are_returned_to_every_request()
+    test_queue_wait_is_averaged_per_request()
+    test_requests_for_different_model_versions_are_not_batched_together()
+    print("Inference engine tests passed!")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Tests for the diagnosis job queue and its shared job store"""
+
+import os
+import tempfile
+import threading
+import time
+
+from job_queue import JobQueue, QueueFull
+
+
+def test_jobs_are_visible_to_every_worker_sharing_the_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'jobs.db')
+        # Two queues over one file stand in for two gunicorn workers
+        accepting, polling = JobQueue(db_path=path, poll_interval=0.05), JobQueue(db_path=path, poll_interval=0.05)
+        release = threading.Event()
+
+        job_id = accepting.submit('disease', lambda: release.wait(5) and {'disease': {'confidence': 0.9}})
+        job = polling.wait_for_change(job_id, 'queued', timeout=5)
+        assert job['status'] == 'running'
+
+        release.set()
+        job = polling.wait_for_change(job_id, 'running', timeout=5)
+        assert job['status'] == 'done'
+        assert job['result'] == {'disease': {'confidence': 0.9}}
+        assert polling.get_stats()['states'] == {'done': 1}
+        assert polling.get('missing') is None
+
+
+def test_failures_are_recorded_and_full_queues_reject():
+    def fail():
+        raise ValueError('unreadable image')
+
+    queue = JobQueue(max_workers=1, max_pending=1)
+    release = threading.Event()
+    running = queue.submit('disease', release.wait, 5)
+    assert queue.wait_for_change(running, 'queued', timeout=5)['status'] == 'running'
+    # The only worker is busy, so this one waits and fills the queue
+    queue.submit('disease', fail)
+    try:
+        queue.submit('disease', fail)
+        assert False, 'expected the second waiting job to be rejected'
+    except QueueFull:
+        pass
+
+    release.set()
+    queue._get_executor().shutdown(wait=True)
+    states = queue.get_stats()['states']
+    assert states == {'done': 1, 'failed': 1}
+    assert queue.rejected == 1
+
+
+def test_jobs_left_behind_by_a_stopped_worker_fail():
+    queue = JobQueue(stale_seconds=60)
+    db = queue._get_db()
+    # Rows a crashed worker accepted and never finished
+    for job_id, status in (('lost-running', 'running'), ('lost-queued', 'queued')):
+        db.execute('INSERT INTO jobs (job_id, kind, status, created_at) VALUES (?, ?, ?, ?)',
+                   (job_id, 'disease', status, time.time() - 120))
+    db.commit()
+
+    job = queue.get('lost-running')
+    assert job['status'] == 'failed' and job['error'] and job['finished_at']
+
+    fresh = queue.submit('disease', lambda: {'disease': {'confidence': 0.9}})
+    queue._get_executor().shutdown(wait=True)
+    assert queue.get('lost-queued')['status'] == 'failed'
+    assert queue.get(fresh)['status'] == 'done'
+
+
+if __name__ == "__main__":
+    test_jobs_are_visible_to_every_worker_sharing_the_store()
+    test_failures_are_recorded_and_full_queues_reject()
+    test_jobs_left_behind_by_a_stopped_worker_fail()
+    print("Job queue tests passed!")
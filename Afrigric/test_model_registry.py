@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Tests for the versioned model registry"""
+
+import json
+import os
+import tempfile
+
+from model_registry import ManifestError, ModelRegistry, class_mapping
+
+CLASSES = ['Blight', 'Common_Rust', 'Gray_Leaf_Spot', 'Healthy']
+
+
+def _model_file(directory, name, content):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def test_publish_activate_and_rollback():
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(os.path.join(tmp, 'registry'))
+        registry.publish('disease', _model_file(tmp, 'a.keras', b'first'), CLASSES, version='v1')
+        registry.publish('disease', _model_file(tmp, 'b.keras', b'second'), CLASSES[::-1], version='v2')
+
+        assert registry.active_version('disease') is None
+        registry.activate('disease', 'v1')
+        registry.activate('disease', 'v2')
+        assert registry.active_version('disease') == 'v2'
+        assert class_mapping(registry.manifest('disease', 'v2'))[0] == 'Healthy'
+
+        assert registry.previous_version('disease') == 'v1'
+        assert registry.rollback('disease') == 'v1'
+        assert registry.active_version('disease') == 'v1'
+
+        try:
+            registry.rollback('disease')
+            assert False, 'rolled back past the first version'
+        except ManifestError:
+            pass
+
+
+def test_corrupted_model_is_refused():
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(os.path.join(tmp, 'registry'))
+        registry.publish('pest', _model_file(tmp, 'p.keras', b'weights'), ['Ants', 'Aphids'], version='v1')
+        with open(registry.model_path('pest', 'v1'), 'ab') as f:
+            f.write(b'tampered')
+
+        try:
+            registry.activate('pest', 'v1')
+            assert False, 'activated a model whose checksum does not match'
+        except ManifestError:
+            pass
+        assert registry.active_version('pest') is None
+
+
+def test_corrupted_openvino_weights_are_refused():
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(os.path.join(tmp, 'registry'))
+        _model_file(tmp, 'n.bin', b'weights')
+        manifest = registry.publish('nutrient', _model_file(tmp, 'n.xml', b'<net/>'), ['Healthy', 'KAB'], version='v1')
+        assert set(manifest['files']) == {'model.xml', 'model.bin'}
+        registry.verify('nutrient', 'v1')
+
+        with open(os.path.join(registry.version_dir('nutrient', 'v1'), 'model.bin'), 'wb') as f:
+            f.write(b'swapped')
+        try:
+            registry.activate('nutrient', 'v1')
+            assert False, 'activated a model whose weights file does not match'
+        except ManifestError as e:
+            assert 'model.bin' in str(e)
+        assert registry.active_version('nutrient') is None
+
+
+def test_versions_with_another_input_size_are_refused():
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(os.path.join(tmp, 'registry'))
+        try:
+            registry.publish('disease', _model_file(tmp, 'small.keras', b'weights'), CLASSES, version='v1',
+                             input_size=(160, 160))
+            assert False, 'published a model that does not take the served input size'
+        except ManifestError as e:
+            assert '160x160' in str(e)
+        assert registry.versions('disease') == []
+
+        # A manifest edited after publishing is caught on activation
+        registry.publish('disease', _model_file(tmp, 'a.keras', b'weights'), CLASSES, version='v2')
+        manifest_path = os.path.join(registry.version_dir('disease', 'v2'), 'manifest.json')
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        manifest['input_size'] = [160, 160]
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+        try:
+            registry.activate('disease', 'v2')
+            assert False, 'activated a model that does not take the served input size'
+        except ManifestError:
+            pass
+        assert registry.active_version('disease') is None
+
+
+if __name__ == "__main__":
+    test_publish_activate_and_rollback()
+    test_corrupted_model_is_refused()
+    test_corrupted_openvino_weights_are_refused()
+    test_versions_with_another_input_size_are_refused()
+    print("Model registry tests passed!")
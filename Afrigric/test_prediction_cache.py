@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Tests for the content-addressed prediction cache"""
+
+import os
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from prediction_cache import PredictionCache, image_digest
+
+
+def test_same_pixels_same_digest():
+    first = Image.new('RGB', (32, 32), (10, 200, 30))
+    second = Image.new('RGB', (32, 32), (10, 200, 30))
+    different = Image.new('RGB', (32, 32), (10, 200, 31))
+
+    assert image_digest(first) == image_digest(second)
+    assert image_digest(first) != image_digest(different)
+
+
+def test_lru_eviction_and_counters():
+    cache = PredictionCache(max_entries=2)
+    cache.put('a', [0.1, 0.9])
+    cache.put('b', [0.8, 0.2])
+    assert cache.get('a')['predicted_class'] == 1  # 'a' is now most recent
+    cache.put('c', [0.5, 0.5])
+
+    assert cache.get('b') is None
+    assert cache.get('c') is not None
+
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+
+
+def test_sqlite_tier_survives_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'predictions.db')
+        key = PredictionCache.make_key('abc', 'disease:keras', 'v1')
+
+        PredictionCache(db_path=db_path).put(key, [0.2, 0.7, 0.1])
+
+        restarted = PredictionCache(db_path=db_path)
+        entry = restarted.get(key)
+        assert entry['predicted_class'] == 1
+        assert np.isclose(entry['confidence'], 0.7)
+        assert restarted.get_stats()['disk_hits'] == 1
+
+
+def test_sqlite_tier_is_pruned_every_few_writes():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = PredictionCache(db_path=os.path.join(tmp, 'predictions.db'), max_db_entries=5, db_prune_every=4)
+        rows = lambda: cache._db.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+
+        for index in range(7):
+            cache.put(f'key{index}', [0.5, 0.5])
+        # Checked after the fourth write (4 rows, within budget); over budget until the eighth
+        assert rows() == 7
+
+        cache.put('key7', [0.5, 0.5])
+        assert rows() == 5
+
+
+if __name__ == "__main__":
+    test_same_pixels_same_digest()
+    test_lru_eviction_and_counters()
+    test_sqlite_tier_survives_restart()
+    test_sqlite_tier_is_pruned_every_few_writes()
+    print("Prediction cache tests passed!")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Tests for the bounded preprocessing pool"""
+
+import threading
+import time
+
+from preprocess_pool import PreprocessPool
+
+
+def test_imap_keeps_order():
+    pool = PreprocessPool(max_workers=4, max_pending=8)
+
+    def slow_square(value):
+        # Later items finish first
+        time.sleep(0.01 * (5 - value % 5))
+        return value * value
+
+    assert list(pool.imap(slow_square, range(20))) == [value * value for value in range(20)]
+    stats = pool.get_stats()
+    assert stats['completed'] == 20
+    assert stats['in_flight'] == 0
+
+
+def test_submit_blocks_when_full():
+    pool = PreprocessPool(max_workers=1, max_pending=2)
+    release = threading.Event()
+    pool.submit(release.wait)
+    pool.submit(release.wait)
+
+    submitted = threading.Event()
+    threading.Thread(target=lambda: (pool.submit(lambda: None), submitted.set()), daemon=True).start()
+    assert not submitted.wait(0.1)
+
+    release.set()
+    assert submitted.wait(2)
+
+
+def test_errors_reach_the_caller_and_free_the_slot():
+    pool = PreprocessPool(max_workers=1, max_pending=1)
+
+    def fail():
+        raise ValueError('bad image')
+
+    try:
+        pool.run(fail)
+    except ValueError as e:
+        assert str(e) == 'bad image'
+    else:
+        raise AssertionError('expected ValueError')
+    assert pool.run(lambda: 'ok') == 'ok'
+
+
+if __name__ == "__main__":
+    test_imap_keeps_order()
+    test_submit_blocks_when_full()
+    test_errors_reach_the_caller_and_free_the_slot()
+    print("Preprocessing pool tests passed!")
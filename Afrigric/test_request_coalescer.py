@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Tests for in-flight coalescing of identical classifier requests"""
+
+import threading
+import time
+
+from request_coalescer import RequestCoalescer
+
+
+def test_concurrent_identical_requests_share_one_computation():
+    coalescer = RequestCoalescer(enabled=True)
+    calls = []
+    started = threading.Event()
+
+    def forward_pass():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return {'predicted_class': 3}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(coalescer.run('leaf', forward_pass)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(coalescer.run('leaf', forward_pass)))
+                 for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{'predicted_class': 3}] * 5
+    stats = coalescer.get_stats()
+    assert stats['leaders'] == 1 and stats['coalesced'] == 4 and stats['in_flight'] == 0
+
+
+def test_leader_errors_reach_followers_and_clear_the_key():
+    coalescer = RequestCoalescer(enabled=True)
+    future, leader = coalescer.claim('leaf')
+    waiting, follower_leads = coalescer.claim('leaf')
+    assert leader and not follower_leads and waiting is future
+
+    coalescer.fail('leaf', RuntimeError('model failed'))
+    try:
+        waiting.result()
+        assert False, 'expected the leader error to reach the follower'
+    except RuntimeError:
+        pass
+
+    # The next request starts afresh
+    assert coalescer.claim('leaf')[1]
+
+
+def test_disabled_coalescer_always_leads():
+    coalescer = RequestCoalescer(enabled=False)
+    assert coalescer.claim('leaf')[1] and coalescer.claim('leaf')[1]
+    assert coalescer.get_stats()['coalesced'] == 0
+
+
+if __name__ == "__main__":
+    test_concurrent_identical_requests_share_one_computation()
+    test_leader_errors_reach_followers_and_clear_the_key()
+    test_disabled_coalescer_always_leads()
+    print("Request coalescer tests passed!")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Tests for the append-only embedding index behind similar confirmed cases"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from similarity_index import EmbeddingIndex, SimilarityService
+
+
+def _clustered(rng, centers, n, noise=0.2):
+    return centers[rng.integers(0, len(centers), n)] + noise * rng.normal(size=(n, centers.shape[1]))
+
+
+def test_exact_search_and_reopen():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 16))
+    with tempfile.TemporaryDirectory() as directory:
+        index = EmbeddingIndex(directory)
+        rows = index.add(vectors, [{'label': f'case{i}'} for i in range(500)])
+        assert rows == list(range(500))
+
+        best_row, similarity = index.search(vectors[42], k=3)[0]
+        assert best_row == 42
+        assert similarity > 0.99
+
+        # Another process sees the same rows, and appends extend them
+        reopened = EmbeddingIndex(directory)
+        assert len(reopened) == 500
+        assert reopened.case(42) == {'label': 'case42'}
+        reopened.add(vectors[:2] * -1, [{'label': 'late'}, {'label': 'late'}])
+        assert index.search(-vectors[1], k=1)[0][0] == 501
+
+
+def test_ivf_matches_exact_search_and_takes_appends():
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(50, 32))
+    with tempfile.TemporaryDirectory() as directory:
+        index = EmbeddingIndex(directory)
+        index.add(_clustered(rng, centers, 5000), [{'label': 'x'}] * 5000)
+        queries = _clustered(rng, centers, 20)
+        exact = [index.search(query, k=1)[0][0] for query in queries]
+
+        index.train(n_lists=50)
+        assert index.stats()['trained']
+        approximate = [index.search(query, k=1, nprobe=4)[0][0] for query in queries]
+        assert np.mean(np.array(exact) == np.array(approximate)) >= 0.9
+
+        # New cases join existing lists without retraining
+        new_row = index.add(queries[:1], [{'label': 'new'}])[0]
+        assert index.search(queries[0], k=1, nprobe=4)[0][0] == new_row
+
+
+def test_two_writers_opened_on_an_empty_directory():
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(5, 8))
+    with tempfile.TemporaryDirectory() as directory:
+        first, second = EmbeddingIndex(directory), EmbeddingIndex(directory)
+        assert first.add(vectors[:3], [{'label': 'first'}] * 3) == [0, 1, 2]
+        # The second writer learns the dimension and row count from disk
+        assert second.add(vectors[3:], [{'label': 'second'}] * 2) == [3, 4]
+        assert second.dim == 8
+
+        first.refresh()
+        assert len(first) == 5
+        assert first.search(vectors[4], k=1)[0][0] == 4
+        assert first.case(4) == {'label': 'second'}
+        assert EmbeddingIndex(directory).stats()['cases'] == 5
+
+
+def test_lookups_are_only_queued_for_registered_tasks_with_cases():
+    with tempfile.TemporaryDirectory() as tmp:
+        service = SimilarityService(os.path.join(tmp, 'index'), enabled=True, results_dir=os.path.join(tmp, 'results'))
+        service.register('disease', lambda: None)
+        key = service.lookup_key('disease', 'v1', b'photo')
+        # Nothing is confirmed yet, and pest is not registered at all
+        assert not service.submit('disease', key, b'photo')
+        assert not service.submit('pest', key, b'photo')
+
+        service.index('disease').add(np.eye(4)[:2], [{'label': 'Blight'}, {'label': 'Healthy'}])
+        assert service.lookup_key('disease', 'v1', b'photo') != key
+
+        # A lookup stored by any worker is served without queueing another one
+        os.makedirs(service.results_dir)
+        with open(service.result_path(key), 'w') as f:
+            json.dump({'task': 'disease', 'cases': [{'label': 'Blight', 'row': 0, 'similarity': 0.9}]}, f)
+        assert service.submit('disease', key, b'photo')
+        assert not service.is_pending(key)
+        assert service.get(key)['cases'][0]['label'] == 'Blight'
+        assert service.get('missing') is None
+
+
+def test_service_sees_cases_added_by_another_process():
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = os.path.join(tmp, 'index')
+        service = SimilarityService(directory, enabled=True, results_dir=os.path.join(tmp, 'results'))
+        service.register('disease', lambda: None)
+        assert len(service.index('disease')) == 0
+        key = service.lookup_key('disease', 'v1', b'photo')
+        assert not service.submit('disease', key, b'photo')
+
+        # Cases confirmed through another worker's index
+        other = EmbeddingIndex(os.path.join(directory, 'disease'))
+        other.add(np.eye(4)[:3], [{'label': 'Blight'}] * 3)
+
+        assert service.case_count('disease') == 3
+        key = service.lookup_key('disease', 'v1', b'photo')
+        os.makedirs(service.results_dir)
+        with open(service.result_path(key), 'w') as f:
+            json.dump({'task': 'disease', 'cases': []}, f)
+        assert service.submit('disease', key, b'photo')
+
+
+if __name__ == "__main__":
+    test_exact_search_and_reopen()
+    test_ivf_matches_exact_search_and_takes_appends()
+    test_two_writers_opened_on_an_empty_directory()
+    test_lookups_are_only_queued_for_registered_tasks_with_cases()
+    test_service_sees_cases_added_by_another_process()
+    print("Similarity index tests passed!")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Tests for tiled inference on large photos"""
+
+import numpy as np
+from PIL import Image
+
+from tiling import TooManyTiles, aggregate_tiles, make_tiles, tile_positions
+
+
+def test_tiles_cover_the_whole_image():
+    positions = tile_positions(672, tile=224, overlap=0.25)
+
+    assert positions[0] == 0
+    assert positions[-1] == 672 - 224
+    # Neighbouring tiles overlap rather than leave gaps
+    assert all(b - a <= 224 for a, b in zip(positions, positions[1:]))
+
+
+def test_make_tiles_batch_and_boxes():
+    img = Image.new('RGB', (4000, 3000), (30, 150, 40))
+    batch, boxes = make_tiles(img, max_side=672)
+
+    assert batch.shape[1:] == (224, 224, 3)
+    assert batch.dtype == np.float32
+    assert len(boxes) == len(batch) == 12
+    assert boxes[0][:2] == (0.0, 0.0)
+    assert boxes[-1][2:] == (1.0, 1.0)
+
+    raw, _ = make_tiles(img, max_side=672, dtype=np.uint8)
+    assert raw.dtype == np.uint8
+
+
+def test_max_pooling_keeps_a_problem_seen_in_one_tile():
+    healthy = [0.05, 0.95]
+    lesion = [0.9, 0.1]
+    tiles = np.array([healthy, healthy, healthy, lesion])
+
+    assert np.argmax(aggregate_tiles(tiles, 'mean')) == 1
+    pooled = aggregate_tiles(tiles, 'max')
+    np.testing.assert_allclose(pooled.sum(), 1.0, rtol=1e-6)
+    assert pooled[0] > 0.45
+
+
+def test_narrow_photos_stay_under_the_tile_cap():
+    # The shorter side is scaled up to one tile, so a 20:1 strip would need 27 tiles at 25% overlap
+    strip = Image.new('RGB', (4000, 200), (30, 150, 40))
+    batch, boxes = make_tiles(strip, max_side=672, max_tiles=25)
+    assert len(batch) == len(boxes) <= 25
+    assert boxes[-1][2] == 1.0
+
+    try:
+        make_tiles(strip, max_side=672, max_tiles=8)
+        assert False, 'expected a photo needing more than max_tiles tiles to be refused'
+    except TooManyTiles:
+        pass
+
+
+if __name__ == "__main__":
+    test_tiles_cover_the_whole_image()
+    test_make_tiles_batch_and_boxes()
+    test_max_pooling_keeps_a_problem_seen_in_one_tile()
+    test_narrow_photos_stay_under_the_tile_cap()
+    print("Tiling tests passed!")
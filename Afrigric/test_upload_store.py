@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Tests for content-addressed upload names and the upload reaper"""
+
+import io
+import os
+import tempfile
+import time
+
+from upload_store import UploadReaper, UploadTooLarge, copy_upload, upload_name
+
+
+def _write(folder, name, size, age, now):
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    os.utime(path, (now - age, now - age))
+    return path
+
+
+def test_names_follow_contents_not_filenames():
+    assert upload_name(b'leaf one', 'IMG_0001.JPG') != upload_name(b'leaf two', 'IMG_0001.JPG')
+    assert upload_name(b'leaf one', 'a.jpg') == upload_name(b'leaf one', 'b.jpg')
+    assert upload_name(b'leaf one', 'a.PNG').endswith('.png')
+    assert '/' not in upload_name(b'leaf one', '../../etc/passwd')
+
+
+def test_reaper_expires_old_files_then_trims_to_budget():
+    now = time.time()
+    with tempfile.TemporaryDirectory() as folder:
+        expired = _write(folder, 'expired.jpg', 10, 7200, now)
+        oldest = _write(folder, 'oldest.jpg', 60, 300, now)
+        newer = _write(folder, 'newer.jpg', 60, 200, now)
+        newest = _write(folder, 'newest.jpg', 60, 100, now)
+
+        reaper = UploadReaper(folder, max_age_seconds=3600, max_total_bytes=130, interval=0)
+        assert reaper.reap(now) == 2
+
+        assert not os.path.exists(expired)
+        assert not os.path.exists(oldest)
+        assert os.path.exists(newer) and os.path.exists(newest)
+        assert reaper.get_stats()['bytes_removed'] == 70
+
+
+def test_reaper_ignores_missing_folder():
+    reaper = UploadReaper('/nonexistent/uploads', interval=0)
+    assert reaper.reap() == 0
+
+
+def test_copy_upload_stops_past_the_limit():
+    target = io.BytesIO()
+    assert copy_upload(io.BytesIO(b'x' * 100), target, max_bytes=100, chunk_size=30) == 100
+    assert target.getvalue() == b'x' * 100
+
+    target = io.BytesIO()
+    try:
+        copy_upload(io.BytesIO(b'x' * 101), target, max_bytes=100, chunk_size=30)
+        assert False, 'expected an upload past max_bytes to be refused'
+    except UploadTooLarge:
+        pass
+    assert len(target.getvalue()) <= 100
+
+
+if __name__ == "__main__":
+    test_names_follow_contents_not_filenames()
+    test_reaper_expires_old_files_then_trims_to_budget()
+    test_reaper_ignores_missing_folder()
+    test_copy_upload_stops_past_the_limit()
+    print("Upload store tests passed!")
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Tests for video clip diagnosis"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from video_diagnosis import diagnose_video
+
+
+def _write_clip(path, seconds=6, fps=10):
+    """A clip that holds still for half its length, then pans across a textured field"""
+    import cv2
+
+    rng = np.random.default_rng(0)
+    field = cv2.resize(rng.integers(0, 255, (60, 200, 3), dtype=np.uint8), (800, 240), interpolation=cv2.INTER_CUBIC)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (320, 240))
+    frames = seconds * fps
+    for index in range(frames):
+        shift = 0 if index < frames // 2 else (index - frames // 2) * 12
+        writer.write(np.ascontiguousarray(field[:, shift:shift + 320]))
+    writer.release()
+
+
+def test_still_frames_are_skipped_and_results_are_time_indexed():
+    batch_sizes = []
+
+    def classify_batch(batch):
+        batch_sizes.append(len(batch))
+        probabilities = np.tile([0.2, 0.8], (len(batch), 1))
+        return {'disease': probabilities}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'walk.mp4')
+        _write_clip(path)
+        result = diagnose_video(path, classify_batch, {'disease': {0: 'Blight', 1: 'Common_Rust'}},
+                                sample_fps=2, batch_size=4)
+
+    assert result['frames_sampled'] == 12
+    # The still first half collapses to a single frame
+    assert result['frames_skipped'] >= 5
+    assert result['frames_analyzed'] == sum(batch_sizes)
+    assert max(batch_sizes) <= 4
+    assert result['timeline'][0]['time'] == 0.0
+    assert result['verdict']['disease'] == {'problem': 'Common_Rust', 'confidence': 80.0,
+                                            'frames': result['frames_analyzed'], 'share': 100.0}
+
+
+if __name__ == "__main__":
+    test_still_frames_are_skipped_and_results_are_time_indexed()
+    print("Video diagnosis tests passed!")
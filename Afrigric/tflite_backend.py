@@ -0,0 +1,122 @@
+import os
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def default_batch_sizes():
+    """TFLITE_BATCH_SIZES, or powers of two up to the micro-batcher's largest batch"""
+    configured = os.getenv('TFLITE_BATCH_SIZES')
+    if configured:
+        return tuple(sorted({int(size) for size in configured.split(',') if size.strip()}))
+    largest = max(1, int(os.getenv('INFERENCE_MAX_BATCH_SIZE', '8')))
+    sizes = [1]
+    while sizes[-1] < largest:
+        sizes.append(min(sizes[-1] * 2, largest))
+    return tuple(sizes)
+
+
+def plan_batches(count, batch_sizes):
+    """
+    Split `count` images into (start, images, padded_size) runs over fixed sizes.
+
+    Each run is padded up to the smallest size that holds it; anything
+    beyond the largest size is cut into runs of the largest size.
+    """
+    largest = batch_sizes[-1]
+    plan = []
+    for start in range(0, count, largest):
+        images = min(largest, count - start)
+        plan.append((start, images, next(size for size in batch_sizes if size >= images)))
+    return plan
+
+
+class TFLiteClassifier:
+    """
+    Runs an exported .tflite classifier through tf.lite.Interpreter.
+
+    Exposes the same predict(batch) call as a Keras model so it can be used
+    anywhere the app expects disease_model / pest_model / nutrient_model.
+    The interpreter memory-maps the flatbuffer instead of materialising a
+    Keras graph, which keeps per-worker memory smaller than with Keras. Only
+    the mapped file is shared between workers, though: XNNPACK copies the
+    weights into its packed format for every interpreter.
+
+    Resizing an interpreter's input re-plans the graph and repacks the
+    XNNPACK weights, which would happen on almost every call as micro-batch
+    sizes vary. Instead there is one interpreter per fixed batch size (see
+    default_batch_sizes), allocated once on first use. Batches are
+    zero-padded up to the next fixed size.
+    """
+
+    def __init__(self, model_path, num_threads=None, batch_sizes=None):
+        import tensorflow as tf
+
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.batch_sizes = tuple(sorted(batch_sizes or default_batch_sizes()))
+        self._tf = tf
+
+        self._interpreters = {}
+        interpreter = self._interpreter(self.batch_sizes[0])
+        self._input = interpreter.get_input_details()[0]
+        self._output = interpreter.get_output_details()[0]
+        # A single interpreter is not thread-safe
+        self._lock = threading.Lock()
+
+    def _interpreter(self, batch_size):
+        interpreter = self._interpreters.get(batch_size)
+        if interpreter is None:
+            interpreter = self._tf.lite.Interpreter(model_path=self.model_path, num_threads=self.num_threads)
+            details = interpreter.get_input_details()[0]
+            if int(details['shape'][0]) != batch_size:
+                interpreter.resize_tensor_input(details['index'], [batch_size] + list(details['shape'][1:]))
+            interpreter.allocate_tensors()
+            self._interpreters[batch_size] = interpreter
+        return interpreter
+
+    @property
+    def input_shape(self):
+        return tuple([None] + [int(dim) for dim in self._input['shape'][1:]])
+
+    def _quantize(self, batch):
+        dtype = self._input['dtype']
+        if dtype == np.float32:
+            return batch.astype(np.float32, copy=False)
+
+        scale, zero_point = self._input['quantization']
+        info = np.iinfo(dtype)
+        quantized = np.round(batch / scale + zero_point)
+        return np.clip(quantized, info.min, info.max).astype(dtype)
+
+    def _dequantize(self, output):
+        if self._output['dtype'] == np.float32:
+            return output
+
+        scale, zero_point = self._output['quantization']
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch, verbose=0):
+        """Predict class probabilities for an (n, H, W, 3) float batch"""
+        batch = np.asarray(batch, dtype=np.float32)
+        if batch.ndim == 3:
+            batch = np.expand_dims(batch, axis=0)
+
+        outputs = []
+        with self._lock:
+            for start, images, padded_size in plan_batches(len(batch), self.batch_sizes):
+                inputs = self._quantize(batch[start:start + images])
+                if padded_size > images:
+                    padding = np.zeros((padded_size - images,) + inputs.shape[1:], dtype=inputs.dtype)
+                    inputs = np.concatenate([inputs, padding])
+
+                interpreter = self._interpreter(padded_size)
+                interpreter.set_tensor(self._input['index'], inputs)
+                interpreter.invoke()
+                outputs.append(np.array(interpreter.get_tensor(self._output['index'])[:images]))
+
+        return self._dequantize(np.concatenate(outputs))
@@ -0,0 +1,124 @@
+import math
+import os
+
+import numpy as np
+from PIL import Image
+from dotenv import load_dotenv
+
+from image_processing import MODEL_INPUT_SIZE
+
+# Load environment variables
+load_dotenv()
+
+TILE_SIZE = MODEL_INPUT_SIZE[0]
+# Fraction of each tile shared with its neighbour, so a lesion on a tile edge is fully inside another tile
+TILE_OVERLAP = float(os.getenv('TILE_OVERLAP', '0.25'))
+# The photo is scaled so its longer side is at most this many pixels before tiling;
+# 672 px with 25% overlap gives at most a 4x3 grid of 224 px tiles
+TILE_MAX_SIDE = int(os.getenv('TILE_MAX_SIDE', '672'))
+# Upper bound on the tiles cut from one photo; overlap is reduced to stay under it
+TILE_MAX_COUNT = int(os.getenv('TILE_MAX_COUNT', '16'))
+TILE_POOLING = os.getenv('TILE_POOLING', 'max').lower()
+POOLING_METHODS = ('max', 'mean')
+
+
+class TooManyTiles(ValueError):
+    """Raised when a photo cannot be covered by TILE_MAX_COUNT tiles, even without overlap"""
+
+
+def tile_positions(length, tile=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Evenly spaced tile offsets along one axis, covering it edge to edge"""
+    if length <= tile:
+        return [0]
+    stride = tile * (1 - overlap)
+    count = math.ceil((length - tile) / stride) + 1
+    return [int(round(position)) for position in np.linspace(0, length - tile, count)]
+
+
+def scale_for_tiling(img, max_side=TILE_MAX_SIDE, tile=TILE_SIZE):
+    """Resize so the longer side fits max_side and the shorter side still fits one tile"""
+    width, height = img.size
+    scale = min(max_side / max(width, height), 1.0)
+    scale = max(scale, tile / min(width, height))
+    size = (max(tile, int(round(width * scale))), max(tile, int(round(height * scale))))
+    return img.resize(size, Image.BILINEAR) if size != img.size else img
+
+
+def tile_grid(width, height, tile=TILE_SIZE, overlap=TILE_OVERLAP, max_tiles=TILE_MAX_COUNT):
+    """
+    Tile offsets (tops, lefts) for a width x height image, at most max_tiles in all.
+
+    The shorter side is never scaled below one tile, so a very long, narrow
+    photo can need far more tiles than TILE_MAX_SIDE suggests. The overlap
+    is then reduced (a longer stride) until the grid fits; if it still does
+    not fit with no overlap, the photo is refused.
+    """
+    while True:
+        tops, lefts = tile_positions(height, tile, overlap), tile_positions(width, tile, overlap)
+        if len(tops) * len(lefts) <= max_tiles:
+            return tops, lefts
+        if overlap <= 0:
+            raise TooManyTiles(
+                f'A {width}x{height} photo needs {len(tops) * len(lefts)} tiles; at most {max_tiles} are allowed'
+            )
+        overlap = max(0.0, round(overlap - 0.05, 2))
+
+
+def make_tiles(img, tile=TILE_SIZE, overlap=TILE_OVERLAP, max_side=TILE_MAX_SIDE, dtype=np.float32,
+               max_tiles=TILE_MAX_COUNT):
+    """
+    Cut a decoded PIL image into overlapping model-sized crops.
+
+    Returns an (n, tile, tile, 3) batch (scaled to [0, 1] for float32, raw
+    pixels for uint8) and each tile's box as fractions of the image
+    (left, top, right, bottom), for drawing per-tile heat. Raises
+    TooManyTiles when more than max_tiles would be needed.
+    """
+    img = scale_for_tiling(img, max_side, tile)
+    width, height = img.size
+    tops, lefts = tile_grid(width, height, tile, overlap, max_tiles)
+    pixels = np.asarray(img)
+
+    crops, boxes = [], []
+    for top in tops:
+        for left in lefts:
+            crops.append(pixels[top:top + tile, left:left + tile])
+            boxes.append((left / width, top / height, (left + tile) / width, (top + tile) / height))
+
+    batch = np.stack(crops)
+    if dtype == np.uint8:
+        return batch, boxes
+    batch = batch.astype(np.float32)
+    batch /= 255.0
+    return batch, boxes
+
+
+def aggregate_tiles(tile_probabilities, pooling=TILE_POOLING):
+    """
+    Combine per-tile softmax outputs into one distribution.
+
+    'mean' averages the tiles. 'max' keeps each class's strongest tile and
+    renormalises, so a problem visible in a single tile is not averaged away
+    by the healthy parts of the photo.
+    """
+    tile_probabilities = np.asarray(tile_probabilities, dtype=np.float32)
+    if pooling == 'mean':
+        return tile_probabilities.mean(axis=0)
+    if pooling == 'max':
+        pooled = tile_probabilities.max(axis=0)
+        return pooled / pooled.sum()
+    raise ValueError(f"Unknown pooling method: {pooling}")
+
+
+def tile_heat(tile_probabilities, boxes, class_index):
+    """Per-tile probability of the predicted class, with each tile's box in percent"""
+    return [
+        {
+            'left': round(box[0] * 100, 2),
+            'top': round(box[1] * 100, 2),
+            'width': round((box[2] - box[0]) * 100, 2),
+            'height': round((box[3] - box[1]) * 100, 2),
+            'score': round(float(probabilities[class_index]), 4)
+        }
+        for probabilities, box in zip(tile_probabilities, boxes)
+    ]
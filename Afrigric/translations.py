@@ -164,6 +164,12 @@ TRANSLATIONS = {
         'weather_description': 'Weather Description',
         'weather_updated': 'Weather data updated successfully',
         'weather_error': 'Unable to fetch weather data',
+        'models_warming_up': 'The analysis models are still starting up. Please try again in a few seconds.',
+        'tiled_analysis': 'Scan the photo in tiles (finds small lesions and insects in wide shots)',
+        'tile_heat_caption': 'Shaded areas show where the photo most strongly matches the result.',
+        'explanation_loading': 'Finding the parts of the photo behind this result...',
+        'explanation_caption': 'Red and yellow areas influenced the result the most.',
+        'similar_cases': 'Similar Confirmed Cases',
         'enter_location': 'Enter your location (city, country)',
         'use_current_location': 'Use Current Location',
         'location_required': 'Location is required for weather data',
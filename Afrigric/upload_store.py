@@ -0,0 +1,160 @@
+"""
+Upload storage for the results pages.
+
+Each upload is stored under a name derived from its contents, so two users
+who upload different photos called IMG_0001.jpg never overwrite each other,
+and the same photo uploaded twice is written once. Nothing is deleted on
+the request path: a background reaper removes files by age and keeps the
+folder under a total size budget.
+
+    UPLOAD_MAX_AGE_MINUTES=60    files older than this are removed
+    UPLOAD_MAX_TOTAL_MB=500      oldest files go first once the folder is larger
+    UPLOAD_REAP_SECONDS=60       how often the folder is checked (0 turns the reaper off)
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from werkzeug.utils import secure_filename
+
+from image_processing import upload_writer
+
+# Load environment variables
+load_dotenv()
+
+UPLOAD_MAX_AGE_SECONDS = int(os.getenv('UPLOAD_MAX_AGE_MINUTES', '60')) * 60
+UPLOAD_MAX_TOTAL_BYTES = int(os.getenv('UPLOAD_MAX_TOTAL_MB', '500')) * 1024 * 1024
+UPLOAD_REAP_SECONDS = int(os.getenv('UPLOAD_REAP_SECONDS', '60'))
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload turns out larger than its limit while it is being read"""
+
+
+def upload_name(data, filename):
+    """Content-addressed file name for an upload, keeping its extension"""
+    extension = os.path.splitext(secure_filename(filename))[1].lower() or '.jpg'
+    return hashlib.sha256(data).hexdigest()[:32] + extension
+
+
+def store_upload(data, filename, folder):
+    """Persist an upload in the background and return the name it is served under"""
+    name = upload_name(data, filename)
+    filepath = os.path.join(folder, name)
+    try:
+        # Already stored: restart its clock instead of writing it again
+        os.utime(filepath)
+    except OSError:
+        upload_writer.save_async(data, filepath)
+    return name
+
+
+def copy_upload(source, target, max_bytes, chunk_size=COPY_CHUNK_BYTES):
+    """
+    Copy an upload stream to a file in chunks, stopping once max_bytes is passed.
+
+    Content-Length is missing on chunked requests and is only what the
+    client claims, so the limit is enforced on the bytes actually read.
+    """
+    copied = 0
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return copied
+        copied += len(chunk)
+        if copied > max_bytes:
+            raise UploadTooLarge(f'Upload is larger than {max_bytes // (1024 * 1024)}MB')
+        target.write(chunk)
+
+
+class UploadReaper:
+    """
+    Periodically removes expired uploads and trims the folder to its size budget.
+
+    Every server process may run one; files another process already removed
+    are skipped.
+    """
+
+    def __init__(self, folder, max_age_seconds=UPLOAD_MAX_AGE_SECONDS,
+                 max_total_bytes=UPLOAD_MAX_TOTAL_BYTES, interval=UPLOAD_REAP_SECONDS):
+        self.folder = folder
+        self.max_age_seconds = max_age_seconds
+        self.max_total_bytes = max_total_bytes
+        self.interval = interval
+        self._thread = None
+
+        self.files_removed = 0
+        self.bytes_removed = 0
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='upload-reaper', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                removed = self.reap()
+            except Exception as e:
+                print(f"⚠️  Upload reaper failed: {str(e)}")
+                continue
+            if removed:
+                print(f"🧹 Removed {removed} expired uploads")
+
+    def _remove(self, path, size):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f'Failed to delete {path}. Reason: {e}')
+            return False
+        self.files_removed += 1
+        self.bytes_removed += size
+        return True
+
+    def reap(self, now=None):
+        """Remove expired files, then the oldest ones until under budget; returns how many went"""
+        now = time.time() if now is None else now
+        files = []
+        try:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            files.append((stat.st_mtime, stat.st_size, entry.path))
+                    except FileNotFoundError:
+                        continue
+        except FileNotFoundError:
+            return 0
+
+        removed = 0
+        kept = []
+        for mtime, size, path in files:
+            if now - mtime > self.max_age_seconds:
+                removed += self._remove(path, size)
+            else:
+                kept.append((mtime, size, path))
+
+        total = sum(size for _, size, _ in kept)
+        for mtime, size, path in sorted(kept):
+            if total <= self.max_total_bytes:
+                break
+            removed += self._remove(path, size)
+            total -= size
+        return removed
+
+    def get_stats(self):
+        return {
+            'max_age_seconds': self.max_age_seconds,
+            'max_total_bytes': self.max_total_bytes,
+            'files_removed': self.files_removed,
+            'bytes_removed': self.bytes_removed
+        }
@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+from image_processing import MODEL_INPUT_SIZE
+
+# Load environment variables
+load_dotenv()
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm', '.3gp')
+# Frames per second of video that are looked at
+VIDEO_SAMPLE_FPS = float(os.getenv('VIDEO_SAMPLE_FPS', '2'))
+# Only this much of a clip is analysed
+VIDEO_MAX_SECONDS = float(os.getenv('VIDEO_MAX_SECONDS', '30'))
+# Mean absolute difference (0-1) between 32x32 grey thumbnails below which a
+# frame counts as a repeat of the last analysed one
+VIDEO_DUPLICATE_THRESHOLD = float(os.getenv('VIDEO_DUPLICATE_THRESHOLD', '0.03'))
+VIDEO_BATCH_SIZE = int(os.getenv('VIDEO_BATCH_SIZE', '16'))
+SIGNATURE_SIZE = (32, 32)
+
+
+def is_video_name(filename):
+    return filename.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def sample_frames(path, sample_fps=VIDEO_SAMPLE_FPS, max_seconds=VIDEO_MAX_SECONDS):
+    """
+    Yield (seconds, RGB frame) at roughly `sample_fps` frames per second.
+
+    Frames are decoded one at a time from the file; skipped frames are only
+    grabbed, not converted, and the clip is never held in memory.
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError('Could not read video')
+
+    native_fps = capture.get(cv2.CAP_PROP_FPS) or 0
+    interval = 1.0 / sample_fps
+    next_sample = 0.0
+    index = 0
+    try:
+        while capture.grab():
+            # Some containers report no frame rate; fall back to the decoder's timestamp
+            seconds = index / native_fps if native_fps > 0 else capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            index += 1
+            if seconds > max_seconds:
+                break
+            if seconds + 1e-6 < next_sample:
+                continue
+
+            ok, frame = capture.retrieve()
+            if not ok:
+                continue
+            while next_sample <= seconds + 1e-6:
+                next_sample += interval
+            yield seconds, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        capture.release()
+
+
+def frame_signature(frame):
+    """Tiny greyscale thumbnail used to spot near-identical frames cheaply"""
+    import cv2
+
+    grey = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+    return cv2.resize(grey, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+
+
+def is_near_duplicate(signature, previous, threshold=VIDEO_DUPLICATE_THRESHOLD):
+    return previous is not None and float(np.mean(np.abs(signature - previous))) < threshold
+
+
+def frame_to_input(frame, dtype=np.float32):
+    """Resize an RGB frame to the model input; same scaling as image_to_array"""
+    import cv2
+
+    resized = cv2.resize(frame, MODEL_INPUT_SIZE, interpolation=cv2.INTER_AREA)
+    if dtype == np.uint8:
+        return resized
+    return resized.astype(np.float32) / 255.0
+
+
+def distinct_frames(frames, threshold=VIDEO_DUPLICATE_THRESHOLD):
+    """
+    Drop frames that look like the last kept frame.
+
+    Yields (seconds, frame, kept). Comparing against the last *kept* frame,
+    not the previous one, means a slow pan still produces a new frame once
+    the view has drifted far enough.
+    """
+    previous = None
+    for seconds, frame in frames:
+        signature = frame_signature(frame)
+        if is_near_duplicate(signature, previous, threshold):
+            yield seconds, frame, False
+            continue
+        previous = signature
+        yield seconds, frame, True
+
+
+def aggregate_verdict(probabilities, class_names):
+    """Clip-level answer for one task from the per-frame softmax outputs"""
+    probabilities = np.asarray(probabilities, dtype=np.float32)
+    mean = probabilities.mean(axis=0)
+    predicted = int(np.argmax(mean))
+    votes = np.argmax(probabilities, axis=1)
+    return {
+        'problem': class_names[predicted],
+        'confidence': round(float(mean[predicted]) * 100, 2),
+        'frames': int(np.sum(votes == predicted)),
+        'share': round(float(np.mean(votes == predicted)) * 100, 2)
+    }
+
+
+def diagnose_video(path, classify_batch, class_names, dtype=np.float32,
+                   sample_fps=VIDEO_SAMPLE_FPS, max_seconds=VIDEO_MAX_SECONDS,
+                   threshold=VIDEO_DUPLICATE_THRESHOLD, batch_size=VIDEO_BATCH_SIZE):
+    """
+    Time-indexed diagnosis of a video clip.
+
+    classify_batch(batch) takes an (n, 224, 224, 3) array and returns
+    {task: (n, classes) probabilities}; class_names maps each task to its
+    class mapping. Kept frames are classified `batch_size` at a time as they
+    stream in, so memory stays bounded by one batch.
+    """
+    timeline = []
+    probabilities = {task: [] for task in class_names}
+    sampled = 0
+    batch_times, batch_inputs = [], []
+
+    def flush():
+        outputs = classify_batch(np.stack(batch_inputs))
+        for position, seconds in enumerate(batch_times):
+            entry = {'time': round(seconds, 2)}
+            for task, names in class_names.items():
+                frame_probabilities = np.asarray(outputs[task][position])
+                probabilities[task].append(frame_probabilities)
+                predicted = int(np.argmax(frame_probabilities))
+                entry[task] = {
+                    'problem': names[predicted],
+                    'confidence': round(float(frame_probabilities[predicted]) * 100, 2)
+                }
+            timeline.append(entry)
+        batch_times.clear()
+        batch_inputs.clear()
+
+    for seconds, frame, kept in distinct_frames(sample_frames(path, sample_fps, max_seconds), threshold):
+        sampled += 1
+        if not kept:
+            continue
+        batch_times.append(seconds)
+        batch_inputs.append(frame_to_input(frame, dtype))
+        if len(batch_inputs) >= batch_size:
+            flush()
+    if batch_inputs:
+        flush()
+
+    if not timeline:
+        raise ValueError('No frames could be read from the video')
+
+    return {
+        'frames_sampled': sampled,
+        'frames_analyzed': len(timeline),
+        'frames_skipped': sampled - len(timeline),
+        'sample_fps': sample_fps,
+        'verdict': {task: aggregate_verdict(probabilities[task], names) for task, names in class_names.items()},
+        'timeline': timeline
+    }
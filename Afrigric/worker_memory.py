@@ -0,0 +1,82 @@
+import os
+import resource
+
+# Fields of /proc/<pid>/smaps_rollup worth reporting, in kB
+SMAPS_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty', 'Swap')
+
+
+def process_memory(pid='self'):
+    """
+    Memory of one process in MB.
+
+    Rss counts shared pages (preloaded code, memory-mapped model files) once
+    per process, so it overstates what each worker costs. Pss splits shared
+    pages between the processes that map them; summing Pss over the master
+    and its workers gives the real footprint of the server.
+    """
+    memory = {'pid': os.getpid() if pid == 'self' else int(pid)}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                field, _, value = line.partition(':')
+                if field in SMAPS_FIELDS:
+                    memory[field.lower() + '_mb'] = round(int(value.split()[0]) / 1024, 1)
+        return memory
+    except OSError:
+        pass
+
+    # Older kernels and non-Linux hosts: resident size only
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    memory['rss_mb'] = round(int(line.split()[1]) / 1024, 1)
+                    return memory
+    except OSError:
+        pass
+
+    if pid == 'self':
+        # ru_maxrss is the peak, in KiB on Linux
+        memory['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return memory
+
+
+def child_pids(parent_pid):
+    """PIDs of the direct children of a process (the gunicorn workers of a master)"""
+    children = []
+    try:
+        for tid in os.listdir(f'/proc/{parent_pid}/task'):
+            with open(f'/proc/{parent_pid}/task/{tid}/children') as f:
+                children.extend(int(pid) for pid in f.read().split())
+        return sorted(set(children))
+    except OSError:
+        pass
+
+    # Kernels without CONFIG_PROC_CHILDREN: scan every process
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces; fields after it are fixed
+                fields = f.read().rsplit(')', 1)[1].split()
+            if int(fields[1]) == parent_pid:
+                children.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return sorted(children)
+
+
+def server_memory(master_pid=None):
+    """Memory of the gunicorn master and every worker, plus the Pss total"""
+    master_pid = master_pid or os.getppid()
+    master = process_memory(master_pid)
+    workers = [process_memory(pid) for pid in child_pids(master_pid)]
+    processes = [master] + workers
+    return {
+        'current_worker': os.getpid(),
+        'master': master,
+        'workers': workers,
+        'total_pss_mb': round(sum(p.get('pss_mb', 0) for p in processes), 1),
+        'total_rss_mb': round(sum(p.get('rss_mb', 0) for p in processes), 1)
+    }